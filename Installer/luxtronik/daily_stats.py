@@ -0,0 +1,290 @@
+"""
+Laufende Tagesstatistik (Autarkie, Eigenverbrauch, Verteilung) und Wallbox-Sessions.
+
+calculateDailyEnergyStats() in helpers.php integriert jede Minute die
+komplette 48h-History neu; die Session-Erkennung der Wallbox läuft dafür
+ebenfalls rückwärts über die History. DailyEnergyStats rechnet dieselben
+Summen mit denselben Regeln (Trapezregel, Lücken ab einer Stunde zählen nicht,
+PV-Verteilung Verbraucher -> Batterie -> Netz) fortlaufend, O(1) pro Wert, und
+beginnt um Mitternacht (lokale Zeit) von vorne. WallboxSession erkennt
+Anstecken und Abstecken (wb_locked) und zählt die Energie der Session mit.
+
+Der Grabber speist jeden gültigen Live-Wert ein. DailyStatsEngine schreibt
+daily_energy.json in die RAM-Disk (Felder wie daily_stats.json plus
+"wb_session" und den Zwischenstand zum Fortsetzen nach einem Neustart) und
+hängt Session-Ereignisse an wb_events.jsonl an.
+
+    python3 daily_stats.py              # aktuelles Ergebnis
+    python3 daily_stats.py --replay     # aus der Live-History neu berechnen (Vergleich)
+"""
+
+import os
+import sys
+import json
+import argparse
+from datetime import date
+
+from live_ring import LiveRing, RING_FILE
+from history_archive import MAX_GAP
+
+RAMDISK = os.path.dirname(RING_FILE)
+STATS_FILE = os.path.join(RAMDISK, "daily_energy.json")
+EVENTS_FILE = os.path.join(RAMDISK, "wb_events.jsonl")
+MAX_EVENTS = 200         # ältere Zeilen in wb_events.jsonl werden beim Anhängen verworfen
+
+ACC_KEYS = ('pv_home_kwh', 'pv_bat_kwh', 'pv_wb_kwh', 'pv_wp_kwh', 'pv_grid_kwh',
+            'grid_home_kwh', 'grid_bat_kwh', 'grid_wb_kwh', 'grid_wp_kwh',
+            'bat_home_kwh', 'bat_wb_kwh', 'bat_wp_kwh',
+            'total_consumption', 'total_pv', 'total_grid_in', 'total_grid_out', 'total_bat_out')
+ROW_KEYS = ('pv', 'grid', 'bat', 'home', 'wb', 'wp')
+
+
+def _f(value):
+    # fehlende Werte (None, NaN aus dem Ringpuffer) zählen wie in PHP ($d['pv'] ?? 0) als 0
+    try:
+        v = float(value) if value is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+    return v if v == v else 0.0
+
+
+class DailyEnergyStats:
+    """Tagessummen wie calculateDailyEnergyStats(), fortlaufend aktualisiert."""
+
+    def __init__(self):
+        self.day = None
+        self.acc = dict.fromkeys(ACC_KEYS, 0.0)
+        self.samples = 0
+        self.last_ts = None
+        self.last_row = None
+
+    def reset(self, day):
+        self.day = day
+        self.acc = dict.fromkeys(ACC_KEYS, 0.0)
+        self.samples = 0
+        self.last_ts = None
+        self.last_row = None
+
+    def add(self, ts, sample):
+        if self.last_ts is not None and ts <= self.last_ts: return False
+        day = date.fromtimestamp(ts)
+        if day != self.day: self.reset(day)
+        row = tuple(_f(sample.get(k)) for k in ROW_KEYS)
+        if self.last_ts is not None and 0 < ts - self.last_ts < MAX_GAP:
+            self._integrate((ts - self.last_ts) / 3600.0, row, self.last_row)
+        self.last_ts = ts
+        self.last_row = row
+        self.samples += 1
+        return True
+
+    def _integrate(self, h, row, last):
+        s = self.acc
+        pv, grid, bat, home, wb, wp = ((a + b) / 2 for a, b in zip(row, last))
+        pv, home, wb, wp = max(0.0, pv), max(0.0, home), max(0.0, wb), max(0.0, wp)
+        grid_in, grid_out = max(0.0, grid), max(0.0, -grid)
+        bat_in, bat_out = max(0.0, bat), max(0.0, -bat)
+        loads = home + wb + wp
+        k = h / 1000.0
+
+        s['total_consumption'] += loads * k
+        s['total_pv'] += pv * k
+        s['total_grid_in'] += grid_in * k
+        s['total_grid_out'] += grid_out * k
+        s['total_bat_out'] += bat_out * k
+
+        # PV: 1. Verbraucher, 2. Batterie, 3. Netz
+        pv_to_loads = min(pv, loads)
+        pv_to_bat = min(pv - pv_to_loads, bat_in)
+        s['pv_bat_kwh'] += pv_to_bat * k
+        s['pv_grid_kwh'] += max(0.0, pv - pv_to_loads - pv_to_bat) * k
+        grid_to_bat = max(0.0, bat_in - pv)
+        grid_to_loads = max(0.0, grid_in - grid_to_bat)
+        s['grid_bat_kwh'] += grid_to_bat * k
+        if loads > 0:
+            for key, share in (('home', home / loads), ('wb', wb / loads), ('wp', wp / loads)):
+                s[f'pv_{key}_kwh'] += pv_to_loads * share * k
+                s[f'grid_{key}_kwh'] += grid_to_loads * share * k
+                if bat_out > 0: s[f'bat_{key}_kwh'] += bat_out * share * k
+
+    def result(self):
+        """Ergebnis im Format von daily_stats.json."""
+        s = self.acc
+        total_pv = max(0.001, s['total_pv'])
+        total_cons = max(0.001, s['total_consumption'])
+        total_bat_out = max(0.001, s['total_bat_out'])
+        grid_in, grid_out = s['total_grid_in'], s['total_grid_out']
+        stats = {'total_pv_kwh': round(total_pv, 2), 'total_grid_in_kwh': round(grid_in, 2),
+                 'total_bat_out_kwh': round(total_bat_out, 2)}
+        for prefix, keys, total in (('pv', ('home', 'bat', 'wb', 'wp', 'grid'), total_pv),
+                                    ('grid', ('home', 'bat', 'wb', 'wp'), max(0.001, grid_in)),
+                                    ('bat', ('home', 'wb', 'wp'), total_bat_out)):
+            for key in keys:
+                val = s[f'{prefix}_{key}_kwh']
+                stats[f'{prefix}_{key}_kwh'] = round(val, 2)
+                stats[f'{prefix}_{key}_pct'] = round(val / total * 100)
+        return {
+            'pv_today_kwh': round(s['total_pv'], 2),
+            'autarky_day': round(max(0, min(100, (total_cons - grid_in) / total_cons * 100)), 1),
+            'selfcon_day': round(max(0, min(100, (total_pv - grid_out) / total_pv * 100)), 1),
+            'stats': stats,
+        }
+
+    def state(self):
+        return {'day': self.day.isoformat() if self.day else None, 'acc': self.acc, 'samples': self.samples,
+                'last_ts': self.last_ts, 'last_row': self.last_row}
+
+    def restore(self, st):
+        self.day = date.fromisoformat(st['day']) if st.get('day') else None
+        self.acc = {k: float(st['acc'].get(k, 0.0)) for k in ACC_KEYS}
+        self.samples = int(st.get('samples', 0))
+        self.last_ts = st.get('last_ts')
+        self.last_row = tuple(st['last_row']) if st.get('last_row') else None
+
+
+class WallboxSession:
+    """
+    Ladesession der Wallbox: beginnt mit wb_locked, endet beim Abstecken.
+    add() liefert ein Ereignis ('start' bzw. 'stop') oder None.
+    """
+
+    def __init__(self):
+        self.locked = False
+        self.start = None
+        self.last_ts = None
+        self.last_wb = 0.0
+        self.kwh = 0.0
+        self.last_session = None
+
+    def add(self, ts, locked, wb):
+        event = None
+        if locked and not self.locked:
+            self.start, self.kwh = ts, 0.0
+            event = {'event': 'start', 'ts': ts}
+        elif locked and self.last_ts is not None and 0 < ts - self.last_ts < MAX_GAP:
+            self.kwh += (wb + self.last_wb) / 2 * (ts - self.last_ts) / 3600000.0
+        elif not locked and self.locked:
+            # Ende = letzter Zeitpunkt, an dem noch angesteckt war (wie get_live_json.php)
+            self.last_session = {'start': self.start, 'end': self.last_ts, 'kwh': round(self.kwh, 3)}
+            event = dict(self.last_session, event='stop', ts=ts)
+            self.kwh = 0.0
+            self.start = None
+        self.locked = locked
+        self.last_ts = ts
+        self.last_wb = wb
+        return event
+
+    def result(self):
+        return {'locked': self.locked, 'start': self.start, 'kwh': round(self.kwh, 2), 'last': self.last_session}
+
+    def state(self):
+        return {'locked': self.locked, 'start': self.start, 'last_ts': self.last_ts, 'last_wb': self.last_wb,
+                'kwh': self.kwh, 'last_session': self.last_session}
+
+    def restore(self, st):
+        self.locked = bool(st.get('locked'))
+        self.start = st.get('start')
+        self.last_ts = st.get('last_ts')
+        self.last_wb = float(st.get('last_wb') or 0.0)
+        self.kwh = float(st.get('kwh') or 0.0)
+        self.last_session = st.get('last_session')
+
+
+def _publish(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'w') as f: json.dump(data, f)
+        os.chmod(tmp, 0o664)
+        os.replace(tmp, path)
+    except OSError:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+
+
+class DailyStatsEngine:
+    """Tagesstatistik + Wallbox-Session mit Zwischenstand in der RAM-Disk."""
+
+    def __init__(self, stats_file=STATS_FILE, events_file=EVENTS_FILE):
+        self.stats_file = stats_file
+        self.events_file = events_file
+        self.daily = DailyEnergyStats()
+        self.wb = WallboxSession()
+        self.on_event = None
+
+    def load(self):
+        """Setzt den gespeicherten Zwischenstand fort. False, wenn keiner vorhanden ist."""
+        try:
+            with open(self.stats_file, 'r') as f: st = json.load(f)['state']
+            self.daily.restore(st['daily'])
+            self.wb.restore(st['wb'])
+            return True
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+    def add(self, ts, sample, emit=True):
+        """Neuer Live-Wert; liefert das Wallbox-Ereignis oder None."""
+        if not self.daily.add(ts, sample): return None
+        event = self.wb.add(ts, _f(sample.get('wb_locked')) != 0, _f(sample.get('wb')))
+        if event and emit:
+            self._append_event(event)
+            if self.on_event: self.on_event(event)
+        return event
+
+    def replay(self, rows, channels):
+        """Berechnet den Stand aus Zeilen des Ringpuffers (ohne Ereignisse auszugeben)."""
+        for row in rows:
+            self.add(row[0], dict(zip(channels, row[1:])), emit=False)
+
+    def _append_event(self, event):
+        lines = []
+        try:
+            with open(self.events_file, 'r') as f: lines = f.readlines()[-(MAX_EVENTS - 1):]
+        except OSError:
+            pass
+        lines.append(json.dumps(event, separators=(',', ':')) + "\n")
+        tmp = f"{self.events_file}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f: f.writelines(lines)
+        os.chmod(tmp, 0o664)
+        os.replace(tmp, self.events_file)
+
+    def result(self):
+        res = self.daily.result()
+        res['date'] = self.daily.day.isoformat() if self.daily.day else None
+        res['ts'] = self.daily.last_ts
+        res['samples'] = self.daily.samples
+        res['wb_session'] = self.wb.result()
+        res['wb_session_kwh'] = res['wb_session']['kwh'] if self.wb.locked else 0.0
+        return res
+
+    def publish(self):
+        data = self.result()
+        data['state'] = {'daily': self.daily.state(), 'wb': self.wb.state()}
+        _publish(self.stats_file, data)
+        return data
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Laufende Tagesstatistik")
+    ap.add_argument('--replay', action='store_true', help="aus dem Ringpuffer der Live-History neu berechnen")
+    ap.add_argument('--ring', default=RING_FILE)
+    args = ap.parse_args()
+
+    engine = DailyStatsEngine()
+    if args.replay:
+        ring = LiveRing(args.ring)
+        engine.replay(ring.rows(), ring.channels)
+        ring.close()
+        print(json.dumps(engine.result(), indent=1))
+        return 0
+    try:
+        with open(STATS_FILE, 'r') as f: data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Keine Tagesstatistik ({e})", file=sys.stderr)
+        return 1
+    data.pop('state', None)
+    print(json.dumps(data, indent=1))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Gemeinsamer Lesezugriff der Luxtronik-Skripte auf die e3dc.config.txt.
+
+get_luxtronik.py und set_manual_boost.py werden bei jedem Klick im Dashboard
+neu gestartet. Bisher hat jeder einzelne Wert e3dc_paths.json geladen und die
+Konfiguration von vorne durchsucht. Jetzt wird die Datei höchstens einmal pro
+Prozess geparst.
+
+Zusätzlich liegt in der RAM-Disk ein Auszug der von den Skripten genutzten
+Werte (SNAPSHOT_KEYS). Er gilt, solange mtime und Größe von e3dc.config.txt
+und e3dc_paths.json unverändert sind. Ein neu gestarteter Helfer liest dann
+nur diese kleine Datei (plus zwei stat()-Aufrufe). Zugangsdaten kommen nicht
+in den Auszug, weil die RAM-Disk im Web-Verzeichnis liegt.
+
+    python3 e3dc_config.py    # Werte des Auszugs, Quelle und Ladezeit
+"""
+
+import os
+import json
+
+PATHS_FILE = "/var/www/html/e3dc_paths.json"
+DEFAULT_INSTALL_PATH = "/home/pi/E3DC-Control/"
+SNAPSHOT_FILE = "/var/www/html/ramdisk/luxtronik_config.json"
+SNAPSHOT_KEYS = ('luxtronik', 'luxtronik_ip', 'at_limit', 'wws', 'www', 'hz')
+
+_values = None     # vollständig geparste Konfiguration dieses Prozesses
+_snapshot = None   # Auszug aus der RAM-Disk (False = ungültig/nicht vorhanden)
+stats = {"snapshot_hits": 0, "parses": 0}
+
+
+def parse_config_file(path):
+    """Liest die e3dc.config.txt als Dictionary (Key in Kleinbuchstaben -> Rohwert als String)."""
+    raw = {}
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('#') or '=' not in line: continue
+            k, v = line.split('=', 1)
+            raw[k.strip().lower()] = v.strip()
+    return raw
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def config_path():
+    """Pfad der e3dc.config.txt laut e3dc_paths.json."""
+    try:
+        with open(PATHS_FILE, 'r') as f:
+            install_path = json.load(f).get('install_path', DEFAULT_INSTALL_PATH)
+    except Exception:
+        install_path = DEFAULT_INSTALL_PATH
+    return os.path.join(install_path, 'e3dc.config.txt')
+
+
+def _load_snapshot():
+    try:
+        with open(SNAPSHOT_FILE, 'r') as f: snap = json.load(f)
+        if snap["paths"] != _stamp(PATHS_FILE) or snap["config"] != _stamp(snap["path"]): return False
+        return snap["values"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+
+
+def _write_snapshot(snap):
+    if not os.path.isdir(os.path.dirname(SNAPSHOT_FILE)): return
+    tmp = f"{SNAPSHOT_FILE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'w') as f: json.dump(snap, f)
+        os.replace(tmp, SNAPSHOT_FILE)
+    except OSError:
+        try: os.remove(tmp)
+        except OSError: pass
+
+
+def load_config():
+    """Alle Werte der e3dc.config.txt (einmal pro Prozess geparst, fehlende Datei = leer)."""
+    global _values
+    if _values is None:
+        # Zeitstempel vor dem Lesen: ändert sich die Datei währenddessen, passt der Auszug danach nicht mehr
+        paths = _stamp(PATHS_FILE)
+        path = config_path()
+        stamp = _stamp(path)
+        try:
+            _values = parse_config_file(path)
+        except OSError:
+            _values = {}
+        stats["parses"] += 1
+        _write_snapshot({"paths": paths, "path": path, "config": stamp,
+                         "values": {k: _values[k] for k in SNAPSHOT_KEYS if k in _values}})
+    return _values
+
+
+def read_config_value(key, default=None):
+    """Liest einen Wert aus der zentralen e3dc.config.txt."""
+    global _snapshot
+    key = key.lower()
+    if _values is None and key in SNAPSHOT_KEYS:
+        if _snapshot is None: _snapshot = _load_snapshot()
+        if _snapshot is not False:
+            stats["snapshot_hits"] += 1
+            return _snapshot.get(key, default)
+    return load_config().get(key, default)
+
+
+if __name__ == "__main__":
+    import time
+    t0 = time.perf_counter()
+    values = {k: read_config_value(k) for k in SNAPSHOT_KEYS}
+    print(json.dumps({"values": values, "source": "snapshot" if stats["snapshot_hits"] else "parse",
+                      "ms": round((time.perf_counter() - t0) * 1000, 3)}))
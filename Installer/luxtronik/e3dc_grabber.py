@@ -0,0 +1,264 @@
+"""
+Live-Grabber für E3DC-Control (Dienst e3dc-grabber).
+
+Ersetzt die Shell-Schleife get_live.sh (screen hardcopy, chmod, mv, sleep 2,
+also vier Prozessstarts alle zwei Sekunden). E3DC-Control läuft weiterhin in
+der Screen-Session "E3DC", damit man sich per "screen -r E3DC" verbinden kann;
+die Ausgabe wird deshalb weiter per hardcopy abgegriffen, aber:
+
+- ein einziger Prozessstart (screen) pro Zyklus, chmod/mv direkt in Python
+- live.txt bleibt für get_live_json.php und das Dashboard erhalten
+- der Dump wird nur bei geändertem Inhalt einmal geparst (vorkompilierte
+  Regex aus live_snapshot.py) und als live_snapshot.json mit fortlaufender
+  Sequenznummer atomar veröffentlicht; der Energy Manager liest dann nur noch
+  diese Datei statt live.txt selbst zu zerlegen
+- einmal pro Minute ein Satz im Ringpuffer der 48h-History (live_ring.py);
+  beim ersten Start wird die bisherige live_history.txt übernommen
+- nach Mitternacht das Tagesarchiv von gestern (history_archive.py)
+- jeder gültige Wert geht in die Verdichtungen 1m/15m/1h/1d (rollups.py) und
+  in die laufende Tagesstatistik mit Wallbox-Sessions (daily_stats.py)
+- feste Taktung ohne Drift (Laufzeit des Zyklus wird vom sleep abgezogen)
+
+    python3 e3dc_grabber.py           # Dienstbetrieb
+    python3 e3dc_grabber.py --once    # ein Zyklus, Snapshot auf stdout
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import subprocess
+from datetime import date, timedelta
+
+from e3dc_config import config_path
+from manager_config import EnergyManagerConfig, ConfigWatcher
+from live_snapshot import RAMDISK, LIVE_FILE, SNAPSHOT_FILE, ZeroFilter, build_snapshot
+from live_ring import LiveRing, RING_FILE, LIVE_HISTORY_FILE, HISTORY_HOURS, HISTORY_INTERVAL
+from history_archive import ARCHIVE_DIR, archive_path, day_bounds, columns_from_rows, write_archive, prune
+from rollups import RollupEngine
+from daily_stats import DailyStatsEngine, STATS_FILE, EVENTS_FILE
+
+SCREEN_BIN = "/usr/bin/screen"
+SCREEN_SESSION = "E3DC"
+INTERVAL = 2.0           # s zwischen zwei Dumps (wie get_live.sh)
+HARDCOPY_TIMEOUT = 5     # s, danach gilt der screen-Aufruf als hängend
+TMP_FILE = os.path.join(RAMDISK, "live.tmp")
+
+logger = logging.getLogger("E3DCGrabber")
+
+
+def _publish(path, data):
+    """Schreibt data atomar (tmp + rename), lesbar für www-data."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'w') as f: json.dump(data, f)
+        os.chmod(tmp, 0o664)
+        os.replace(tmp, path)
+    except OSError:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+
+
+class LiveGrabber:
+    """Ein Zyklus = hardcopy -> live.txt -> (bei neuem Inhalt) live_snapshot.json."""
+
+    def __init__(self, session=SCREEN_SESSION, live_file=LIVE_FILE, snapshot_file=SNAPSHOT_FILE, tmp_file=TMP_FILE,
+                 cfg_path=None, ring_file=RING_FILE, history_file=LIVE_HISTORY_FILE, archive_dir=ARCHIVE_DIR,
+                 rollup_files=None, stats_file=STATS_FILE, events_file=EVENTS_FILE):
+        self.session = session
+        self.live_file = live_file
+        self.snapshot_file = snapshot_file
+        self.tmp_file = tmp_file
+        self.ring_file = ring_file
+        self.history_file = history_file
+        self.ring = None
+        self.archive_dir = archive_dir
+        self._archived = None
+        self.rollup_files = rollup_files
+        self.rollups = None
+        self.stats_file = stats_file
+        self.events_file = events_file
+        self.daily = None
+        self.cfg_path = cfg_path or config_path()
+        self.watcher = ConfigWatcher(self.cfg_path)
+        self.wurzelzaehler = self._load_wurzelzaehler()
+        self.filter = ZeroFilter()
+        self.seq = self._last_seq() + 1
+        self._content = None
+        self.stats = {"cycles": 0, "published": 0, "unchanged": 0, "invalid": 0, "errors": 0,
+                      "history": 0, "history_errors": 0, "archives": 0, "archive_errors": 0}
+
+    def _load_wurzelzaehler(self):
+        try:
+            return EnergyManagerConfig.load(self.cfg_path).wurzelzaehler
+        except OSError:
+            return 0
+
+    def _last_seq(self):
+        # Nach einem Neustart weiterzählen, damit Leser den ersten Snapshot als neu erkennen
+        try:
+            with open(self.snapshot_file, 'r') as f: return int(json.load(f).get('seq', 0))
+        except (OSError, ValueError, TypeError, AttributeError):
+            return 0
+
+    def _open_ring(self):
+        try:
+            ino = os.stat(self.ring_file).st_ino
+        except OSError:
+            ino = None
+        if self.ring is not None and self.ring.inode == ino: return self.ring
+        # Erster Aufruf oder Datei gelöscht/ersetzt (z.B. RAM-Disk neu gemountet)
+        if self.ring is not None: self.ring.close()
+        self.ring = LiveRing(self.ring_file, writable=True)
+        if not len(self.ring) and os.path.exists(self.history_file):
+            self.ring.import_jsonl(self.history_file, since=time.time() - HISTORY_HOURS * 3600)
+        return self.ring
+
+    def _open_rollups(self):
+        if self.rollups is None:
+            self.rollups = RollupEngine(self.rollup_files)
+            # Nach einem Neustart bei der Sicherung weitermachen, den Rest aus der Live-History nachrechnen
+            self.rollups.load()
+            ring = self._open_ring()
+            self.rollups.replay(ring.rows(self.rollups.resume_from()), ring.channels)
+        return self.rollups
+
+    def _open_daily(self):
+        if self.daily is None:
+            self.daily = DailyStatsEngine(self.stats_file, self.events_file)
+            self.daily.on_event = self._wb_event
+            if not self.daily.load():
+                # Kein Zwischenstand (z.B. nach Neustart des Pi): aus der Live-History berechnen
+                ring = self._open_ring()
+                self.daily.replay(ring.rows(), ring.channels)
+        return self.daily
+
+    @staticmethod
+    def _wb_event(event):
+        if event['event'] == 'start': logger.info("Wallbox: Session gestartet")
+        else: logger.info(f"Wallbox: Session beendet ({event['kwh']:.2f} kWh)")
+
+    def record_history(self, ts, values):
+        """Hängt einen Satz an den Ringpuffer an, höchstens einmal pro HISTORY_INTERVAL."""
+        ring = self._open_ring()
+        last = ring.last_ts()
+        if last is not None and ts - last < HISTORY_INTERVAL: return False
+        if not ring.append(ts, values): return False
+        self.stats["history"] += 1
+        return True
+
+    def archive_yesterday(self):
+        """
+        Schreibt einmal pro Tag das Spaltenarchiv von gestern aus dem Ringpuffer (falls noch nicht vorhanden).
+        Schlägt das Schreiben fehl, wird es beim nächsten Aufruf erneut versucht.
+        """
+        day = date.today() - timedelta(days=1)
+        if self._archived == day or not os.path.isdir(self.archive_dir): return False
+        path = archive_path(day, self.archive_dir)
+        rows = None if os.path.exists(path) else self._open_ring().rows(*day_bounds(day))
+        if not rows:
+            self._archived = day
+            return False
+        ts, columns = columns_from_rows(rows, self.ring.channels)
+        write_archive(path, day, ts, columns)
+        self._archived = day
+        prune(self.archive_dir)
+        self.stats["archives"] += 1
+        return True
+
+    def hardcopy(self):
+        """Screen-Dump nach live.txt; liefert den Inhalt oder None."""
+        try:
+            os.remove(self.tmp_file)
+        except OSError:
+            pass
+        subprocess.run([SCREEN_BIN, "-S", self.session, "-X", "hardcopy", self.tmp_file],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=HARDCOPY_TIMEOUT)
+        try:
+            with open(self.tmp_file, 'r', encoding='utf-8', errors='replace') as f: content = f.read()
+        except OSError:
+            return None
+        os.chmod(self.tmp_file, 0o664)
+        os.replace(self.tmp_file, self.live_file)
+        return content
+
+    def cycle(self):
+        """Ein Durchlauf; liefert den neuen Snapshot oder None (kein Dump / Inhalt unverändert)."""
+        self.stats["cycles"] += 1
+        if self.watcher.changed():
+            wz = self._load_wurzelzaehler()
+            if wz != self.wurzelzaehler: self._content = None
+            self.wurzelzaehler = wz
+        content = self.hardcopy()
+        if content is None: return None
+        if content == self._content:
+            self.stats["unchanged"] += 1
+            return None
+        self._content = content
+        snap = build_snapshot(content, self.wurzelzaehler, self.filter, time.time())
+        if not snap['valid']: self.stats["invalid"] += 1
+        snap['seq'] = self.seq
+        _publish(self.snapshot_file, snap)
+        self.seq += 1
+        self.stats["published"] += 1
+        if snap['valid']:
+            # Zeile wie get_live_json.php: 'home' = Hausverbrauch ohne Wärmepumpe
+            values = dict(snap, home=snap['home_raw'] - snap['wp'])
+            appended = False
+            try:
+                appended = self.record_history(snap['ts'], values)
+                self._open_rollups().add(snap['ts'], values)
+                daily = self._open_daily()
+                daily.add(snap['ts'], values)
+                daily.publish()
+            except (OSError, ValueError) as e:
+                self.stats["history_errors"] += 1
+                logger.warning(f"History-Fehler: {e}")
+            if appended:
+                # Eigener Block: ein fehlgeschlagenes Archiv darf History und Tagesstatistik nicht aufhalten
+                try:
+                    self.archive_yesterday()
+                except (OSError, ValueError) as e:
+                    self.stats["archive_errors"] += 1
+                    logger.warning(f"Archiv-Fehler: {e}")
+        return snap
+
+    def run(self, interval=INTERVAL):
+        next_t = time.monotonic()
+        while True:
+            try:
+                self.cycle()
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Grabber-Fehler: {e}")
+            next_t += interval
+            delay = next_t - time.monotonic()
+            if delay < 0:
+                # Zyklus hat länger gedauert (z.B. screen hing): neu aufsetzen statt nachzuholen
+                next_t = time.monotonic()
+                delay = 0
+            time.sleep(delay)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Live-Grabber für E3DC-Control")
+    ap.add_argument('--once', action='store_true', help="ein Zyklus, Snapshot auf stdout")
+    ap.add_argument('--interval', type=float, default=INTERVAL)
+    ap.add_argument('--session', default=SCREEN_SESSION)
+    args = ap.parse_args()
+    # Ausgabe landet im Journal des Dienstes, das den Zeitstempel selbst setzt
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+    grabber = LiveGrabber(session=args.session)
+    if args.once:
+        snap = grabber.cycle()
+        print(json.dumps(snap if snap is not None else {"error": "kein Screen-Dump", "stats": grabber.stats}))
+        return 0 if snap is not None else 1
+    grabber.run(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
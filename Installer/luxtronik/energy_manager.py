@@ -2,14 +2,29 @@ import time
 import json
 import os
 import subprocess
-import shutil
 import math
+import asyncio
+import signal
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 import logging
 from logging.handlers import RotatingFileHandler
 import re
 import requests
 from luxtronik import LuxtronikModbus
+from luxtronik_async import AsyncLuxtronikModbus
+from luxtronik_gateway import LuxtronikGateway, snapshot_age
+from scheduler import Scheduler
+from manager_config import EnergyManagerConfig, ConfigWatcher, format_changes
+from forecast_cache import load_forecast
+from history_tail import BaseloadEstimator
+from price_timeline import PriceTimeline
+from forecast_index import ForecastIndex
+from live_snapshot import LiveSnapshotProvider
+from register_queue import RegisterWriteQueue
+from register_cache import RegisterCache
+from state_writer import StateWriter
 
 # Pfade
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -25,6 +40,20 @@ HISTORY_FILE = "/var/www/html/ramdisk/luxtronik_history.json"
 BACKUP_DIR = "/var/www/html/tmp/luxtronik_archive"
 STATE_FILE = "/var/www/html/tmp/morning_boost_state.json"
 FLAG_FILE = "/var/www/html/ramdisk/manual_boost.flag"
+TASK_STATS_FILE = "/var/www/html/ramdisk/energy_manager_tasks.json"
+METRICS_JSON_FILE = "/var/www/html/ramdisk/energy_manager_metrics.json"
+METRICS_PROM_FILE = "/var/www/html/ramdisk/energy_manager_metrics.prom"
+
+# Takte und Deadlines der Scheduler-Tasks (Sekunden)
+LUX_POLL_INTERVAL = 30
+LUX_MIN_POLL_INTERVAL = 30   # Luxtronik verträgt kein schnelleres Polling (Fehler 816)
+LUX_POLL_DEADLINE = 10
+E3DC_POLL_INTERVAL = 5
+E3DC_POLL_DEADLINE = 5
+DECISION_MAX_INTERVAL = 30   # Regelung läuft spätestens alle 30s, auch ohne neue Daten
+DECISION_DEADLINE = 5
+TASK_STATS_INTERVAL = 60
+SI_CALIBRATION_SECONDS = 60  # So lange muss die WB-Leistung stabil anliegen, bevor SI kalibriert
 
 # Pfade aus e3dc_paths.json laden falls vorhanden
 PATHS_FILE = "/var/www/html/e3dc_paths.json"
@@ -67,60 +96,6 @@ def setup_logging():
 if not os.path.exists(BACKUP_DIR):
     os.makedirs(BACKUP_DIR)
 
-def read_e3dc_config_value_raw(key):
-    """Liest einen Rohwert aus der e3dc.config.txt"""
-    try:
-        with open(E3DC_CONFIG_PATH, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line.startswith('#') or '=' not in line: continue
-                k, v = line.split('=', 1)
-                if k.strip().lower() == key.lower():
-                    return v.strip()
-    except Exception: pass
-    return None
-
-def read_e3dc_config_value(key, default=None):
-    """Liest einen Wert aus der e3dc.config.txt und gibt einen Default zurück, falls nicht gefunden."""
-    value = read_e3dc_config_value_raw(key)
-    if value is None:
-        return default
-    # Konvertiere 'true'/'false' Strings zu Booleans, Zahlen zu Zahlen etc.
-    if value.lower() in ['true', '1']: return 1
-    if value.lower() in ['false', '0']: return 0
-    try: return float(value)
-    except ValueError: return value
-
-def load_e3dc_config_dict():
-    """Liest die gesamte Config einmalig in ein Dictionary (Performance)."""
-    config = {}
-    try:
-        with open(E3DC_CONFIG_PATH, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line.startswith('#') or '=' not in line: continue
-                k, v = line.split('=', 1)
-                val = v.strip()
-                # Einfache Typkonvertierung
-                if val.lower() in ['true', '1']: val = 1
-                elif val.lower() in ['false', '0']: val = 0
-                config[k.strip().lower()] = val
-    except Exception: pass
-    return config
-
-def get_cfg_value(config_dict, key, default=None):
-    """Holt Wert aus dem Cache-Dict."""
-    if config_dict is None: return default
-    val = config_dict.get(key.lower(), default)
-    if val == '': return default
-    try: return float(val)
-    except (ValueError, TypeError): return val
-
-def get_cfg_int(config_dict, key, default=0):
-    val = get_cfg_value(config_dict, key, default)
-    try: return int(float(val))
-    except: return default
-
 def write_e3dc_config_value(key, value):
     """Schreibt einen Wert in die e3dc.config.txt"""
     try:
@@ -142,148 +117,239 @@ def write_e3dc_config_value(key, value):
         return False
 
 def get_forecast_data():
-    """Liest awattardebug.txt und analysiert die Prognose für die nächsten 18h"""
-    high_soc_hours = 0
-    total_pv_pct = 0.0
-    
-    if not os.path.exists(AWATTAR_DEBUG_PATH):
-        return 0, 0.0
-
+    """Kennzahlen der Prognose (Stunden mit vollem Akku, PV-Summe) aus dem geteilten Forecast-Artefakt."""
     try:
-        with open(AWATTAR_DEBUG_PATH, 'r') as f:
-            lines = f.readlines()
-        
-        in_data = False
-        
-        for line in lines:
-            if "Data" in line: in_data = True; continue
-            if not in_data: continue
-            
-            parts = line.split()
-            if len(parts) >= 5:
-                soc = float(parts[2])
-                pv = float(parts[4])
-                
-                if soc >= 98.0:
-                    high_soc_hours += 0.25 
-                    total_pv_pct += pv
-    except: pass
-    return high_soc_hours, total_pv_pct
+        fc = load_forecast(AWATTAR_DEBUG_PATH)
+    except Exception:
+        fc = None
+    if not fc: return 0, 0.0
+    return fc['agg']['high_soc_hours'], fc['agg']['pv_sum']
 
-def get_price_action(prices, start_hour, interval, limit, min_duration_min, current_idx_float):
-    """Ermittelt, ob wir boosten (BOOST), pausieren (PAUSE) oder nichts tun (NONE)."""
-    if not prices:
-        return "NONE"
+def pv_peak_expected(forecast_index, min_watt, hours=1.5):
+    """PV-Pause: Prognose-Spitze in den nächsten 1,5h, die deutlich über der aktuellen PV-Leistung liegt."""
+    now = time.time()
+    current_w = forecast_index.value_at(now)
+    max_future_w = forecast_index.max_ahead(hours, now)
+    return max_future_w >= min_watt and max_future_w > (current_w * 1.1)
+
+# Grundlast-Schätzer: liest live_history.txt inkrementell (nur neu angehängte Zeilen)
+_baseload = BaseloadEstimator()
 
-    min_slots = int(math.ceil(min_duration_min / 60.0 / interval))
-    
-    # 1. Günstige Blöcke finden
-    cheap_blocks = []
-    current_block = []
-    
-    for i, p in enumerate(prices):
-        if p <= limit:
-            current_block.append(i)
-        else:
-            if len(current_block) >= min_slots:
-                cheap_blocks.append((current_block[0], current_block[-1]))
-            current_block = []
-    if len(current_block) >= min_slots:
-        cheap_blocks.append((current_block[0], current_block[-1]))
-        
-    # 2. Prüfen wo wir sind
-    for start_idx, end_idx in cheap_blocks:
-        if start_idx <= current_idx_float < (end_idx + 1):
-            return "BOOST"
-        
-        slots_1h = 1.0 / interval
-        if (start_idx - slots_1h) <= current_idx_float < start_idx:
-            return "PAUSE"
-            
-    return "NONE"
 
 def get_average_baseload():
     """
-    Ermittelt die durchschnittliche Grundlast des Hauses (in W) aus der jüngeren Historie.
+    Ermittelt die durchschnittliche Grundlast des Hauses (in W) aus den letzten ~2 Stunden.
     Filtert extreme Spitzen (Backofen etc.) heraus, um die "ruhige" Last zu finden.
     """
-    history_path = "/var/www/html/ramdisk/live_history.txt"
-    if not os.path.exists(history_path):
-        return 300.0 # Fallback 300W
-        
     try:
-        with open(history_path, 'r') as f:
-            lines = f.readlines()
-        
-        total_w = 0; count = 0
-        # Analysiere die letzten ~2 Stunden (bei 60s Takt = 120 Zeilen)
-        for line in lines[-120:]:
+        return _baseload.update().value(300.0)
+    except Exception:
+        return 300.0 # Fallback 300W
+
+
+class EnergyManager:
+    """
+    Zustand und Regel-Logik des Energy Managers.
+
+    Die Methoden werden von den Scheduler-Tasks aufgerufen:
+    poll_luxtronik() (WP, max. alle 30s), fetch_e3dc() (E3DC-Snapshot, alle paar Sekunden)
+    und decide() (Regelung, sobald neue Daten vorliegen). Dateien und Telegram-Nachrichten
+    werden über scheduler.post() im Hintergrund geschrieben bzw. verschickt.
+
+    Abfragen und Regelung laufen gleichzeitig (eigene Threads bzw. Event-Loop). Die
+    Abfragen veröffentlichen nur ihr Ergebnis, jeweils als ein Dictionary mit einer
+    einzigen Zuweisung: wp_poll (WP), e3dc_snap (E3DC) und wp_readback (nach dem
+    Schreiben). decide() liest nur diese Referenzen; den Regelzustand (boost_active,
+    ..., Sicherheits-Check, externer Reset) ändert ausschließlich decide().
+    """
+
+    def __init__(self, logger, scheduler):
+        self.logger = logger
+        self.scheduler = scheduler
+        # Exklusiver Zugriff auf den Modbus-Bus der WP (Abfrage und Regelung laufen in getrennten Threads)
+        self.bus_lock = threading.Lock()
+        self.metrics = scheduler.metrics
+        # SHI-Schreibzugriffe werden gesammelt und einmal pro Zyklus gesendet
+        self.wp_writes = RegisterWriteQueue()
+
+        # Konfiguration einmalig laden, danach nur bei Dateiänderung (ConfigWatcher)
+        self.config_watcher = ConfigWatcher(E3DC_CONFIG_PATH)
+        self.cfg = self._load_config()
+        self.writer = StateWriter(RAMDISK_FILE, HISTORY_FILE, BACKUP_DIR, logger=logger, compress=self.cfg.archive_gzip == 1)
+
+        logger.info("Dienst wird gestartet...")
+        self.wp = None
+        self.wp_async = False
+        self.gateway = None
+        wp_ip = self.cfg.luxtronik_ip
+        if self.cfg.luxtronik == 1 and wp_ip:
+            try:
+                # luxtronik_async = 1: WP-Abfrage als Coroutine im Event-Loop statt im Executor-Thread
+                self.wp_async = self.cfg.luxtronik_async == 1
+                self.wp = AsyncLuxtronikModbus(wp_ip) if self.wp_async else LuxtronikModbus(wp_ip)
+                self.wp.on_timing = self.metrics.observe
+                # Zähler, Fehlernummer und Betriebsart nur alle paar Minuten vom Bus lesen
+                self.wp.cache = RegisterCache()
+                logger.info("Luxtronik-Modul aktiv und verbunden.")
+            except Exception as e:
+                logger.error(f"Fehler bei Luxtronik-Initialisierung: {e}")
+                self.wp = None
+
+        # Prüfen, ob der Neustart durch ein Update ausgelöst wurde, um eine Endlosschleife zu verhindern.
+        restarted_by_update = False
+        update_flag_path = "/tmp/em_restarted_by_update.flag"
+        if os.path.exists(update_flag_path):
+            try:
+                restarted_by_update = True
+                os.remove(update_flag_path)
+                logger.info("Neustart durch Update erkannt. Erster Auto-Update-Check wird übersprungen.")
+            except Exception as e:
+                logger.warning(f"Konnte Update-Flag nicht entfernen: {e}")
+
+        # Wenn durch Update neugestartet, den ersten Check überspringen.
+        self.update_checked_today = restarted_by_update
+
+        self.boost_active = False
+        self.price_boost_active = False
+        self.pv_pause_active = False
+        self.pv_pause_start_time = None
+        self.pre_pause_active = False
+        self.deficit_start_time = None
+        self.last_day = datetime.now().day
+        self.daily_boost_counter = 0
+        self.last_pv_boost_time = 0
+        self.last_safety_check_time = 0
+        self.last_decision_time = None
+        self.mb_state = "IDLE"
+        self.mb_running_prio = ""
+
+        self.si_state = "IDLE"
+        self.si_calibrated_power_kw = None
+        self.si_pause_end_ts = None
+        self.si_power_high_since = None
+
+        # Letztes Ergebnis von poll_luxtronik() (Dictionary, wird nur als Ganzes ersetzt)
+        self.wp_poll = None
+        # Zuletzt nach dem Schreiben zurückgelesener SHI-Stand (Zeitpunkt, Status), ebenfalls nur ersetzt
+        self.wp_readback = None
+        # Davon übernommener Stand der Regelung (nur decide() schreibt diese Felder)
+        self.lux_seq = 0
+        self.lux_fresh = False
+        self.wp_data = {}
+        self.wp_status = {}
+        self.at = 20.0
+        self.wq_aus = 10.0
+        self.success = self.wp is None
+        self.wp_error_msg = ""
+
+        # Letzter E3DC-Stand von fetch_e3dc() (Dictionary, wird nur als Ganzes ersetzt)
+        self.live = LiveSnapshotProvider(AWATTAR_DEBUG_PATH)
+        self.e3dc_snap = None
+        self.e3dc_source = None
+        self.e3dc_ts = None
+        self.e3dc_error = False
+
+    def _publish_e3dc(self, e3dc):
+        """Stellt einen E3DC-Stand für decide() bereit; e3dc=None: Abfrage fehlgeschlagen (Defaults, ungültig)."""
+        prev = self.e3dc_snap
+        valid = e3dc is not None
+        e3dc = e3dc if valid else {}
+        timeline = index = None
+        if valid:
+            # Zeitleiste und Prognose-Index nur bei neuen Daten neu aufbauen
+            timeline = PriceTimeline.build(e3dc.get('prices', []), e3dc.get('price_start_hour', 0),
+                                           e3dc.get('price_interval', 1.0), prev and prev["price_timeline"])
+            index = ForecastIndex.build(e3dc.get('forecast', []), prev and prev["forecast_index"])
+        self.e3dc_snap = {
+            "seq": prev["seq"] + 1 if prev else 1, "valid": valid, "data": e3dc,
+            "grid": e3dc.get('grid', 0), "bat": e3dc.get('bat', 0), "soc": e3dc.get('soc', 0),
+            "wb_locked": e3dc.get('wb_locked', False), "current_price": e3dc.get('current_price', 99.9),
+            "price_timeline": timeline, "forecast_index": index,
+        }
+
+    def write_export(self, json_export, append_history):
+        """Schreibt den Status für das Web-Interface (und optional eine History-Zeile)."""
+        self.writer.write_status(json_export)
+        if append_history: self.writer.append_history(json_export)
+
+    def rollover_history(self, date_str, compress=False):
+        """Archiviert die Tages-History beim Tageswechsel und protokolliert die geschriebene Datenmenge."""
+        io = self.writer.stats()
+        self.writer.rollover(date_str, compress)
+        prev = io.get("previous")
+        if prev:
+            self.logger.info(f"Schreiblast {prev['date']}: RAM-Disk {prev['ramdisk'] // 1024} KB, SD-Karte {prev['sd'] // 1024} KB.")
+
+    def restore_state(self):
+        """Stellt Boost- und Morning-Boost/SI-Status nach einem Neustart wieder her."""
+        logger = self.logger
+        if os.path.exists(RAMDISK_FILE):
             try:
-                d = json.loads(line)
-                home = float(d.get("home", 0))
-                if 50 < home < 1500: # Ignoriere 0-Werte und große Verbraucher
-                    total_w += home; count += 1
+                with open(RAMDISK_FILE, 'r') as f:
+                    saved = json.load(f)
+                    if 'ts' in saved:
+                        saved_ts = datetime.fromisoformat(saved['ts'])
+                        if saved_ts.date() == datetime.now().date():
+                            self.daily_boost_counter = saved.get('daily_boost_counter', 0)
+                    self.last_pv_boost_time = saved.get('last_pv_boost_time', 0)
+
+                    if (datetime.now() - saved_ts).total_seconds() < 1200:
+                        if saved.get('boost_active'):
+                            self.boost_active = True
+                            self.pv_pause_active = saved.get('pv_pause_active', False)
+                            self.price_boost_active = saved.get('price_boost_active', False)
+                            self.pre_pause_active = saved.get('pre_pause_active', False)
+                            if self.pv_pause_active: self.pv_pause_start_time = saved.get('pv_pause_start_time', time.time())
+                            logger.info(f"Aktiven Status wiederhergestellt: Boost={self.boost_active}")
             except: pass
-        if count > 10: return total_w / count
-    except: pass
-    return 300.0
 
-def main():
-    logger = setup_logging()
+        if os.path.exists(STATE_FILE):
+            try:
+                with open(STATE_FILE, 'r') as f:
+                    state_data = json.load(f)
+                    if state_data.get('mode') == 'morning_boost' and state_data.get('status') == 'RUNNING':
+                        self.mb_state = 'RUNNING'
+                        self.mb_running_prio = state_data.get('prio', '')
+                        logger.warning(f"Morning-Boost Status wiederhergestellt: RUNNING")
+                    elif state_data.get('mode') == 'super_intelligence':
+                        self.si_state = state_data.get('status', 'IDLE')
+                        if self.si_state != 'IDLE' and self.si_state != 'DONE':
+                            self.si_calibrated_power_kw = state_data.get('calibrated_power')
+                            self.si_pause_end_ts = state_data.get('pause_end_ts')
+                            logger.warning(f"Superintelligence Status wiederhergestellt: {self.si_state}")
+            except: pass
 
-    # Initiales Lesen (einmalig beim Start)
-    luxtronik_enabled = read_e3dc_config_value('luxtronik', 0) == 1
-    wp_ip = read_e3dc_config_value('luxtronik_ip')
-    
-    logger.info("Dienst wird gestartet...")
-    wp = None
-    if luxtronik_enabled and wp_ip:
+        # Init Ramdisk
+        init_json = {"ts": datetime.now().isoformat(), "success": False, "error": "Dienst startet...", "data": {}, "status": {}}
+        try: self.writer.write_status(init_json)
+        except Exception as e: logger.error(f"Fehler beim Schreiben von {RAMDISK_FILE}: {e}")
+
+        grid_limit_init = self.cfg.grid_start_limit
+
+        if self.cfg.auto_mode == 0: logger.info("Automatik-Regelung ist DEAKTIVIERT (Nur Monitoring).")
+        elif not self.wp: logger.info("Nur Lademanagement-Regeln sind aktiv.")
+        else: logger.info(f"Start bei > {abs(grid_limit_init)}W Einspeisung.")
+
+    def _load_config(self):
         try:
-            wp = LuxtronikModbus(wp_ip)
-            logger.info("Luxtronik-Modul aktiv und verbunden.")
-        except Exception as e:
-            logger.error(f"Fehler bei Luxtronik-Initialisierung: {e}")
-            wp = None
+            return EnergyManagerConfig.load(E3DC_CONFIG_PATH, warn=self.logger.warning)
+        except OSError as e:
+            self.logger.error(f"Konfiguration nicht lesbar ({e}), nutze Defaults.")
+            return EnergyManagerConfig()
 
-    # Prüfen, ob der Neustart durch ein Update ausgelöst wurde, um eine Endlosschleife zu verhindern.
-    restarted_by_update = False
-    update_flag_path = "/tmp/em_restarted_by_update.flag"
-    if os.path.exists(update_flag_path):
+    def check_config(self):
+        """Konfiguration nur bei Dateiänderung neu laden und geänderte Parameter melden."""
         try:
-            restarted_by_update = True
-            os.remove(update_flag_path)
-            logger.info("Neustart durch Update erkannt. Erster Auto-Update-Check wird übersprungen.")
+            if self.config_watcher.changed():
+                new_cfg = self._load_config()
+                changes = new_cfg.diff(self.cfg)
+                self.cfg = new_cfg
+                if changes:
+                    self.logger.info(f"Konfiguration aktualisiert: {format_changes(changes)}")
         except Exception as e:
-            logger.warning(f"Konnte Update-Flag nicht entfernen: {e}")
-
-    # Vorab-Deklaration für send_telegram (Closure Scope)
-    TELEGRAM_TOKEN = ''
-    TELEGRAM_CHAT_ID = ''
-    
-    # Wenn durch Update neugestartet, den ersten Check überspringen.
-    update_checked_today = restarted_by_update
-
-    boost_active = False
-    price_boost_active = False
-    pv_pause_active = False
-    pv_pause_start_time = None
-    pre_pause_active = False
-    deficit_start_time = None
-    last_day = datetime.now().day
-    first_run = True
-    daily_boost_counter = 0
-    last_pv_boost_time = 0
-    last_price_warning_time = 0
-    last_safety_check_time = 0
-    mb_state = "IDLE"
-    mb_running_prio = ""
-    
-    si_state = "IDLE"
-    si_calibrated_power_kw = None
-    si_pause_end_ts = None
-    si_power_check_counter = 0
+            self.logger.error(f"Fehler beim Konfigurations-Check: {e}")
 
-    def send_telegram(msg):
+    def _send_telegram_now(self, msg):
         notify_script = "/usr/local/bin/boot_notify.sh"
         if os.path.exists(notify_script):
             try:
@@ -291,146 +357,233 @@ def main():
                 return
             except Exception: pass
 
-        if TELEGRAM_TOKEN and TELEGRAM_CHAT_ID:
+        cfg = self.cfg
+        if cfg.telegram_token and cfg.telegram_chat_id:
             try:
-                url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-                data = {"chat_id": TELEGRAM_CHAT_ID, "text": msg}
+                url = f"https://api.telegram.org/bot{cfg.telegram_token}/sendMessage"
+                data = {"chat_id": cfg.telegram_chat_id, "text": msg}
                 requests.post(url, data=data, timeout=5)
             except: pass
 
-    # Restore Status
-    if os.path.exists(RAMDISK_FILE):
-        try:
-            with open(RAMDISK_FILE, 'r') as f:
-                saved = json.load(f)
-                if 'ts' in saved:
-                    saved_ts = datetime.fromisoformat(saved['ts'])
-                    if saved_ts.date() == datetime.now().date():
-                        daily_boost_counter = saved.get('daily_boost_counter', 0)
-                last_pv_boost_time = saved.get('last_pv_boost_time', 0)                
-                
-                if (datetime.now() - saved_ts).total_seconds() < 1200:
-                    if saved.get('boost_active'):
-                        boost_active = True
-                        pv_pause_active = saved.get('pv_pause_active', False)
-                        price_boost_active = saved.get('price_boost_active', False)
-                        pre_pause_active = saved.get('pre_pause_active', False)
-                        if pv_pause_active: pv_pause_start_time = saved.get('pv_pause_start_time', time.time())
-                        logger.info(f"Aktiven Status wiederhergestellt: Boost={boost_active}")
-        except: pass
-
-    if os.path.exists(STATE_FILE):
-        try:
-            with open(STATE_FILE, 'r') as f:
-                state_data = json.load(f)
-                if state_data.get('mode') == 'morning_boost' and state_data.get('status') == 'RUNNING':
-                    mb_state = 'RUNNING'
-                    mb_running_prio = state_data.get('prio', '')
-                    logger.warning(f"Morning-Boost Status wiederhergestellt: RUNNING")
-                elif state_data.get('mode') == 'super_intelligence':
-                    si_state = state_data.get('status', 'IDLE')
-                    if si_state != 'IDLE' and si_state != 'DONE':
-                        si_calibrated_power_kw = state_data.get('calibrated_power')                        
-                        si_pause_end_ts = state_data.get('pause_end_ts')
-                        logger.warning(f"Superintelligence Status wiederhergestellt: {si_state}")
-        except: pass
-
-    # Init Ramdisk
-    init_json = {"ts": datetime.now().isoformat(), "success": False, "error": "Dienst startet...", "data": {}, "status": {}}
-    with open(RAMDISK_FILE, 'w') as f: json.dump(init_json, f)
-    try: os.chmod(RAMDISK_FILE, 0o664)
-    except: pass
-
-    # Config Cache Init
-    config_cache = load_e3dc_config_dict()
-    if os.path.exists(E3DC_CONFIG_PATH):
-        config_mtime = os.path.getmtime(E3DC_CONFIG_PATH)
-    else:
-        config_mtime = 0
-
-    auto_mode_init = get_cfg_int(config_cache, 'auto_mode', 1)
-    grid_limit_init = get_cfg_value(config_cache, 'GRID_START_LIMIT', -3500)
-
-    if auto_mode_init == 0: logger.info("Automatik-Regelung ist DEAKTIVIERT (Nur Monitoring).")
-    elif not wp: logger.info("Nur Lademanagement-Regeln sind aktiv.")
-    else: logger.info(f"Start bei > {abs(grid_limit_init)}W Einspeisung.")
-
-    while True:
-        now = datetime.now()
-        
-        # 1. Konfiguration nur bei Dateiänderung neu laden (Smart Caching)
+    def send_telegram(self, msg):
+        """Verschickt eine Nachricht im Hintergrund (blockiert die Regelung nicht)."""
+        self.scheduler.post("telegram", self._send_telegram_now, msg)
+
+    @contextmanager
+    def wp_session(self):
+        """
+        Exklusiver Zugriff auf die WP. Liefert None, wenn keine Verbindung möglich ist.
+        Die Verbindung bleibt offen (ModbusSession) und wird erst nach Leerlauf oder Fehler neu aufgebaut.
+        """
+        if not self.wp:
+            yield None
+            return
+        with self.bus_lock:
+            yield self.wp if self.wp.connect() else None
+
+    def _send_wp_writes(self, client, writes, report):
+        """Sendet die entnommenen Schreibzugriffe über eine offene Verbindung und meldet die Einsparung."""
+        return self._log_wp_writes(self.wp_writes.apply(client, writes, report))
+
+    async def _send_wp_writes_async(self, writes, report):
+        """Wie _send_wp_writes(), über den asyncio-Client (verbindet bei Bedarf in request(), unter dessen Lock)."""
+        results, readback = await self.wp.write_shi(writes) if writes else ([], {})
+        if writes and not any(results) and not readback: self.logger.warning("Verbindung zur WP fehlgeschlagen (Schreiben).")
+        return self._log_wp_writes(self.wp_writes.record(writes, results, report, readback))
+
+    def _log_wp_writes(self, report):
+        # Neue Sollwerte/Modi ändern die Betriebsart der WP -> beim nächsten Scan neu lesen
+        if report["written"] and self.wp and self.wp.cache: self.wp.cache.invalidate('mode')
+        # Zurückgelesener SHI-Stand gilt sofort (Sync Check, Export), nicht erst nach der nächsten Abfrage.
+        # Nur veröffentlichen: wp_status setzt allein decide() (_wp_status_from())
+        if report["status"]: self.wp_readback = (time.time(), report["status"])
+        if report["written"] or report["failed"]:
+            msg = f"Modbus: {report['written']} Register geschrieben, {report['saved']} eingespart"
+            if report["failed"]: msg += f", {report['failed']} fehlgeschlagen"
+            if report["mismatch"]: msg += f" ({report['mismatch']} von der WP nicht übernommen)"
+            self.logger.info(msg + ".")
+        elif report["saved"]:
+            self.logger.debug(f"Modbus: {report['saved']} Schreibzugriffe eingespart (Werte bereits gesetzt).")
+        return report
+
+    def flush_wp_writes(self, writes=None, report=None):
+        """Sendet die in diesem Zyklus gesammelten (oder die übergebenen) SHI-Schreibzugriffe über eine einzige Verbindung."""
+        if writes is None: writes, report = self.wp_writes.take()
+        if not self.wp: return None
+        if self.wp_async:
+            return self.scheduler.run_coroutine(self._send_wp_writes_async(writes, report), timeout=60)
+        if not writes:
+            # Alles bereits gesetzt -> keine Verbindung aufbauen
+            return self._send_wp_writes(None, writes, report)
+        with self.wp_session() as c:
+            if c is None: self.logger.warning("Verbindung zur WP fehlgeschlagen (Schreiben).")
+            return self._send_wp_writes(c, writes, report)
+
+    def poll_luxtronik(self):
+        """Liest Sensoren und SHI-Status der WP (Scheduler-Task, höchstens alle 30s)."""
+        with self.wp_session() as wp:
+            wp_data = wp.read_all_sensors() if wp else {}
+            wp_status = wp.read_shi_status() if wp else {}
+        self._publish_wp_poll(wp is not None, wp_data, wp_status)
+        self.scheduler.trigger("decision")
+
+    async def poll_luxtronik_async(self):
+        """poll_luxtronik() mit dem asyncio-Client: Wartezeiten auf die WP blockieren keinen Thread."""
+        connected = await self.wp.connect()
+        wp_data = await self.wp.read_all_sensors() if connected else {}
+        wp_status = await self.wp.read_shi_status() if connected else {}
+        self._publish_wp_poll(connected, wp_data, wp_status)
+        self.scheduler.trigger("decision")
+
+    def _publish_wp_poll(self, connected, wp_data, wp_status):
+        """Stellt das Ergebnis einer WP-Abfrage für decide() und das Gateway bereit (ändert keinen Regelzustand)."""
+        if not connected: self.logger.warning("Verbindung zur WP fehlgeschlagen")
+        prev = self.wp_poll
+        self.wp_poll = {
+            "seq": prev["seq"] + 1 if prev else 1, "ts": time.time(), "success": connected,
+            "data": wp_data, "status": wp_status,
+            "error": "" if connected else "Verbindung zur Wärmepumpe im Modbus-Netzwerk fehlgeschlagen.",
+        }
+
+    def _adopt_wp_poll(self, cfg):
+        """
+        Übernimmt eine neue WP-Abfrage in den Regelzustand (Sicherheits-Check, externer Reset).
+        Läuft nur in decide(); Reset-Schreibzugriffe gehen mit dem Flush am Ende des Zyklus raus.
+        """
+        poll = self.wp_poll
+        if poll is None or poll["seq"] == self.lux_seq: return
+        logger = self.logger
+        wp_data = poll["data"]
+        wp_status = self._wp_status_from(poll)
+        self.lux_seq = poll["seq"]
+        self.lux_fresh = True
+        self.wp_data = wp_data
+        self.wp_status = wp_status
+        self.success = poll["success"]
+        self.wp_error_msg = poll["error"]
+        self.at = wp_data.get('Aussentemp', wp_data.get('Aussentemp_Mittel', 20.0)) if poll["success"] else 20.0
+        self.wq_aus = wp_data.get('Sole_Aus', wp_data.get('WQ_Austritt', 10.0)) if poll["success"] else 10.0
+        if not poll["success"]: return
+
+        self.wp_writes.observe(wp_status)
+
+        # Sicherheits-Check
+        if not self.boost_active and not os.path.exists(FLAG_FILE) and (wp_status.get('WW_Mode') == 1 or wp_status.get('HZ_Mode') == 1):
+            hz_set = wp_status.get('HZ_Setpoint', 0)
+            if wp_status.get('HZ_Mode') == 1 and abs(hz_set - 20.0) < 1.0:
+                 if cfg.pv_pause_enable == 1:
+                     logger.info("Erkenne aktiven Pause-Status (20°C). Übernehme.")
+                     self.boost_active = True
+                     self.pv_pause_active = True
+                     if not self.pv_pause_start_time: self.pv_pause_start_time = time.time()
+            else:
+                if (time.time() - self.last_safety_check_time) > 900:
+                    msg = f"SICHERHEIT: Unerwarteter Boost-Status (WW={wp_status.get('WW_Mode')}, HZ={wp_status.get('HZ_Mode')}). Reset."
+                    logger.warning(msg)
+                    self.send_telegram(f"⚠️ {msg}")
+                    self.last_safety_check_time = time.time()
+
+                self.wp_writes.write_hz_boost(0, 32.0)
+                self.wp_writes.write_ww_boost(0, cfg.www)
+
+        # Externer Reset Check
+        if self.boost_active and wp_status:
+            if wp_status.get('WW_Mode') != 1 and wp_status.get('HZ_Mode') != 1:
+                logger.info("Boost-Modus extern deaktiviert. Reset.")
+                self.boost_active = False
+                self.deficit_start_time = None
+                self.price_boost_active = False
+                self.pre_pause_active = False
+                self.pv_pause_active = False
+
+    def _wp_status_from(self, poll):
+        """SHI-Status der Abfrage, ergänzt um einen später zurückgelesenen Stand (z.B. nach Boost-Start)."""
+        rb = self.wp_readback
+        if rb and rb[0] > poll["ts"]: return {**poll["status"], **rb[1]}
+        return poll["status"]
+
+    def gateway_snapshot(self):
+        """Letzter WP-Stand für das Gateway (gleiches Format wie get_luxtronik.py, ohne Buszugriff)."""
+        poll = self.wp_poll
+        if poll is None:
+            return {"ts": None, "age": snapshot_age(None), "success": False, "data": {}, "status": {}, "error": ""}
+        return {"ts": poll["ts"], "age": snapshot_age(poll["ts"]), "success": poll["success"],
+                "data": poll["data"], "status": self._wp_status_from(poll), "error": poll["error"]}
+
+    async def gateway_write(self, ww=None, hz=None):
+        """
+        Schreibzugriffe von set_manual_boost.py über die eigene Verbindung (Taktung, Bus-Lock).
+        Eigene Queue: gesendet werden nur diese Aufträge, nicht die eines laufenden decide().
+        """
+        q = self.wp_writes.batch()
+        if ww: q.write_ww_boost(*ww)
+        if hz: q.write_hz_boost(*hz)
+        writes, report = q.take()
+        if self.wp_async: return await self._send_wp_writes_async(writes, report)
+        return await asyncio.get_running_loop().run_in_executor(None, self.flush_wp_writes, writes, report)
+
+    def fetch_e3dc(self):
+        """Holt den aktuellen E3DC-Snapshot (Scheduler-Task). Neue Daten lösen eine Entscheidung aus."""
+        t0 = time.monotonic()
         try:
-            if os.path.exists(E3DC_CONFIG_PATH):
-                current_mtime = os.path.getmtime(E3DC_CONFIG_PATH)
-                if current_mtime != config_mtime:
-                    config_cache = load_e3dc_config_dict()
-                    config_mtime = current_mtime
-                    logger.info("Konfiguration aktualisiert (Dateiänderung erkannt).")
+            e3dc = self.live.get(self.cfg)
         except Exception as e:
-            logger.error(f"Fehler beim Konfigurations-Check: {e}")
-        
-        current_config = config_cache
-        
+            self._publish_e3dc(None)
+            if not self.e3dc_error:
+                self.e3dc_error = True
+                if self.cfg.auto_mode == 1 or os.path.exists(FLAG_FILE):
+                    self.logger.error(f"Fehler bei E3DC Abfrage: {e}")
+            return
+
+        if self.e3dc_error:
+            self.e3dc_error = False
+            self.logger.info("E3DC Abfrage wieder erfolgreich.")
+        self.metrics.observe(f"e3dc_fetch_{self.live.source}", time.monotonic() - t0)
+        if self.live.source != self.e3dc_source:
+            self.e3dc_source = self.live.source
+            self.logger.info(f"E3DC-Daten über Quelle '{self.e3dc_source}'.")
+        self._publish_e3dc(e3dc)
+
+        # Nur bei neuem Snapshot (live.txt geändert) eine Entscheidung auslösen
+        if e3dc.get('ts') != self.e3dc_ts:
+            self.e3dc_ts = e3dc.get('ts')
+            self.scheduler.trigger("decision")
+
+    def decide(self):
+        """Regel-Logik (Scheduler-Task, läuft bei neuen Daten, spätestens alle 30s)."""
+        # Erst entscheiden, wenn von jeder Quelle mindestens ein Abfrageversuch vorliegt
+        if self.e3dc_snap is None or (self.wp and self.wp_poll is None):
+            return
+
+        logger = self.logger
+        now = datetime.now()
+        # Boost-Minuten seit der letzten Entscheidung (Takt ist nicht mehr fest 30s)
+        elapsed_min = 0.5
+        if self.last_decision_time is not None:
+            elapsed_min = min(60.0, max(0.0, time.time() - self.last_decision_time)) / 60.0
+        self.last_decision_time = time.time()
+
+        with self.metrics.span("config_check"):
+            self.check_config()
+        cfg = self.cfg
+        # Laufzeit der einzelnen Regelblöcke (decide_manual, decide_si, ...)
+        lap = self.metrics.lap("decide")
+
         try:
-            # Dynamisches Nachladen wichtiger Parameter sicher im Try-Block
-            AUTO_UPDATE_ENABLE = get_cfg_int(current_config, 'auto_update_enable', 0)
-            update_time_str = str(get_cfg_value(current_config, 'auto_update_time', "23:00"))
-            try: update_hour, update_minute = map(int, update_time_str.split(':'))
-            except: update_hour, update_minute = 23, 0
-                
-            GRID_START_LIMIT = get_cfg_value(current_config, 'GRID_START_LIMIT', -3500)
-            STOP_DELAY_MINUTES = get_cfg_value(current_config, 'stop_delay_minutes', 10)
-            MIN_SOC = get_cfg_value(current_config, 'MIN_SOC', 80)
-            AUTO_MODE = get_cfg_int(current_config, 'auto_mode', 1)
-            AT_LIMIT = get_cfg_value(current_config, 'AT_LIMIT', 10.0)
-            # Gecachte Sollwerte für die Schleife
-            CONF_WWS = get_cfg_value(current_config, 'WWS', 50.0)
-            CONF_WWW = get_cfg_value(current_config, 'WWW', 48.0)
-            CONF_HZ  = get_cfg_value(current_config, 'HZ', 32.0)
-
-            PRICE_BOOST_ENABLE = get_cfg_value(current_config, 'price_boost_enable', 0)
-            PRICE_LIMIT = get_cfg_value(current_config, 'price_limit', 20.0)
-            PRICE_MIN_DURATION = get_cfg_value(current_config, 'price_min_duration', 60)
-            PRICE_MAX_DAILY = get_cfg_value(current_config, 'price_max_daily', 180)
-            PRICE_HARD_LIMIT = get_cfg_value(current_config, 'price_hard_limit', -99.0)
-            WQ_MIN_TEMP = get_cfg_value(current_config, 'wq_min_temp', 1.0)
-            RL_SOURCE = str(get_cfg_value(current_config, 'rl_source', 'internal'))
-            MANUAL_BOOST_MIN_SOC = get_cfg_value(current_config, 'manual_boost_min_soc', 25)
-            MANUAL_BOOST_MAX_DURATION = get_cfg_value(current_config, 'manual_boost_max_duration', 180)
-
-            MB_ENABLE = get_cfg_value(current_config, 'morning_boost_enable', 0)
-            MB_PRIO = str(get_cfg_value(current_config, 'morning_boost_prio', 'wallbox'))
-            MB_WB_POWER = get_cfg_value(current_config, 'morning_boost_wb_power', 7.0)
-            MB_MIN_HOURS = get_cfg_value(current_config, 'morning_boost_min_hours', 3)
-            MB_MIN_PV_PCT = get_cfg_value(current_config, 'morning_boost_min_pv_pct', 50.0)
-            MB_TARGET_SOC = get_cfg_value(current_config, 'morning_boost_target_soc', 20)
-            MB_DEADLINE = get_cfg_int(current_config, 'morning_boost_deadline', 8)
-
-            SI_ENABLE = get_cfg_value(current_config, 'super_intelligence_enable', 0)
-            SI_DEADLINE = get_cfg_int(current_config, 'super_intelligence_deadline', 8)
-
-            TELEGRAM_TOKEN = str(get_cfg_value(current_config, 'telegram_token', ''))
-            TELEGRAM_CHAT_ID = str(get_cfg_value(current_config, 'telegram_chat_id', ''))
-
-            PV_PAUSE_ENABLE = get_cfg_value(current_config, 'pv_pause_enable', 0)
-            PV_PAUSE_SOC = get_cfg_value(current_config, 'pv_pause_soc', 80)
-            PV_PAUSE_WATT = get_cfg_value(current_config, 'pv_pause_watt', 3000.0)
-            PV_PAUSE_TIMEOUT_MINUTES = get_cfg_value(current_config, 'pv_pause_timeout_minutes', 120)
-            PV_PAUSE_MIN_AT = get_cfg_value(current_config, 'pv_pause_min_at', 0.0)
-            
             # Auto-Update Check
-            if AUTO_UPDATE_ENABLE == 1:
+            if cfg.auto_update_enable == 1:
+                update_hour, update_minute = cfg.auto_update_time
                 if now.hour == update_hour and now.minute == update_minute:
-                    if not update_checked_today:
+                    if not self.update_checked_today:
                         logger.info(f"Starte tägliche Update-Prüfung ({update_hour:02d}:{update_minute:02d} Uhr)...")
                         install_root = os.path.abspath(os.path.join(script_dir, "../../"))
                         self_update_script = os.path.join(install_root, "Installer", "self_update.py")
-                        
+
                         if os.path.exists(self_update_script):
                             try:
                                 log_file = os.path.join(LOG_DIR, "auto_self_update.log")
                                 cmd = f"sudo /usr/bin/python3 {self_update_script} --silent"
-                                
+
                                 with open(log_file, "w") as f:
                                     f.write(f"=== Starting Auto-Update at {datetime.now()} ===\n")
                                     f.write(f"Command: {cmd}\n---\n")
@@ -443,162 +596,97 @@ def main():
                                 logger.error(f"Fehler beim Starten des Auto-Updates: {e}")
                         else:
                             logger.error("Auto-Update fehlgeschlagen: self_update.py nicht gefunden.")
-                        update_checked_today = True
+                        self.update_checked_today = True
                 else:
-                    update_checked_today = False
-
-            wp_data = {}   
-            wp_status = {} 
-            at = 20.0 
-            success = False 
-            wq_aus = 10.0 
-            wp_error_msg = ""
-            if not wp: success = True
-
-            # 1. Daten von WP holen
-            if wp:
-                if wp.connect():
-                    wp_data = wp.read_all_sensors()
-                    time.sleep(0.5)
-                    wp_status = wp.read_shi_status()
-                    
-                    wq_aus = wp_data.get('Sole_Aus', wp_data.get('WQ_Austritt', 10.0))
-                    at = wp_data.get('Aussentemp', wp_data.get('Aussentemp_Mittel', 20.0))
-                    
-                    if first_run: first_run = False
-                    
-                    # Sicherheits-Check
-                    if not boost_active and not os.path.exists(FLAG_FILE) and (wp_status.get('WW_Mode') == 1 or wp_status.get('HZ_Mode') == 1):
-                        hz_set = wp_status.get('HZ_Setpoint', 0)
-                        if wp_status.get('HZ_Mode') == 1 and abs(hz_set - 20.0) < 1.0:
-                             if PV_PAUSE_ENABLE == 1:
-                                 logger.info("Erkenne aktiven Pause-Status (20°C). Übernehme.")
-                                 boost_active = True
-                                 pv_pause_active = True
-                                 if not pv_pause_start_time: pv_pause_start_time = time.time()
-                        else:
-                            if (time.time() - last_safety_check_time) > 900:
-                                msg = f"SICHERHEIT: Unerwarteter Boost-Status (WW={wp_status.get('WW_Mode')}, HZ={wp_status.get('HZ_Mode')}). Reset."
-                                logger.warning(msg)
-                                send_telegram(f"⚠️ {msg}")
-                                last_safety_check_time = time.time()
-                            
-                            wp.write_hz_boost(0, 32.0)
-                            wp.write_ww_boost(0, CONF_WWW)
-                        
-                        wp.close()
-                        success = True
-
-                    # Externer Reset Check
-                    if boost_active and wp_status:
-                        if wp_status.get('WW_Mode') != 1 and wp_status.get('HZ_Mode') != 1:
-                            logger.info("Boost-Modus extern deaktiviert. Reset.")
-                            boost_active = False
-                            deficit_start_time = None
-                            price_boost_active = False
-                            pre_pause_active = False
-                            pv_pause_active = False
-                    
-                    wp.close()
-                    success = True 
-                else:
-                    wp_error_msg = "Verbindung zur Wärmepumpe im Modbus-Netzwerk fehlgeschlagen."
-                    logger.warning("Verbindung zur WP fehlgeschlagen")
-
-            # 2. E3DC Daten holen
-            e3dc = {}
-            grid = 0
-            bat = 0
-            soc = 0
-            wb_locked = False
-            current_price = 99.9
-            prices = []
-            forecast = []
-            price_start_hour = 0
-            price_interval = 1.0
-            e3dc_valid = False
-            
-            try:
-                r = requests.get("http://localhost/get_live_json.php", timeout=5)
-                if r.status_code == 200:
-                    e3dc = r.json()
-                    grid = e3dc.get('grid', 0)
-                    bat = e3dc.get('bat', 0)
-                    soc = e3dc.get('soc', 0)
-                    wb_locked = e3dc.get('wb_locked', False)
-                    current_price = e3dc.get('current_price', 99.9)
-                    prices = e3dc.get('prices', [])
-                    forecast = e3dc.get('forecast', [])
-                    price_start_hour = e3dc.get('price_start_hour', 0)
-                    price_interval = e3dc.get('price_interval', 1.0)
-                    e3dc_valid = True
-            except Exception as e:
-                if AUTO_MODE == 1 or os.path.exists(FLAG_FILE):
-                    logger.error(f"Fehler bei E3DC Abfrage: {e}")
+                    self.update_checked_today = False
+
+            # 1. Letzter Stand der WP (poll_luxtronik)
+            if self.wp:
+                self._adopt_wp_poll(cfg)
+                if self.wp_poll: self.wp_status = self._wp_status_from(self.wp_poll)
+            wp = self.wp
+            q = self.wp_writes
+            wp_data = self.wp_data
+            wp_status = self.wp_status
+            at = self.at
+            wq_aus = self.wq_aus
+
+            # 2. Letzter E3DC-Snapshot (fetch_e3dc), einmal gelesen: alle Werte aus demselben Abruf
+            snap = self.e3dc_snap
+            e3dc = snap["data"]
+            grid = snap["grid"]
+            bat = snap["bat"]
+            soc = snap["soc"]
+            wb_locked = snap["wb_locked"]
+            current_price = snap["current_price"]
+            price_timeline = snap["price_timeline"]
+            forecast_index = snap["forecast_index"]
+            e3dc_valid = snap["valid"]
+
+            lap.mark("update_check")
 
             # Manueller Boost Check
             if os.path.exists(FLAG_FILE) and wp:
                 try:
-                    if wq_aus < WQ_MIN_TEMP:
+                    if wq_aus < cfg.wq_min_temp:
                         logger.warning(f"NOT-AUS (Manuell): WQ Aus zu kalt ({wq_aus}°C).")
-                        if wp and wp.connect():
-                            wp.write_hz_boost(0); wp.write_ww_boost(0, CONF_WWW); wp.close()
+                        q.write_hz_boost(0); q.write_ww_boost(0, cfg.www)
                         os.remove(FLAG_FILE)
-                    elif soc < MANUAL_BOOST_MIN_SOC:                        
+                    elif soc < cfg.manual_boost_min_soc:
                         logger.info(f"Manueller Boost gestoppt: SoC niedrig ({soc}%).")
-                        if wp and wp.connect():
-                            wp.write_hz_boost(0); wp.write_ww_boost(0, CONF_WWW); wp.close()
+                        q.write_hz_boost(0); q.write_ww_boost(0, cfg.www)
                         os.remove(FLAG_FILE)
-                    elif (time.time() - os.path.getmtime(FLAG_FILE)) > (MANUAL_BOOST_MAX_DURATION * 60):
+                    elif (time.time() - os.path.getmtime(FLAG_FILE)) > (cfg.manual_boost_max_duration * 60):
                         logger.info("Manueller Boost abgelaufen.")
-                        if wp and wp.connect():
-                            wp.write_hz_boost(0); wp.write_ww_boost(0, CONF_WWW); wp.close()
+                        q.write_hz_boost(0); q.write_ww_boost(0, cfg.www)
                         os.remove(FLAG_FILE)
                 except Exception as e: logger.error(f"Fehler Manual-Boost: {e}")
 
+            lap.mark("manual")
+
             # --- SUPERINTELLIGENCE LOGIK ---
-            if SI_ENABLE == 1:
-                si_target_soc = MANUAL_BOOST_MIN_SOC
-                si_deadline_ts = datetime(now.year, now.month, now.day, SI_DEADLINE, 0, 0)
+            if cfg.si_enable == 1:
+                si_target_soc = cfg.manual_boost_min_soc
+                si_deadline_ts = datetime(now.year, now.month, now.day, cfg.si_deadline, 0, 0)
 
-                if si_state == "PAUSING" and si_pause_end_ts and now >= datetime.fromtimestamp(si_pause_end_ts):
+                if self.si_state == "PAUSING" and self.si_pause_end_ts and now >= datetime.fromtimestamp(self.si_pause_end_ts):
                     logger.info("Superintelligence: Pause beendet.")
                     write_e3dc_config_value('wbmode', 10)
-                    si_state = "RUNNING"
+                    self.si_state = "RUNNING"
 
-                if si_state == "IDLE" and now < si_deadline_ts:
+                if self.si_state == "IDLE" and now < si_deadline_ts:
                     high_hours, pv_sum = get_forecast_data()
-                    if high_hours >= 8.0 and pv_sum >= 1.5 * (100 - si_target_soc):                        
+                    if high_hours >= 8.0 and pv_sum >= 1.5 * (100 - si_target_soc):
                         logger.info(f"Superintelligence geplant! (Prog: {high_hours}h, {pv_sum:.1f}% PV)")
-                        si_state = "PLANNED"
-                
-                if si_state == "PLANNED":
-                    cap_kwh = float(get_cfg_value(current_config, 'speichergroesse', 10.0))
+                        self.si_state = "PLANNED"
+
+                if self.si_state == "PLANNED":
+                    cap_kwh = cfg.speichergroesse
                     energy_needed_kwh = (max(0, soc - si_target_soc) / 100.0) * cap_kwh
-                    assumed_power_kw = MB_WB_POWER + 0.5
+                    assumed_power_kw = cfg.mb_wb_power + 0.5
                     duration_h = energy_needed_kwh / assumed_power_kw if assumed_power_kw > 0 else 0
                     start_ts = si_deadline_ts - timedelta(hours=duration_h)
-                    
+
                     if now >= start_ts:
                         logger.info(f"Starte Superintelligence. Ziel: {si_target_soc}%.")
-                        orig_mode = get_cfg_value(current_config, 'wbmode')
-                        orig_min = get_cfg_value(current_config, 'wbminsoc')
+                        orig_mode = cfg.wbmode
+                        orig_min = cfg.wbminsoc
                         with open(STATE_FILE, 'w') as f:
                             json.dump({'mode': 'super_intelligence', 'status': 'RUNNING', 'orig_wbmode': orig_mode, 'orig_wbminsoc': orig_min}, f)
                         try: os.chmod(STATE_FILE, 0o666)
                         except: pass
                         write_e3dc_config_value('wbminsoc', si_target_soc)
                         write_e3dc_config_value('wbmode', 10)
-                        si_state = "RUNNING"
-                        si_power_check_counter = 0
-                        si_calibrated_power_kw = None
+                        self.si_state = "RUNNING"
+                        self.si_power_high_since = None
+                        self.si_calibrated_power_kw = None
 
-                if si_state == "RUNNING":
+                if self.si_state == "RUNNING":
                     # Dynamische Ziel-Berechnung (Grundlast-Kompensation)
-                    cap_kwh = float(get_cfg_value(current_config, 'speichergroesse', 10.0))
+                    cap_kwh = cfg.speichergroesse
                     hours_left = (si_deadline_ts - now).total_seconds() / 3600.0
                     avg_baseload_kw = get_average_baseload() / 1000.0
-                    
+
                     natural_drain_soc = ((avg_baseload_kw * hours_left) / cap_kwh) * 100 if cap_kwh > 0 else 0
                     dynamic_target_soc = si_target_soc + natural_drain_soc
 
@@ -609,79 +697,81 @@ def main():
                             write_e3dc_config_value('wbmode', saved.get('orig_wbmode', 4))
                             write_e3dc_config_value('wbminsoc', saved.get('orig_wbminsoc', 50))
                             os.remove(STATE_FILE)
-                        si_state = "DONE"
+                        self.si_state = "DONE"
                         logger.info(f"SI Ziel erreicht: SoC={soc}% (Dynamisches Ziel war {dynamic_target_soc:.1f}% inkl. {natural_drain_soc:.1f}% Puffer für Grundlast).")
                     else:
                         actual_wb_power_w = e3dc.get('wb', 0)
-                        if si_calibrated_power_kw is None and actual_wb_power_w > 1000:
-                            si_power_check_counter += 1
-                            if si_power_check_counter >= 3:
-                                si_calibrated_power_kw = actual_wb_power_w / 1000.0
-                                logger.info(f"SI: Kalibriert auf {si_calibrated_power_kw:.2f} kW.")
+                        if self.si_calibrated_power_kw is None and actual_wb_power_w > 1000:
+                            # Erst kalibrieren, wenn die Ladeleistung stabil anliegt
+                            if self.si_power_high_since is None:
+                                self.si_power_high_since = time.time()
+                            elif (time.time() - self.si_power_high_since) >= SI_CALIBRATION_SECONDS:
+                                self.si_calibrated_power_kw = actual_wb_power_w / 1000.0
+                                logger.info(f"SI: Kalibriert auf {self.si_calibrated_power_kw:.2f} kW.")
                                 with open(STATE_FILE, 'r+') as f:
                                     d = json.load(f)
-                                    d['calibrated_power'] = si_calibrated_power_kw
+                                    d['calibrated_power'] = self.si_calibrated_power_kw
                                     f.seek(0); f.truncate(); json.dump(d, f)
                         elif actual_wb_power_w < 1000:
-                            si_power_check_counter = 0
+                            self.si_power_high_since = None
 
-                        if si_calibrated_power_kw is not None:
-                            cap_kwh = float(get_cfg_value(current_config, 'speichergroesse', 10.0))
+                        if self.si_calibrated_power_kw is not None:
+                            cap_kwh = cfg.speichergroesse
                             remaining_energy = ((soc - dynamic_target_soc) / 100.0) * cap_kwh
-                            power_kw = si_calibrated_power_kw + 0.5
+                            power_kw = self.si_calibrated_power_kw + 0.5
                             needed_h = remaining_energy / power_kw if power_kw > 0 else 99
                             req_start = si_deadline_ts - timedelta(hours=needed_h)
 
                             if now < req_start:
                                 pause_s = (req_start - now).total_seconds()
-                                if pause_s > 120:                                    
+                                if pause_s > 120:
                                     logger.info(f"SI: Pause für {pause_s/60:.1f} Min.")
-                                    si_pause_end_ts = time.time() + pause_s
-                                    si_state = "PAUSING"
+                                    self.si_pause_end_ts = time.time() + pause_s
+                                    self.si_state = "PAUSING"
                                     with open(STATE_FILE, 'r+') as f:
                                         d = json.load(f)
-                                        d['status'] = 'PAUSING'; d['pause_end_ts'] = si_pause_end_ts
+                                        d['status'] = 'PAUSING'; d['pause_end_ts'] = self.si_pause_end_ts
                                         f.seek(0); f.truncate(); json.dump(d, f)
                                         write_e3dc_config_value('wbmode', d.get('orig_wbmode', 4))
 
-            if now.hour == 0 and now.minute < 2 and (si_state == "DONE" or si_state == "IDLE"):
-                si_state = "IDLE"; si_calibrated_power_kw = None
+            if now.hour == 0 and now.minute < 2 and (self.si_state == "DONE" or self.si_state == "IDLE"):
+                self.si_state = "IDLE"; self.si_calibrated_power_kw = None
 
             # --- MORNING BOOST ---
-            elif MB_ENABLE == 1:
-                if mb_state == "IDLE" and now.hour < MB_DEADLINE:
+            elif cfg.mb_enable == 1:
+                if self.mb_state == "IDLE" and now.hour < cfg.mb_deadline:
                     high_hours, pv_sum = get_forecast_data()
-                    if high_hours >= MB_MIN_HOURS and pv_sum >= MB_MIN_PV_PCT:                            
+                    if high_hours >= cfg.mb_min_hours and pv_sum >= cfg.mb_min_pv_pct:
                         logger.info(f"Morning-Boost geplant! ({high_hours}h voll)")
-                        mb_state = "PLANNED"
-                
-                if mb_state == "PLANNED":
+                        self.mb_state = "PLANNED"
+
+                if self.mb_state == "PLANNED":
                     eff_prio = None
-                    if MB_PRIO == 'wallbox': eff_prio = 'wallbox' if wb_locked else ('heatpump' if wp else None)
-                    elif MB_PRIO == 'wallbox_only': eff_prio = 'wallbox' if wb_locked else None
-                    elif MB_PRIO == 'heatpump' and wp: eff_prio = 'heatpump'
+                    if cfg.mb_prio == 'wallbox': eff_prio = 'wallbox' if wb_locked else ('heatpump' if wp else None)
+                    elif cfg.mb_prio == 'wallbox_only': eff_prio = 'wallbox' if wb_locked else None
+                    elif cfg.mb_prio == 'heatpump' and wp: eff_prio = 'heatpump'
 
                     if eff_prio:
-                        cap_kwh = float(get_cfg_value(current_config, 'speichergroesse', 10.0))
-                        en_need = (max(0, soc - MB_TARGET_SOC) / 100.0) * cap_kwh
+                        cap_kwh = cfg.speichergroesse
+                        en_need = (max(0, soc - cfg.mb_target_soc) / 100.0) * cap_kwh
                         p_kw = 0.5
-                        if eff_prio == 'wallbox': p_kw += MB_WB_POWER
-                        else: p_kw += float(get_cfg_value(current_config, 'wpmax', 4.0))
-                        
+                        if eff_prio == 'wallbox': p_kw += cfg.mb_wb_power
+                        else: p_kw += cfg.wpmax
+
                         dur_h = en_need / p_kw if p_kw > 0 else 0
-                        deadline_ts = datetime(now.year, now.month, now.day, MB_DEADLINE, 0, 0)
+                        deadline_ts = datetime(now.year, now.month, now.day, cfg.mb_deadline, 0, 0)
                         start_ts = deadline_ts - timedelta(hours=dur_h)
-                        
+
                         if now >= start_ts:
-                            logger.info(f"Starte Morning-Boost ({eff_prio}). Ziel: {MB_TARGET_SOC}%.")
+                            logger.info(f"Starte Morning-Boost ({eff_prio}). Ziel: {cfg.mb_target_soc}%.")
                             if eff_prio == 'wallbox':
-                                orig_mode = get_cfg_value(current_config, 'wbmode')
-                                orig_min = get_cfg_value(current_config, 'wbminsoc')
+                                orig_mode = cfg.wbmode
+                                orig_min = cfg.wbminsoc
                                 with open(STATE_FILE, 'w') as f:
                                     json.dump({'mode': 'morning_boost', 'status': 'RUNNING', 'prio': 'wallbox', 'orig_wbmode': orig_mode, 'orig_wbminsoc': orig_min}, f)
                                 try: os.chmod(STATE_FILE, 0o666)
                                 except: pass
-                                write_e3dc_config_value('wbminsoc', MB_TARGET_SOC)
+                                write_e3dc_config_value('wbminsoc', cfg.mb_target_soc)
                                 write_e3dc_config_value('wbmode', 10)
                             else:
                                 with open(STATE_FILE, 'w') as f:
@@ -689,20 +779,20 @@ def main():
                                 try: os.chmod(STATE_FILE, 0o666)
                                 except: pass
                                 with open(FLAG_FILE, 'w') as f: f.write("1")
-                            mb_running_prio = eff_prio
-                            mb_state = "RUNNING"
+                            self.mb_running_prio = eff_prio
+                            self.mb_state = "RUNNING"
 
-                if mb_state == "RUNNING":
+                if self.mb_state == "RUNNING":
                     # Auch beim Morning Boost den Puffer für die Grundlast einbauen
-                    cap_kwh = float(get_cfg_value(current_config, 'speichergroesse', 10.0))
-                    deadline_ts = datetime(now.year, now.month, now.day, MB_DEADLINE, 0, 0)
+                    cap_kwh = cfg.speichergroesse
+                    deadline_ts = datetime(now.year, now.month, now.day, cfg.mb_deadline, 0, 0)
                     hours_left = max(0, (deadline_ts - now).total_seconds() / 3600.0)
                     avg_baseload_kw = get_average_baseload() / 1000.0
-                    
+
                     natural_drain_soc = ((avg_baseload_kw * hours_left) / cap_kwh) * 100 if cap_kwh > 0 else 0
-                    dynamic_mb_target = MB_TARGET_SOC + natural_drain_soc
+                    dynamic_mb_target = cfg.mb_target_soc + natural_drain_soc
 
-                    if soc <= (dynamic_mb_target + 1) or now.hour >= MB_DEADLINE:
+                    if soc <= (dynamic_mb_target + 1) or now.hour >= cfg.mb_deadline:
                         logger.info("Morning-Boost beendet.")
                         if os.path.exists(STATE_FILE):
                             with open(STATE_FILE, 'r') as f: saved = json.load(f)
@@ -711,189 +801,206 @@ def main():
                                 write_e3dc_config_value('wbminsoc', saved.get('orig_wbminsoc', 50))
                             else:
                                 if os.path.exists(FLAG_FILE) and wp: os.remove(FLAG_FILE)
-                                if wp and wp.connect():
-                                    wp.write_hz_boost(0); wp.write_ww_boost(0)
-                                    wp.close()
+                                q.write_hz_boost(0); q.write_ww_boost(0, cfg.www)
                             os.remove(STATE_FILE)
-                        mb_state = "DONE"
-                        mb_running_prio = ""
+                        self.mb_state = "DONE"
+                        self.mb_running_prio = ""
                         logger.info(f"MB Ziel erreicht (Puffer für Grundlast: {natural_drain_soc:.1f}%).")
 
+            # SI und Morning Boost schließen sich aus (if/elif)
+            lap.mark("si" if cfg.si_enable == 1 else "mb")
+
             # --- HAUPT REGELUNG (Wärmepumpe) ---
-            if not os.path.exists(FLAG_FILE) and AUTO_MODE == 1 and wp:
+            if not os.path.exists(FLAG_FILE) and cfg.auto_mode == 1 and wp:
                 try:
                     is_deficit = (grid > 50) or (bat < -50)
 
                     # PV PAUSE
-                    if PV_PAUSE_ENABLE == 1 and current_price > 0 and mb_state != "RUNNING" and si_state != "RUNNING" and si_state != "PAUSING":
+                    if cfg.pv_pause_enable == 1 and current_price > 0 and self.mb_state != "RUNNING" and self.si_state != "RUNNING" and self.si_state != "PAUSING":
                         # Auskühlschutz: Keine Pause bei tiefen Temperaturen
-                        if at < PV_PAUSE_MIN_AT:
-                            if pv_pause_active:
-                                logger.info(f"PV-Pause beendet (Auskühlschutz, AT {at}°C < Limit {PV_PAUSE_MIN_AT}°C).")
-                                if wp and wp.connect(): wp.write_hz_boost(0); wp.write_ww_boost(0, CONF_WWW); wp.close()
-                                pv_pause_active = False; boost_active = False; pv_pause_start_time = None
-                        
-                        elif pv_pause_active:
-                            if grid <= GRID_START_LIMIT:                                    
+                        if at < cfg.pv_pause_min_at:
+                            if self.pv_pause_active:
+                                logger.info(f"PV-Pause beendet (Auskühlschutz, AT {at}°C < Limit {cfg.pv_pause_min_at}°C).")
+                                q.write_hz_boost(0); q.write_ww_boost(0, cfg.www)
+                                self.pv_pause_active = False; self.boost_active = False; self.pv_pause_start_time = None
+
+                        elif self.pv_pause_active:
+                            if grid <= cfg.grid_start_limit:
                                 logger.info(f"PV-Pause beendet -> Überschuss ({grid}W).")
-                                pv_pause_active = False; boost_active = False
-                            elif e3dc_valid and soc > 0 and soc < (PV_PAUSE_SOC - 5):                                    
+                                self.pv_pause_active = False; self.boost_active = False
+                            elif e3dc_valid and soc > 0 and soc < (cfg.pv_pause_soc - 5):
                                 logger.warning("PV-Pause abgebrochen (SoC tief).")
-                                if wp and wp.connect(): wp.write_hz_boost(0); wp.write_ww_boost(0, CONF_WWW); wp.close()
-                                pv_pause_active = False; boost_active = False; pv_pause_start_time = None
-                            elif pv_pause_start_time and (time.time() - pv_pause_start_time) > (PV_PAUSE_TIMEOUT_MINUTES * 60):                                    
+                                q.write_hz_boost(0); q.write_ww_boost(0, cfg.www)
+                                self.pv_pause_active = False; self.boost_active = False; self.pv_pause_start_time = None
+                            elif self.pv_pause_start_time and (time.time() - self.pv_pause_start_time) > (cfg.pv_pause_timeout_minutes * 60):
                                 logger.warning("PV-Pause Timeout.")
-                                if wp and wp.connect(): wp.write_hz_boost(0); wp.write_ww_boost(0, CONF_WWW); wp.close()
-                                pv_pause_active = False; boost_active = False; pv_pause_start_time = None
-                            elif forecast:
-                                gmt = time.gmtime(); now_gmt = gmt.tm_hour + gmt.tm_min / 60.0
-                                peak_still_valid = False; max_future_w = 0.0; current_w = 0.0
-                                for entry in forecast:
-                                    h = entry['h']; 
-                                    if h < (now_gmt - 12): h += 24
-                                    if abs(h - now_gmt) < 0.25: current_w = entry['w']
-                                    if now_gmt < h <= (now_gmt + 1.5) and entry['w'] > max_future_w: max_future_w = entry['w']
-                                if max_future_w >= PV_PAUSE_WATT and max_future_w > (current_w * 1.1): peak_still_valid = True
-                                    
-                                if not peak_still_valid:
+                                q.write_hz_boost(0); q.write_ww_boost(0, cfg.www)
+                                self.pv_pause_active = False; self.boost_active = False; self.pv_pause_start_time = None
+                            elif forecast_index:
+                                if not pv_peak_expected(forecast_index, cfg.pv_pause_watt):
                                     logger.info("PV-Pause beendet (Trend entfallen).")
-                                    if wp and wp.connect(): wp.write_hz_boost(0); wp.write_ww_boost(0, CONF_WWW); wp.close()
-                                    pv_pause_active = False; boost_active = False; pv_pause_start_time = None
-
-                        elif not boost_active and soc >= PV_PAUSE_SOC:
-                            peak_found = False
-                            if forecast:
-                                gmt = time.gmtime(); now_gmt = gmt.tm_hour + gmt.tm_min / 60.0
-                                max_future_w = 0.0; current_w = 0.0
-                                for entry in forecast:
-                                    h = entry['h']; 
-                                    if h < (now_gmt - 12): h += 24
-                                    if abs(h - now_gmt) < 0.25: current_w = entry['w']
-                                    if now_gmt < h <= (now_gmt + 1.5) and entry['w'] > max_future_w: max_future_w = entry['w']
-                                if max_future_w >= PV_PAUSE_WATT and max_future_w > (current_w * 1.1): peak_found = True
-                            
-                            if peak_found:
-                                logger.info(f"Starte PV-Pause (Prognose > {PV_PAUSE_WATT}W).")
-                                if wp and wp.connect():
-                                    wp.write_hz_boost(1, 20.0); wp.write_ww_boost(0, CONF_WWW); wp.close()
-                                pv_pause_active = True; boost_active = True; pv_pause_start_time = time.time()
+                                    q.write_hz_boost(0); q.write_ww_boost(0, cfg.www)
+                                    self.pv_pause_active = False; self.boost_active = False; self.pv_pause_start_time = None
+
+                        elif not self.boost_active and soc >= cfg.pv_pause_soc:
+                            if forecast_index and pv_peak_expected(forecast_index, cfg.pv_pause_watt):
+                                logger.info(f"Starte PV-Pause (Prognose > {cfg.pv_pause_watt}W).")
+                                q.write_hz_boost(1, 20.0); q.write_ww_boost(0, cfg.www)
+                                self.pv_pause_active = True; self.boost_active = True; self.pv_pause_start_time = time.time()
+
+                    lap.mark("pv_pause")
 
                     # PREIS BOOST
                     price_action = "NONE"
-                    effective_price_limit = PRICE_LIMIT
+                    effective_price_limit = cfg.price_limit
                     estimated_cop = 3.5
-                    
-                    if PRICE_BOOST_ENABLE == 1 and mb_state != "RUNNING" and si_state != "RUNNING" and si_state != "PAUSING":
+
+                    if cfg.price_boost_enable == 1 and self.mb_state != "RUNNING" and self.si_state != "RUNNING" and self.si_state != "PAUSING":
                         # COP-Schätzung & thermische Preisanpassung (Sole vs. Luft)
                         wq_ein = wp_data.get('Sole_Ein', wp_data.get('WQ_Eintritt', at))
                         estimated_cop = max(2.0, min(6.0, 3.5 + (wq_ein - 5.0) * 0.1))
-                        effective_price_limit = PRICE_LIMIT * (estimated_cop / 3.5)
+                        effective_price_limit = cfg.price_limit * (estimated_cop / 3.5)
 
                         if current_price <= 0: price_action = "BOOST"
-                        elif prices:
-                            gmt = time.gmtime(); now_gmt = gmt.tm_hour + gmt.tm_min / 60.0
-                            h_diff = now_gmt - price_start_hour
-                            if h_diff < -12: h_diff += 24
-                            if h_diff > 36: h_diff -= 24
-                            price_action = get_price_action(prices, price_start_hour, price_interval, effective_price_limit, PRICE_MIN_DURATION, h_diff / price_interval)
-                        
-                        is_hard = (current_price <= PRICE_HARD_LIMIT)
-                        if wq_aus < WQ_MIN_TEMP: price_action = "NONE"
-                        elif daily_boost_counter >= PRICE_MAX_DAILY and price_action == "BOOST" and not is_hard: price_action = "NONE"
-                        elif (time.time() - last_pv_boost_time) <= (18 * 3600) and price_action != "NONE" and not is_hard: price_action = "NONE"
+                        elif price_timeline:
+                            price_action = price_timeline.action_at(effective_price_limit, cfg.price_min_duration)
+
+                        is_hard = (current_price <= cfg.price_hard_limit)
+                        if wq_aus < cfg.wq_min_temp: price_action = "NONE"
+                        elif self.daily_boost_counter >= cfg.price_max_daily and price_action == "BOOST" and not is_hard: price_action = "NONE"
+                        elif (time.time() - self.last_pv_boost_time) <= (18 * 3600) and price_action != "NONE" and not is_hard: price_action = "NONE"
 
                     if price_action == "PAUSE":
-                        if not pre_pause_active:
+                        if not self.pre_pause_active:
                             logger.info("Start Preis-Pause.")
-                            if wp and wp.connect(): wp.write_hz_boost(1, 20.0); wp.write_ww_boost(0, CONF_WWW); wp.close()
-                            pre_pause_active = True; price_boost_active = False; boost_active = True
+                            q.write_hz_boost(1, 20.0); q.write_ww_boost(0, cfg.www)
+                            self.pre_pause_active = True; self.price_boost_active = False; self.boost_active = True
                     elif price_action == "BOOST":
-                        if not price_boost_active:
+                        if not self.price_boost_active:
                             logger.info(f"Start Preis-Boost ({current_price} ct). (Eff. Limit: {effective_price_limit:.1f} ct bei COP ~{estimated_cop:.1f})")
-                            if wp and wp.connect():
-                                if at > AT_LIMIT: wp.write_ww_boost(1, CONF_WWS); wp.write_hz_boost(0)
-                                else: wp.write_ww_boost(1, CONF_WWW); wp.write_hz_boost(1, CONF_HZ)
-                                wp.close()
-                            price_boost_active = True; pre_pause_active = False; boost_active = True
-                        daily_boost_counter += 0.5
-                    elif (price_boost_active or pre_pause_active) and price_action == "NONE":
+                            if at > cfg.at_limit: q.write_ww_boost(1, cfg.wws); q.write_hz_boost(0)
+                            else: q.write_ww_boost(1, cfg.www); q.write_hz_boost(1, cfg.hz)
+                            self.price_boost_active = True; self.pre_pause_active = False; self.boost_active = True
+                        # Zähler in Boost-Minuten
+                        self.daily_boost_counter += elapsed_min
+                    elif (self.price_boost_active or self.pre_pause_active) and price_action == "NONE":
                         logger.info("Ende Preis-Steuerung.")
-                        if wp and wp.connect(): wp.write_hz_boost(0); wp.write_ww_boost(0, CONF_WWW); wp.close()
-                        price_boost_active = False; pre_pause_active = False; boost_active = False
+                        q.write_hz_boost(0); q.write_ww_boost(0, cfg.www)
+                        self.price_boost_active = False; self.pre_pause_active = False; self.boost_active = False
+
+                    lap.mark("price")
 
                     # PV BOOST
-                    if not boost_active and mb_state != "RUNNING" and si_state != "RUNNING" and si_state != "PAUSING":
-                        if grid <= GRID_START_LIMIT and soc >= MIN_SOC and wp:
+                    if not self.boost_active and self.mb_state != "RUNNING" and self.si_state != "RUNNING" and self.si_state != "PAUSING":
+                        if grid <= cfg.grid_start_limit and soc >= cfg.min_soc and wp:
                                 logger.info(f"Start PV-Boost (Grid: {grid}W).")
-                                if wp.connect():
-                                    if at > AT_LIMIT: wp.write_ww_boost(1, CONF_WWS); wp.write_hz_boost(0)
-                                    else: wp.write_ww_boost(1, CONF_WWW); wp.write_hz_boost(1, CONF_HZ)
-                                    wp.close()
-                                boost_active = True; deficit_start_time = None
+                                if at > cfg.at_limit: q.write_ww_boost(1, cfg.wws); q.write_hz_boost(0)
+                                else: q.write_ww_boost(1, cfg.www); q.write_hz_boost(1, cfg.hz)
+                                self.boost_active = True; self.deficit_start_time = None
+
+                    lap.mark("pv_boost")
 
                     # LAUFENDE ÜBERWACHUNG
-                    if boost_active:
-                        is_pv = (not price_boost_active) and (not pre_pause_active) and (not pv_pause_active)
+                    if self.boost_active:
+                        is_pv = (not self.price_boost_active) and (not self.pre_pause_active) and (not self.pv_pause_active)
                         if is_pv:
-                            last_pv_boost_time = time.time()
-                            # Sync Check
-                            t_ww = CONF_WWS if at > AT_LIMIT else CONF_WWW
-                            if abs(wp_status.get('WW_Setpoint', 0) - t_ww) > 0.5:
+                            self.last_pv_boost_time = time.time()
+                            # Sync Check (nur mit frischem SHI-Status, sonst würde bis zur nächsten Abfrage mehrfach korrigiert)
+                            t_ww = cfg.wws if at > cfg.at_limit else cfg.www
+                            if self.lux_fresh and abs(wp_status.get('WW_Setpoint', 0) - t_ww) > 0.5:
                                 logger.info("Sync Check: Werte korrigiert.")
-                                if wp.connect():
-                                    if at > AT_LIMIT: wp.write_ww_boost(1, CONF_WWS); wp.write_hz_boost(0)
-                                    else: wp.write_ww_boost(1, CONF_WWW); wp.write_hz_boost(1, CONF_HZ)
-                                    wp.close()
+                                if at > cfg.at_limit: q.write_ww_boost(1, cfg.wws); q.write_hz_boost(0)
+                                else: q.write_ww_boost(1, cfg.www); q.write_hz_boost(1, cfg.hz)
 
                         # Defizit Abschaltung (nur PV)
                         if is_deficit and is_pv:
-                            if deficit_start_time is None:
-                                deficit_start_time = now; logger.info("Defizit erkannt. Timer start.")
-                            elif (now - deficit_start_time).total_seconds() > (STOP_DELAY_MINUTES * 60):
+                            if self.deficit_start_time is None:
+                                self.deficit_start_time = now; logger.info("Defizit erkannt. Timer start.")
+                            elif (now - self.deficit_start_time).total_seconds() > (cfg.stop_delay_minutes * 60):
                                 logger.info("Stop PV-Boost (Defizit).")
-                                if wp and wp.connect(): wp.write_ww_boost(0, 45.0); wp.write_hz_boost(0); wp.close()
-                                boost_active = False; deficit_start_time = None
+                                q.write_ww_boost(0, 45.0); q.write_hz_boost(0)
+                                self.boost_active = False; self.deficit_start_time = None
                         else:
-                            if deficit_start_time is not None:
-                                logger.info("Defizit beendet."); deficit_start_time = None
+                            if self.deficit_start_time is not None:
+                                logger.info("Defizit beendet."); self.deficit_start_time = None
 
+                    lap.mark("monitor")
                 except Exception as req_err: logger.error(f"Fehler Logik: {req_err}")
 
-            # 3. Daten schreiben
+            # Gesammelte SHI-Schreibzugriffe des Zyklus senden
+            with self.metrics.span("modbus_flush"):
+                self.flush_wp_writes()
+            if self.wp_poll: self.wp_status = self._wp_status_from(self.wp_poll)
+
+            # 3. Daten schreiben (im Hintergrund, History nur bei neuen WP-Daten)
             json_export = {
                 "ts": now.isoformat(), "data": wp_data, "status": wp_status,
-                "boost_active": boost_active, "auto_mode": AUTO_MODE, "wq_aus": wq_aus,
-                "daily_boost_counter": daily_boost_counter, "last_pv_boost_time": last_pv_boost_time,
-                "price_boost_active": price_boost_active, "pre_pause_active": pre_pause_active,
-                "pv_pause_active": pv_pause_active, "mb_state": mb_state, "mb_prio": mb_running_prio,
-                "si_state": si_state, "success": success, "error": wp_error_msg
+                "boost_active": self.boost_active, "auto_mode": cfg.auto_mode, "wq_aus": wq_aus,
+                "daily_boost_counter": self.daily_boost_counter, "last_pv_boost_time": self.last_pv_boost_time,
+                "price_boost_active": self.price_boost_active, "pre_pause_active": self.pre_pause_active,
+                "pv_pause_active": self.pv_pause_active, "mb_state": self.mb_state, "mb_prio": self.mb_running_prio,
+                "si_state": self.si_state, "success": self.success, "error": self.wp_error_msg
             }
-            tmp_file = RAMDISK_FILE + ".tmp"
-            with open(tmp_file, 'w') as f: json.dump(json_export, f)
-            try: 
-                os.chmod(tmp_file, 0o664)
-                st = os.stat(os.path.dirname(RAMDISK_FILE))
-                os.chown(tmp_file, st.st_uid, st.st_gid)
-            except: pass
-            os.replace(tmp_file, RAMDISK_FILE)
-            with open(HISTORY_FILE, 'a') as f: f.write(json.dumps(json_export) + "\n")
+            self.scheduler.post("export", self.write_export, json_export, self.lux_fresh or not wp)
+            self.lux_fresh = False
 
             # Tageswechsel
-            if now.day != last_day:
-                shutil.copy(HISTORY_FILE, os.path.join(BACKUP_DIR, f"luxtronik_{(now - timedelta(days=1)).strftime('%Y-%m-%d')}.json"))
-                open(HISTORY_FILE, 'w').close()
-                if mb_state == "DONE": mb_state = "IDLE"
-                if si_state == "DONE": si_state = "IDLE"
-                daily_boost_counter = 0; last_day = now.day
+            if now.day != self.last_day:
+                # Gleiche Warteschlange wie der Export: beide schreiben in den History-Puffer des StateWriter
+                self.scheduler.post("rollover", self.rollover_history, (now - timedelta(days=1)).strftime('%Y-%m-%d'), cfg.archive_gzip == 1, queue="export")
+                if self.mb_state == "DONE": self.mb_state = "IDLE"
+                if self.si_state == "DONE": self.si_state = "IDLE"
+                self.daily_boost_counter = 0; self.last_day = now.day
 
         except Exception as e:
             logger.critical(f"Kritischer Fehler: {e}", exc_info=True)
-            with open(RAMDISK_FILE, 'w') as f: json.dump({"success": False, "error": str(e), "ts": now.isoformat()}, f)
-        
-        # WICHTIG: Die Luxtronik-Steuerung hat einen sehr schwachen Prozessor. 
-        # Ein zu schnelles Polling (< 30s) kann den internen Datenbus der Wärmepumpe 
-        # zum Absturz bringen (Fehler 816). Daher mindestens 30s Pause!
-        time.sleep(30)
+            self.scheduler.post("export", self.writer.write_status, {"success": False, "error": str(e), "ts": now.isoformat()})
+
+
+def write_task_stats(scheduler, manager):
+    """Task-Statistik, Schreiblast und Phasen-Laufzeiten (JSON + Prometheus) in die RAM-Disk schreiben."""
+    extra = {"io": manager.writer.stats()}
+    if manager.wp:
+        extra["modbus"] = manager.wp.stats
+        if manager.wp.cache: extra["register_cache"] = manager.wp.cache.meta()
+    if manager.gateway: extra["gateway"] = manager.gateway.stats
+    scheduler.write_stats(TASK_STATS_FILE, extra)
+    scheduler.metrics.write(METRICS_JSON_FILE, METRICS_PROM_FILE)
+
+async def run_until_stopped(scheduler, logger):
+    """Startet den Scheduler; SIGTERM (systemctl stop/restart) beendet ihn geordnet statt den Prozess sofort."""
+    task = asyncio.ensure_future(scheduler.run())
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+    try:
+        await task
+    except asyncio.CancelledError:
+        logger.info("Dienst wird beendet (SIGTERM).")
+
+def main():
+    logger = setup_logging()
+    scheduler = Scheduler(logger)
+    manager = EnergyManager(logger, scheduler)
+    manager.restore_state()
+
+    # WICHTIG: Die Luxtronik-Steuerung hat einen sehr schwachen Prozessor.
+    # Ein zu schnelles Polling (< 30s) kann den internen Datenbus der Wärmepumpe
+    # zum Absturz bringen (Fehler 816). Daher mindestens 30s Pause!
+    if manager.wp:
+        poll = manager.poll_luxtronik_async if manager.wp_async else manager.poll_luxtronik
+        scheduler.add_periodic("luxtronik", LUX_POLL_INTERVAL, poll, deadline=LUX_POLL_DEADLINE, min_interval=LUX_MIN_POLL_INTERVAL)
+        # Einziger Zugang zur WP für get_luxtronik.py/set_manual_boost.py (Unix-Socket in der RAM-Disk)
+        manager.gateway = LuxtronikGateway(manager.gateway_snapshot, manager.gateway_write, logger=logger)
+        scheduler.add_service("gateway", manager.gateway.serve)
+    scheduler.add_periodic("e3dc", E3DC_POLL_INTERVAL, manager.fetch_e3dc, deadline=E3DC_POLL_DEADLINE)
+    scheduler.add_triggered("decision", manager.decide, DECISION_MAX_INTERVAL, deadline=DECISION_DEADLINE)
+    scheduler.add_periodic("task_stats", TASK_STATS_INTERVAL, lambda: write_task_stats(scheduler, manager))
+
+    try:
+        asyncio.run(run_until_stopped(scheduler, logger))
+    finally:
+        # Gepufferte History-Zeilen nicht verlieren
+        manager.writer.flush()
+        if manager.wp: manager.wp.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,183 @@
+"""
+Gemeinsamer, geparster Stand der awattardebug.txt.
+
+Die Datei wird nur einmal pro Änderung geparst und als kompaktes JSON
+(forecast_cache.json) in die RAM-Disk geschrieben. Schlüssel ist mtime+Größe
+der Quelle. Energy Manager, Diagramm-Skripte und PHP können das Artefakt direkt
+laden, statt die Textdatei jedes Mal neu zu zerlegen.
+
+Inhalt (alle Zeiten in Stunden GMT ab Mitternacht des Dateitages, Tageswechsel
+werden aufaddiert, z.B. 25.25 = 01:15 am Folgetag):
+  sim:  {"h": [...], "soc": [...]}                         Block "Simulation"
+  data: {"h": [...], "price": [...], "wp": [...], "pv": [...], "at": [...]}
+                                                            Block "Data" (Rohwerte)
+  agg:  {"high_soc_hours", "pv_sum", ...}                   vorberechnete Kennzahlen
+
+Die Rohwerte werden erst beim Verbraucher skaliert (price_ct(), pv_watts(),
+wp_kw()), da die Faktoren von der Konfiguration abhängen.
+"""
+
+import os
+import sys
+import json
+from datetime import datetime
+
+FORECAST_CACHE_FILE = "/var/www/html/ramdisk/forecast_cache.json"
+FORMAT_VERSION = 1
+# Ab diesem Datum liefert E3DC-Control Preise in ct/kWh statt in €/MWh
+PRICE_SWITCH_TS = datetime(2024, 12, 19).timestamp()
+
+# Prozess-interner Cache: (Quelle, mtime_ns, Größe) -> Artefakt
+_memo = {"key": None, "data": None}
+
+
+def _source_key(src):
+    st = os.stat(src)
+    return (os.path.abspath(src), st.st_mtime_ns, st.st_size)
+
+
+def parse_awattar_debug(src):
+    """Parst die awattardebug.txt vollständig in das Artefakt-Format."""
+    key = _source_key(src)
+    sim = {"h": [], "soc": []}
+    data = {"h": [], "price": [], "wp": [], "pv": [], "at": []}
+    high_soc_hours = 0.0
+    pv_sum = 0.0
+
+    block = None
+    in_data = False   # Ab der ersten "Data"-Zeile (Kennzahlen wie bisher im Energy Manager)
+    last_t = None
+    day = 0
+
+    with open(src, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line = line.strip()
+            parts = line.split()
+            # Kennzahlen für Morning-Boost/SI: 15-Min-Slots mit SoC >= 98% und deren PV-Summe
+            if in_data and len(parts) >= 5:
+                try:
+                    if float(parts[2]) >= 98.0:
+                        high_soc_hours += 0.25
+                        pv_sum += float(parts[4])
+                except ValueError: pass
+
+            if 'Simulation' in line:
+                block = "sim"; last_t = None; day = 0
+                continue
+            if 'Data' in line:
+                block = "data"; in_data = True; last_t = None; day = 0
+                continue
+            if not line or line.startswith('notstrom'): continue
+            if block is None or len(parts) < 3: continue
+            try:
+                t = float(parts[0])
+                if last_t is not None and t < last_t: day += 1
+                last_t = t
+                h = round(t + 24 * day, 4)
+
+                if block == "sim":
+                    sim["soc"].append(float(parts[2]))
+                    sim["h"].append(h)
+                elif len(parts) >= 5:
+                    price = float(parts[1]); wp = float(parts[3]); pv = float(parts[4])
+                    at = float(parts[5]) if len(parts) >= 6 else None
+                    data["h"].append(h)
+                    data["price"].append(price)
+                    data["wp"].append(wp)
+                    data["pv"].append(pv)
+                    data["at"].append(at)
+            except ValueError:
+                continue
+
+    prices = data["price"]
+    return {
+        "version": FORMAT_VERSION,
+        "src": {"path": key[0], "mtime_ns": key[1], "size": key[2], "mtime": key[1] / 1e9},
+        "sim": sim,
+        "data": data,
+        "agg": {
+            "high_soc_hours": high_soc_hours,
+            "pv_sum": round(pv_sum, 4),
+            "price_min": min(prices) if prices else None,
+            "price_max": max(prices) if prices else None,
+            "pv_max": max(data["pv"]) if data["pv"] else None,
+            "soc_max": max(sim["soc"]) if sim["soc"] else None,
+            "soc_min": min(sim["soc"]) if sim["soc"] else None,
+        },
+    }
+
+
+def _matches(artifact, key):
+    if not artifact or artifact.get("version") != FORMAT_VERSION: return False
+    s = artifact.get("src", {})
+    return (s.get("path"), s.get("mtime_ns"), s.get("size")) == key
+
+
+def write_artifact(artifact, path=FORECAST_CACHE_FILE):
+    """Schreibt das Artefakt atomar (Rechte nur beim Anlegen setzen)."""
+    is_new = not os.path.exists(path)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f: json.dump(artifact, f, separators=(',', ':'))
+    os.replace(tmp, path)
+    if is_new:
+        try: os.chmod(path, 0o664)
+        except OSError: pass
+
+
+def load_forecast(src, path=FORECAST_CACHE_FILE):
+    """
+    Liefert das geparste Artefakt zur awattardebug.txt.
+
+    Reihenfolge: Prozess-Cache (ein stat()) -> Artefakt in der RAM-Disk -> neu parsen
+    und Artefakt schreiben. Gibt None zurück, wenn die Quelle fehlt.
+    """
+    try:
+        key = _source_key(src)
+    except OSError:
+        return None
+    if _memo["key"] == key: return _memo["data"]
+
+    artifact = None
+    try:
+        with open(path, 'r') as f: artifact = json.load(f)
+    except (OSError, ValueError):
+        artifact = None
+
+    if not _matches(artifact, key):
+        artifact = parse_awattar_debug(src)
+        try: write_artifact(artifact, path)
+        except OSError: pass
+
+    _memo["key"] = key
+    _memo["data"] = artifact
+    return artifact
+
+
+def price_ct(raw, src_mtime, awmwst=19.0, awnebenkosten=0.0):
+    """Rohpreis -> Endpreis in ct/kWh (wie calculateAwattarPrice() in helpers.php)."""
+    multiplier = awmwst / 100.0 + 1.0
+    if src_mtime > PRICE_SWITCH_TS: return raw * multiplier + awnebenkosten
+    return raw / 10.0 * multiplier + awnebenkosten
+
+
+def pv_watts(raw, speichergroesse):
+    """PV-Rohwert (% der Speichergröße pro 15 Min) -> Leistung in W."""
+    return raw * speichergroesse * 40
+
+
+def wp_kw(raw, speichergroesse):
+    """WP-Rohwert -> Leistung in kW (wie im SoC-Diagramm)."""
+    return raw * speichergroesse * 4 / 100
+
+
+if __name__ == "__main__":
+    # Aufruf: forecast_cache.py <awattardebug.txt> [ziel.json]
+    # Aktualisiert das Artefakt (z.B. aus PHP oder Cron) und gibt die Kennzahlen aus.
+    if len(sys.argv) < 2:
+        print("Aufruf: forecast_cache.py <awattardebug.txt> [ziel.json]")
+        sys.exit(1)
+    result = load_forecast(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else FORECAST_CACHE_FILE)
+    if result is None:
+        print(json.dumps({"success": False, "error": "Quelle nicht gefunden"}))
+        sys.exit(1)
+    print(json.dumps({"success": True, "agg": result["agg"], "src": result["src"]}))
@@ -0,0 +1,70 @@
+"""
+Zeitindex für die PV-Prognose aus get_live_json.php.
+
+Die Liste forecast ([{"h": Stunde GMT, "w": Watt}, ...]; Tageswechsel sind
+bereits aufaddiert, z.B. 25.0 = 01:00 am Folgetag) wird einmal pro neuer
+Prognose auf absolute UTC-Zeitstempel umgerechnet. Ein Sparse-Table beantwortet
+"maximale PV-Leistung im Zeitraum" in O(1), "PV jetzt" per Binärsuche.
+"""
+
+import time
+import bisect
+
+from price_timeline import anchor_start_ts
+
+
+class ForecastIndex:
+    """Sortierte Prognose mit Range-Max-Index (Sparse Table)."""
+
+    def __init__(self, forecast, now=None):
+        self.forecast = list(forecast)
+        hours = [float(e['h']) for e in self.forecast]
+        self.watts = [float(e['w']) for e in self.forecast]
+        # Verankerung wie bei der Preisliste (gleicher erster Slot der awattardebug.txt)
+        start_ts = anchor_start_ts(hours[0], now)
+        self.ts = [start_ts + (h - hours[0]) * 3600 for h in hours]
+
+        # table[k][i] = max(watts[i .. i + 2^k - 1])
+        self._table = [self.watts]
+        k = 1
+        while (1 << k) <= len(self.watts):
+            prev = self._table[-1]
+            half = 1 << (k - 1)
+            self._table.append([max(prev[i], prev[i + half]) for i in range(len(self.watts) - (1 << k) + 1)])
+            k += 1
+
+    @classmethod
+    def build(cls, forecast, previous=None, now=None):
+        """Neuer Index nur, wenn sich die Prognose geändert hat."""
+        if not forecast: return None
+        if previous is not None and previous.forecast == forecast: return previous
+        try:
+            return cls(forecast, now)
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def _range_max(self, lo, hi):
+        # Maximum über watts[lo..hi] (inklusive)
+        k = (hi - lo + 1).bit_length() - 1
+        row = self._table[k]
+        return max(row[lo], row[hi - (1 << k) + 1])
+
+    def max_between(self, t_from, t_to, default=0.0):
+        """Maximale Prognose für Slots mit t_from < ts <= t_to."""
+        lo = bisect.bisect_right(self.ts, t_from)
+        hi = bisect.bisect_right(self.ts, t_to) - 1
+        if lo > hi: return default
+        return max(default, self._range_max(lo, hi))
+
+    def max_ahead(self, hours, t=None, default=0.0):
+        """Maximale Prognose in den nächsten 'hours' Stunden (ohne den aktuellen Zeitpunkt)."""
+        if t is None: t = time.time()
+        return self.max_between(t, t + hours * 3600, default)
+
+    def value_at(self, t=None, tolerance_h=0.25, default=0.0):
+        """Prognose zum Zeitpunkt t (letzter Slot innerhalb +/- tolerance_h)."""
+        if t is None: t = time.time()
+        tol = tolerance_h * 3600
+        i = bisect.bisect_left(self.ts, t + tol) - 1
+        if i >= 0 and self.ts[i] > t - tol: return self.watts[i]
+        return default
@@ -0,0 +1,51 @@
+"""
+Blockierender Client für das Luxtronik-Gateway des Energy Managers (siehe luxtronik_gateway.py).
+
+Eigenes Modul ohne asyncio, damit get_luxtronik.py und set_manual_boost.py
+schnell starten.
+"""
+
+import os
+import json
+import socket
+
+GATEWAY_SOCKET = "/var/www/html/ramdisk/luxtronik.sock"
+CLIENT_TIMEOUT = 15.0
+# Älterer Stand gilt als hängende Abfrage -> Skripte lesen selbst
+GATEWAY_MAX_AGE = 120
+MAX_LINE = 64 * 1024
+
+
+class GatewayClient:
+    """Blockierender Client für die Kommandozeilen-Skripte."""
+
+    def __init__(self, path=GATEWAY_SOCKET, timeout=CLIENT_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+
+    def request(self, req):
+        """Sendet eine Anfrage. Liefert die Antwort oder None, wenn das Gateway nicht erreichbar ist."""
+        if not os.path.exists(self.path): return None
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.settimeout(self.timeout)
+                s.connect(self.path)
+                s.sendall(json.dumps(req).encode() + b"\n")
+                with s.makefile('rb') as f:
+                    line = f.readline(MAX_LINE)
+            return json.loads(line) if line else None
+        except (OSError, ValueError):
+            return None
+
+    def snapshot(self, max_age=None):
+        """Letzter Stand des Energy Managers (None, wenn nicht erreichbar oder älter als max_age Sekunden)."""
+        reply = self.request({"cmd": "snapshot"})
+        if not reply or not reply.get("ok"): return None
+        if max_age is not None and (reply.get("age") is None or reply["age"] > max_age): return None
+        return reply
+
+    def write(self, ww=None, hz=None):
+        """Schreibt SHI-Werte über das Gateway. None, wenn nicht erreichbar."""
+        reply = self.request({"cmd": "write", "ww": list(ww) if ww else None, "hz": list(hz) if hz else None})
+        if reply is None: return None
+        return bool(reply.get("ok"))
@@ -3,32 +3,12 @@ import time
 import sys
 import os
 from luxtronik import LuxtronikModbus
-
-def _read_e3dc_config_value(key, default=None):
-    """Liest einen Wert aus der zentralen e3dc.config.txt."""
-    try:
-        with open('/var/www/html/e3dc_paths.json', 'r') as f:
-            paths = json.load(f)
-            install_path = paths.get('install_path', '/home/pi/E3DC-Control/')
-    except:
-        install_path = '/home/pi/E3DC-Control/'
-    
-    config_path = os.path.join(install_path, 'e3dc.config.txt')
-    if not os.path.exists(config_path): return default
-
-    try:
-        with open(config_path, 'r') as f:
-            for line in f:
-                if line.strip().startswith('#') or '=' not in line: continue
-                k, v = line.split('=', 1)
-                if k.strip().lower() == key.lower():
-                    return v.strip()
-    except Exception: pass
-    return default
+from gateway_client import GatewayClient, GATEWAY_MAX_AGE
+from e3dc_config import read_config_value
 
 def main():
-    ip = _read_e3dc_config_value('luxtronik_ip', '192.168.178.88')
-    luxtronik_enabled_str = _read_e3dc_config_value('luxtronik', '0')
+    ip = read_config_value('luxtronik_ip', '192.168.178.88')
+    luxtronik_enabled_str = read_config_value('luxtronik', '0')
     luxtronik_enabled = luxtronik_enabled_str.lower() in ['1', 'true']
 
     # Vorbereiten des Ergebnis-Objekts
@@ -45,6 +25,13 @@ def main():
         print(json.dumps(result))
         return
 
+    # Läuft der Energy Manager, liefert er seinen letzten Stand ohne weiteren Buszugriff
+    snap = GatewayClient().snapshot(max_age=GATEWAY_MAX_AGE)
+    if snap:
+        for k in result: result[k] = snap.get(k, result[k])
+        print(json.dumps(result))
+        return
+
     wp = LuxtronikModbus(ip)
 
     try:
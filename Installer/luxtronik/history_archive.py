@@ -0,0 +1,325 @@
+"""
+Spaltenbasiertes Tagesarchiv der Live-History (history_YYYY-MM-DD.col).
+
+backup_history.php legt jeden Tag die Zeilen von gestern als JSON-Lines in
+/var/www/html/tmp/history_backups ab; jede Auswertung muss die Datei danach
+Zeile für Zeile mit json.loads zerlegen. Das Spaltenformat daneben:
+
+    Kopf     b'E3LC', Version, Länge des JSON-Kopfs, JSON-Kopf
+             (Datum, Anzahl, Startzeit, Spalten mit Typ/Skalierung/Position,
+             Tageswerte je Kanal: min, max, mean, bei Leistungen kWh)
+    Spalten  gemeinsame Zeitspalte (int32, Sekunden ab Startzeit), danach je
+             Kanal ein Block int16 (Wert * scale, -32768 = fehlt) oder float32,
+             jeweils 8-Byte-ausgerichtet
+
+int16 wird genutzt, wenn alle Werte eines Tages in der Auflösung 1/scale
+hineinpassen, sonst float32. Der Leser lädt nur die angeforderten Spalten.
+
+Der Live-Grabber schreibt das Archiv von gestern direkt aus dem Ringpuffer;
+ältere JSON-Lines-Backups übernimmt der Konverter:
+
+    python3 history_archive.py convert               # alle history_*.txt ohne .col
+    python3 history_archive.py info history_2026-10-16.col
+    python3 history_archive.py export history_2026-10-16.col > history_2026-10-16.txt
+"""
+
+import os
+import sys
+import json
+import math
+import glob
+import time
+import array
+import struct
+import argparse
+from datetime import datetime, date, timedelta
+
+from live_ring import CHANNELS, BOOL_CHANNELS, NULLABLE_CHANNELS, iso_ts
+
+ARCHIVE_DIR = "/var/www/html/tmp/history_backups"
+ARCHIVE_DAYS = 30        # wie backup_history.php
+MAGIC = b'E3LC'
+VERSION = 1
+_HEAD = struct.Struct('<4sHHI')   # magic, version, reserviert, Länge des JSON-Kopfs
+MISSING_I2 = -32768
+MAX_GAP = 3600           # s, größere Lücken werden nicht integriert (wie calculateDailyEnergyStats)
+
+# Auflösung der int16-Spalten (Wert * scale); nicht genannte Kanäle: 1 (ganze Watt/Volt)
+SCALES = {'soc': 10, 'price_ct': 100, 'bat_v': 10, 'bat_a': 100}
+# Leistungskanäle in W: im Kopf zusätzlich Energie (positiver und negativer Anteil)
+POWER_CHANNELS = ('pv', 'bat', 'home_raw', 'home', 'grid', 'wb', 'wp',
+                  'dc0_w', 'dc1_w', 'ac0_w', 'ac1_w', 'ac2_w')
+
+if sys.byteorder != 'little':  # pragma: no cover - Raspberry Pi und x86 sind little-endian
+    raise ImportError("history_archive.py erwartet little-endian")
+
+
+def archive_path(day, directory=ARCHIVE_DIR):
+    return os.path.join(directory, f"history_{day.isoformat()}.col")
+
+
+def day_bounds(day):
+    """Unix-Zeit von Tagesbeginn und -ende (lokale Zeit, auch bei Zeitumstellung)."""
+    start = datetime(day.year, day.month, day.day).timestamp()
+    nxt = day + timedelta(days=1)
+    return start, datetime(nxt.year, nxt.month, nxt.day).timestamp()
+
+
+def _pad(n):
+    return (n + 7) // 8 * 8
+
+
+def integrate_wh(ts, values):
+    """Energie (Wh) des positiven und negativen Anteils per Trapezregel, Lücken > MAX_GAP zählen nicht."""
+    pos = neg = 0.0
+    for i in range(1, len(ts)):
+        dt = ts[i] - ts[i - 1]
+        a, b = values[i - 1], values[i]
+        if not (0 < dt < MAX_GAP) or math.isnan(a) or math.isnan(b): continue
+        avg = (a + b) / 2 * dt / 3600.0
+        if avg >= 0: pos += avg
+        else: neg -= avg
+    return pos, neg
+
+
+def _stats(name, ts, values):
+    finite = [v for v in values if not math.isnan(v)]
+    if not finite: return {"n": 0}
+    st = {"n": len(finite), "min": round(min(finite), 3), "max": round(max(finite), 3),
+          "mean": round(sum(finite) / len(finite), 3)}
+    if name in POWER_CHANNELS:
+        pos, neg = integrate_wh(ts, values)
+        st["kwh"] = round(pos / 1000.0, 3)
+        st["kwh_neg"] = round(neg / 1000.0, 3)
+    return st
+
+
+def _encode(name, values):
+    """(Typ, Skalierung, Bytes) einer Spalte: int16, wenn alle Werte passen, sonst float32."""
+    scale = SCALES.get(name, 1)
+    q = array.array('h')
+    for v in values:
+        if math.isnan(v):
+            q.append(MISSING_I2)
+            continue
+        if math.isinf(v): break
+        n = int(round(v * scale))
+        if not (MISSING_I2 < n <= 32767): break   # -32768 ist für "fehlt" reserviert
+        q.append(n)
+    else:
+        return 'i2', scale, q.tobytes()
+    return 'f4', 1, array.array('f', values).tobytes()
+
+
+def write_archive(path, day, ts, columns):
+    """
+    Schreibt ein Tagesarchiv (atomar per rename).
+
+    ts:      aufsteigende Unix-Zeiten
+    columns: Kanalname -> Liste von floats (NaN = fehlt), gleiche Länge wie ts
+    """
+    t0 = int(day_bounds(day)[0])
+    names = [n for n in CHANNELS if n in columns] + [n for n in columns if n not in CHANNELS]
+    blobs = [array.array('i', (int(round(t - t0)) for t in ts)).tobytes()]
+    # Positionen relativ zum Beginn der Spalten (hinter dem auf 8 Byte aufgefüllten Kopf)
+    pos = _pad(len(blobs[0]))
+    meta = []
+    for name in names:
+        kind, scale, blob = _encode(name, columns[name])
+        meta.append({"name": name, "type": kind, "scale": scale, "offset": pos})
+        blobs.append(blob)
+        pos += _pad(len(blob))
+
+    header = {"date": day.isoformat(), "count": len(ts), "t0": t0, "columns": meta,
+              "stats": {name: _stats(name, ts, columns[name]) for name in names}}
+    raw = json.dumps(header).encode()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(_HEAD.pack(MAGIC, VERSION, 0, len(raw)))
+        f.write(raw.ljust(_pad(_HEAD.size + len(raw)) - _HEAD.size, b' '))
+        for blob in blobs:
+            f.write(blob.ljust(_pad(len(blob)), b'\0'))
+    os.chmod(tmp, 0o664)
+    os.replace(tmp, path)
+    return header
+
+
+class DailyArchive:
+    """Lesezugriff auf ein Tagesarchiv; Spalten werden erst bei Bedarf gelesen."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, version, _, head_len = _HEAD.unpack(f.read(_HEAD.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path}: kein Tagesarchiv der Version {VERSION}")
+            self.header = json.loads(f.read(head_len))
+        self.data_offset = _pad(_HEAD.size + head_len)
+        self.count = self.header["count"]
+        self.t0 = self.header["t0"]
+        self.stats = self.header["stats"]
+        self.columns = {m["name"]: m for m in self.header["columns"]}
+
+    @property
+    def channels(self):
+        return list(self.columns)
+
+    def _read(self, f, offset, typecode):
+        a = array.array(typecode)
+        f.seek(self.data_offset + offset)
+        a.frombytes(f.read(self.count * a.itemsize))
+        return a
+
+    def load(self, channels=None, with_ts=True):
+        """Dictionary Kanal -> Liste von floats (NaN = fehlt); 'ts' = Unix-Zeiten."""
+        names = self.channels if channels is None else [c for c in channels if c in self.columns]
+        out = {}
+        with open(self.path, 'rb') as f:
+            if with_ts:
+                out['ts'] = [self.t0 + s for s in self._read(f, 0, 'i')]
+            for name in names:
+                m = self.columns[name]
+                if m["type"] == 'f4':
+                    out[name] = self._read(f, m["offset"], 'f').tolist()
+                else:
+                    scale = float(m["scale"])
+                    out[name] = [math.nan if q == MISSING_I2 else q / scale for q in self._read(f, m["offset"], 'h')]
+        return out
+
+    def as_numpy(self, channels=None):
+        """Wie load(), aber als NumPy-Arrays (float64 bzw. float32; NumPy ist optional)."""
+        import numpy as np
+        names = self.channels if channels is None else [c for c in channels if c in self.columns]
+
+        def column(f, offset, dtype):
+            f.seek(self.data_offset + offset)
+            return np.frombuffer(f.read(self.count * np.dtype(dtype).itemsize), dtype)
+
+        with open(self.path, 'rb') as f:
+            out = {'ts': self.t0 + column(f, 0, '<i4').astype(np.float64)}
+            for name in names:
+                m = self.columns[name]
+                if m["type"] == 'f4':
+                    out[name] = column(f, m["offset"], '<f4')
+                    continue
+                q = column(f, m["offset"], '<i2')
+                v = q.astype(np.float32) / np.float32(m["scale"])
+                v[q == MISSING_I2] = np.nan
+                out[name] = v
+        return out
+
+    def entries(self):
+        """Zeilen im Format der live_history.txt (fehlende Werte entfallen, price_ct = None)."""
+        cols = self.load()
+        ts = cols.pop('ts')
+        out = []
+        for i, t in enumerate(ts):
+            e = {'ts': iso_ts(t)}
+            for name, values in cols.items():
+                v = values[i]
+                if math.isnan(v):
+                    if name in NULLABLE_CHANNELS: e[name] = None
+                    continue
+                e[name] = bool(v) if name in BOOL_CHANNELS else float(f"{v:.7g}")
+            out.append(e)
+        return out
+
+
+def columns_from_rows(rows, channels=CHANNELS):
+    """Zeilen des Ringpuffers (ts, Kanal 0, ...) -> (ts, Spalten)."""
+    ts = [r[0] for r in rows]
+    return ts, {name: [r[i + 1] for r in rows] for i, name in enumerate(channels)}
+
+
+def columns_from_jsonl(path):
+    """Liest eine JSON-Lines-Datei (live_history.txt bzw. Backup) -> (ts, Spalten), nach Zeit sortiert."""
+    from history_tail import parse_ts
+    rows = []
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            try:
+                e = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(e, dict): continue
+            t = parse_ts(e.get('ts'))
+            if t is None: continue
+            row = [t]
+            for name in CHANNELS:
+                try:
+                    v = e.get(name)
+                    row.append(float(v) if v is not None else math.nan)
+                except (TypeError, ValueError):
+                    row.append(math.nan)
+            rows.append(row)
+    rows.sort(key=lambda r: r[0])
+    # doppelte Zeitstempel (z.B. zweimal gesicherte Zeilen) nur einmal
+    rows = [r for i, r in enumerate(rows) if i == 0 or r[0] > rows[i - 1][0]]
+    return columns_from_rows(rows)
+
+
+def _day_from_name(path):
+    try:
+        return date.fromisoformat(os.path.basename(path)[len("history_"):][:10])
+    except ValueError:
+        return None
+
+
+def convert(directory=ARCHIVE_DIR, force=False):
+    """Wandelt alle history_YYYY-MM-DD.txt um, die noch kein (aktuelleres) .col haben."""
+    done = []
+    for src in sorted(glob.glob(os.path.join(directory, "history_*.txt"))):
+        day = _day_from_name(src)
+        if day is None: continue
+        dst = archive_path(day, directory)
+        if not force and os.path.exists(dst) and os.path.getmtime(dst) >= os.path.getmtime(src): continue
+        ts, columns = columns_from_jsonl(src)
+        if not ts: continue
+        write_archive(dst, day, ts, columns)
+        done.append((src, dst))
+    return done
+
+
+def prune(directory=ARCHIVE_DIR, days=ARCHIVE_DAYS):
+    """Löscht Tagesarchive, die älter als 'days' Tage sind (wie backup_history.php)."""
+    removed = 0
+    for path in glob.glob(os.path.join(directory, "history_*.col")):
+        if time.time() - os.path.getmtime(path) > days * 86400:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Spaltenbasiertes Tagesarchiv der Live-History")
+    sub = ap.add_subparsers(dest='cmd')
+    cv = sub.add_parser('convert', help="JSON-Lines-Backups umwandeln")
+    cv.add_argument('--dir', default=ARCHIVE_DIR)
+    cv.add_argument('--force', action='store_true', help="auch bereits umgewandelte Tage neu schreiben")
+    info = sub.add_parser('info', help="Kopf und Tageswerte anzeigen")
+    info.add_argument('file')
+    ex = sub.add_parser('export', help="als JSON-Lines ausgeben")
+    ex.add_argument('file')
+    args = ap.parse_args()
+
+    if args.cmd == 'convert':
+        for src, dst in convert(args.dir, args.force):
+            print(f"{os.path.basename(src)} ({os.path.getsize(src)} B) -> {os.path.basename(dst)} ({os.path.getsize(dst)} B)")
+        return 0
+    if args.cmd == 'info':
+        arc = DailyArchive(args.file)
+        print(json.dumps(arc.header, indent=1))
+        return 0
+    if args.cmd == 'export':
+        for e in DailyArchive(args.file).entries():
+            sys.stdout.write(json.dumps(e, separators=(',', ':')) + "\n")
+        return 0
+    ap.print_help()
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
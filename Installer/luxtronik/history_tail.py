@@ -0,0 +1,206 @@
+"""
+Inkrementelles Lesen der live_history.txt (JSON-Lines) und gleitende Statistiken.
+
+TailReader merkt sich den Byte-Offset zwischen zwei Aufrufen und parst nur neu
+angehängte Zeilen. Beim ersten Aufruf (oder wenn die Datei ersetzt/gekürzt
+wurde, z.B. durch das 48h-Trimmen in get_live_json.php) wird nur das Ende der
+Datei gelesen. RollingWindow hält die Werte der letzten N Sekunden begrenzt im
+Speicher und liefert Mittelwert bzw. getrimmten Mittelwert.
+
+Schreibt der Live-Grabber den Ringpuffer (live_ring.py), liest RingReader nur
+die neuen Sätze per Binärsuche, ohne JSON zu dekodieren.
+"""
+
+import os
+import json
+import bisect
+from collections import deque
+from datetime import datetime
+
+from live_ring import LiveRing, RING_FILE, LIVE_HISTORY_FILE
+
+
+def parse_ts(value):
+    """ISO-Zeitstempel (date('c') aus PHP) oder Unix-Zeit -> Unix-Zeit. None bei ungültigem Wert."""
+    if isinstance(value, (int, float)): return float(value)
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class TailReader:
+    """Liefert bei jedem read_new() nur die seit dem letzten Aufruf angehängten JSON-Zeilen."""
+
+    def __init__(self, path, initial_bytes=128 * 1024):
+        self.path = path
+        self.initial_bytes = initial_bytes
+        self.offset = None
+        self.inode = None
+        self._last_line = b''
+        self._partial = b''
+        self.resyncs = 0
+
+    def _still_valid(self, f, size):
+        # Datei ersetzt, gekürzt oder vorne getrimmt? Dann passt die zuletzt gelesene Zeile nicht mehr.
+        if size < self.offset: return False
+        if not self._last_line: return True
+        start = self.offset - len(self._partial) - len(self._last_line)
+        if start < 0: return False
+        f.seek(start)
+        return f.read(len(self._last_line)) == self._last_line
+
+    def read_new(self):
+        """Neue Einträge als Liste von Dictionaries (ungültige Zeilen werden übersprungen)."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return []
+
+        with open(self.path, 'rb') as f:
+            skip_first = False
+            if self.offset is None or st.st_ino != self.inode or not self._still_valid(f, st.st_size):
+                if self.offset is not None: self.resyncs += 1
+                self.offset = max(0, st.st_size - self.initial_bytes)
+                skip_first = self.offset > 0
+                self._partial = b''
+                self._last_line = b''
+                self.inode = st.st_ino
+            if st.st_size == self.offset: return []
+
+            f.seek(self.offset)
+            chunk = f.read(st.st_size - self.offset)
+
+        self.offset += len(chunk)
+        buf = self._partial + chunk
+        lines = buf.split(b'\n')
+        self._partial = lines.pop()          # unvollständige letzte Zeile für den nächsten Aufruf
+        if skip_first and lines: lines.pop(0)  # erste Zeile nach dem Seek ist angeschnitten
+        if lines: self._last_line = lines[-1] + b'\n'
+
+        entries = []
+        for line in lines:
+            if not line.strip(): continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries
+
+
+class RingReader:
+    """Wie TailReader, aber aus dem Ringpuffer: nur Sätze jünger als der zuletzt gelieferte."""
+
+    def __init__(self, path=RING_FILE, initial_seconds=None):
+        self.path = path
+        self.initial_seconds = initial_seconds
+        self.ring = None
+        self.last_ts = None
+
+    def available(self):
+        try:
+            ino = os.stat(self.path).st_ino
+        except OSError:
+            return False
+        if self.ring is not None and self.ring.inode != ino:
+            # Datei neu angelegt (z.B. andere Kanäle) -> neu öffnen
+            self.ring.close()
+            self.ring = None
+        if self.ring is None:
+            try:
+                self.ring = LiveRing(self.path)
+            except (OSError, ValueError):
+                return False
+        return True
+
+    def read_new(self):
+        """Neue Sätze als Dictionaries mit Unix-Zeit in 'ts' (None ohne Ringpuffer)."""
+        if not self.available(): return None
+        if self.last_ts is not None: t0 = self.last_ts + 1e-3
+        elif self.initial_seconds: t0 = datetime.now().timestamp() - self.initial_seconds
+        else: t0 = None
+        entries = self.ring.entries(t0, iso=False)
+        if entries: self.last_ts = entries[-1]['ts']
+        return entries
+
+
+class RollingWindow:
+    """
+    Werte der letzten 'seconds' Sekunden (höchstens max_samples).
+
+    add() verwirft Werte außerhalb von [lower, upper] und bereits bekannte
+    Zeitstempel, sodass ein erneutes Einlesen nach einem Resync nichts doppelt zählt.
+    """
+
+    def __init__(self, seconds, lower=None, upper=None, max_samples=512):
+        self.seconds = seconds
+        self.lower = lower
+        self.upper = upper
+        self.samples = deque(maxlen=max_samples)
+        self._sorted = []
+        self._sum = 0.0
+        self.last_ts = None
+
+    def _drop_oldest(self):
+        _, value = self.samples.popleft()
+        self._sum -= value
+        del self._sorted[bisect.bisect_left(self._sorted, value)]
+
+    def add(self, ts, value):
+        if ts is None or value is None: return
+        if self.last_ts is not None and ts <= self.last_ts: return
+        self.last_ts = ts
+        if (self.lower is not None and value <= self.lower) or (self.upper is not None and value >= self.upper):
+            self.expire(ts)
+            return
+        if len(self.samples) == self.samples.maxlen: self._drop_oldest()
+        self.samples.append((ts, value))
+        self._sum += value
+        bisect.insort(self._sorted, value)
+        self.expire(ts)
+
+    def expire(self, now_ts):
+        cutoff = now_ts - self.seconds
+        while self.samples and self.samples[0][0] < cutoff:
+            self._drop_oldest()
+
+    def __len__(self):
+        return len(self.samples)
+
+    def mean(self):
+        return self._sum / len(self.samples) if self.samples else None
+
+    def trimmed_mean(self, trim=0.1):
+        """Mittelwert ohne die oberen/unteren 'trim'-Anteile (robust gegen Ausreißer)."""
+        n = len(self._sorted)
+        if n == 0: return None
+        k = int(n * trim)
+        core = self._sorted[k:n - k] if n - 2 * k > 0 else self._sorted
+        return sum(core) / len(core)
+
+
+class BaseloadEstimator:
+    """Gleitende Grundlast des Hauses (Feld 'home' ohne WP) aus dem Ringpuffer bzw. der live_history.txt."""
+
+    def __init__(self, path=LIVE_HISTORY_FILE, window_s=2 * 3600, lower=50, upper=1500, min_samples=10,
+                 ring_path=RING_FILE):
+        self.ring = RingReader(ring_path, initial_seconds=window_s)
+        self.reader = TailReader(path)
+        # Ignoriere 0-Werte und große Verbraucher (Backofen etc.), um die "ruhige" Last zu finden
+        self.window = RollingWindow(window_s, lower=lower, upper=upper)
+        self.min_samples = min_samples
+
+    def update(self):
+        # Doppelte Einträge beim Wechsel der Quelle verwirft RollingWindow (ts <= last_ts)
+        entries = self.ring.read_new()
+        if entries is None: entries = self.reader.read_new()
+        for entry in entries:
+            try:
+                self.window.add(parse_ts(entry.get('ts')), float(entry.get('home', 0)))
+            except (TypeError, ValueError):
+                continue
+        return self
+
+    def value(self, default=300.0):
+        if len(self.window) <= self.min_samples: return default
+        return self.window.trimmed_mean()
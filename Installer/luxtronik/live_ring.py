@@ -0,0 +1,328 @@
+"""
+Ringpuffer für die 48h-Live-History (Datei in der RAM-Disk, per mmap).
+
+live_history.txt (JSON-Lines) wird von get_live_json.php bei jedem Schreiben
+komplett gelesen, dekodiert und neu geschrieben; jeder Python-Leser dekodiert
+ebenfalls die ganze Datei. Der Ringpuffer hat feste Satzlänge:
+
+    Kopf    Magic, Version, Kanäle, Satzlänge, Kapazität, head, tail, count, seq
+            + Kanalnamen (je 16 Byte)
+    Sätze   float64 Unix-Zeit + float32 je Kanal (fehlender Wert = NaN)
+
+- append() ist O(1): Satz an head schreiben, head/tail/count im Kopf anpassen;
+  ist der Puffer voll, wird der älteste Satz überschrieben
+- Zeitbereiche per Binärsuche über die (aufsteigenden) Zeitstempel
+- seq ist ungerade, solange geschrieben wird; Leser wiederholen dann den Zugriff
+- as_array() liefert ein strukturiertes NumPy-Array (frombuffer, ohne Kopie,
+  solange der Bereich nicht über das Pufferende läuft; NumPy ist optional)
+- export_jsonl() schreibt dasselbe Format wie live_history.txt
+
+Geschrieben wird vom Live-Grabber (e3dc_grabber.py) einmal pro Minute.
+
+    python3 live_ring.py info
+    python3 live_ring.py export --hours 6 -o /tmp/live_history.txt
+    python3 live_ring.py import /var/www/html/ramdisk/live_history.txt
+"""
+
+import os
+import sys
+import json
+import math
+import mmap
+import time
+import struct
+import argparse
+from datetime import datetime
+
+RING_FILE = "/var/www/html/ramdisk/live_history.ring"
+LIVE_HISTORY_FILE = "/var/www/html/ramdisk/live_history.txt"
+HISTORY_HOURS = 48
+HISTORY_INTERVAL = 60    # s zwischen zwei Sätzen (wie get_live_json.php)
+CAPACITY = HISTORY_HOURS * 3600 // HISTORY_INTERVAL
+
+# Kanäle wie die Zeilen von get_live_json.php ('ts' steht separat als float64)
+CHANNELS = ('pv', 'bat', 'home_raw', 'home', 'grid', 'soc', 'wb', 'wp', 'price_ct',
+            'dc0_w', 'dc0_v', 'dc1_w', 'dc1_v', 'ac0_w', 'ac1_w', 'ac2_w',
+            'wb_p1', 'wb_p2', 'wb_p3', 'grid_p1', 'grid_p2', 'grid_p3',
+            'bat_v', 'bat_a', 'wb_locked')
+BOOL_CHANNELS = ('wb_locked',)
+NULLABLE_CHANNELS = ('price_ct',)   # fehlt der Wert, steht wie bei PHP null in der Zeile
+
+MAGIC = b'E3LR'
+VERSION = 1
+_HEAD = struct.Struct('<4sHHIIIIIQ')   # magic, version, nchan, record_size, capacity, head, tail, count, seq
+_NAME = struct.Struct('16s')
+_STATE_OFFSET = 16                      # head, tail, count, seq liegen hinter den festen Feldern
+_STATE = struct.Struct('<IIIQ')
+_TS = struct.Struct('<d')
+RETRIES = 5
+
+
+def _record_struct(nchan):
+    return struct.Struct('<d' + 'f' * nchan)
+
+
+def _data_offset(nchan):
+    # Sätze beginnen 64-Byte-ausgerichtet hinter Kopf und Kanalnamen
+    return (_HEAD.size + _NAME.size * nchan + 63) // 64 * 64
+
+
+def numpy_dtype(channels=CHANNELS):
+    import numpy as np  # optional, nur für as_array()
+    return np.dtype([('ts', '<f8')] + [(name, '<f4') for name in channels])
+
+
+def iso_ts(ts):
+    """Unix-Zeit -> ISO-Zeitstempel wie date('c') in PHP (lokale Zeit mit Offset)."""
+    return datetime.fromtimestamp(ts).astimezone().isoformat(timespec='seconds')
+
+
+class RingBusy(RuntimeError):
+    """Der Schreiber war während aller Leseversuche aktiv."""
+
+
+class LiveRing:
+    """
+    Zugriff auf den Ringpuffer. writable=True legt die Datei an, wenn sie fehlt
+    oder nicht zu Kanälen/Kapazität passt (dann beginnt die History neu).
+    """
+
+    def __init__(self, path=RING_FILE, writable=False, capacity=CAPACITY, channels=CHANNELS):
+        self.path = path
+        self.writable = writable
+        if writable: self._ensure_layout(capacity, channels)
+        fd = os.open(path, os.O_RDWR if writable else os.O_RDONLY)
+        try:
+            self.inode = os.fstat(fd).st_ino
+            self.mm = mmap.mmap(fd, 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        magic, version, nchan, record_size, self.capacity, _, _, _, _ = _HEAD.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.mm.close()
+            raise ValueError(f"{path}: kein Ringpuffer der Version {VERSION}")
+        self.channels = tuple(_NAME.unpack_from(self.mm, _HEAD.size + i * _NAME.size)[0].rstrip(b'\0').decode()
+                              for i in range(nchan))
+        self.record = _record_struct(nchan)
+        if record_size != self.record.size or len(self.mm) < _data_offset(nchan) + self.capacity * record_size:
+            self.mm.close()
+            raise ValueError(f"{path}: Satzlänge/Dateigröße passen nicht")
+        self.offset = _data_offset(nchan)
+        self.index = {name: i for i, name in enumerate(self.channels)}
+        if writable: self._recover()
+
+    def _recover(self):
+        # Schreiber während append() abgebrochen: seq wieder gerade machen; bei vollem
+        # Puffer kann der älteste Satz halb überschrieben sein und wird verworfen
+        head, tail, count, seq = _STATE.unpack_from(self.mm, _STATE_OFFSET)
+        if not seq & 1: return
+        if count == self.capacity: tail, count = (tail + 1) % self.capacity, count - 1
+        _STATE.pack_into(self.mm, _STATE_OFFSET, head, tail, count, seq + 1)
+
+    # --- Anlegen ---
+
+    def _ensure_layout(self, capacity, channels):
+        try:
+            with open(self.path, 'rb') as f: head = f.read(_data_offset(len(channels)))
+            magic, version, nchan, record_size, cap, _, _, _, _ = _HEAD.unpack_from(head, 0)
+            names = tuple(_NAME.unpack_from(head, _HEAD.size + i * _NAME.size)[0].rstrip(b'\0').decode()
+                          for i in range(nchan))
+            if (magic, version, cap, names) == (MAGIC, VERSION, capacity, tuple(channels)): return
+        except (OSError, struct.error, UnicodeDecodeError):
+            pass
+        self.create(self.path, capacity, channels)
+
+    @staticmethod
+    def create(path, capacity=CAPACITY, channels=CHANNELS):
+        """Legt einen leeren Ringpuffer an (atomar per rename, lesbar für www-data)."""
+        rec = _record_struct(len(channels))
+        offset = _data_offset(len(channels))
+        buf = bytearray(offset + capacity * rec.size)
+        _HEAD.pack_into(buf, 0, MAGIC, VERSION, len(channels), rec.size, capacity, 0, 0, 0, 0)
+        for i, name in enumerate(channels):
+            _NAME.pack_into(buf, _HEAD.size + i * _NAME.size, name.encode())
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f: f.write(buf)
+        os.chmod(tmp, 0o664)
+        os.replace(tmp, path)
+
+    # --- Zustand ---
+
+    def _state(self):
+        """(head, tail, count, seq) eines konsistenten Stands."""
+        for _ in range(RETRIES):
+            state = _STATE.unpack_from(self.mm, _STATE_OFFSET)
+            if not state[3] & 1: return state
+            time.sleep(0.001)
+        raise RingBusy(self.path)
+
+    def _read(self, fn):
+        # Seqlock: Ergebnis nur verwenden, wenn währenddessen nicht geschrieben wurde
+        for _ in range(RETRIES):
+            head, tail, count, seq = self._state()
+            result = fn(tail, count)
+            if _STATE.unpack_from(self.mm, _STATE_OFFSET)[3] == seq: return result
+        raise RingBusy(self.path)
+
+    def __len__(self):
+        return self._state()[2]
+
+    def _pos(self, tail, i):
+        return self.offset + ((tail + i) % self.capacity) * self.record.size
+
+    def _ts(self, tail, i):
+        return _TS.unpack_from(self.mm, self._pos(tail, i))[0]
+
+    def last_ts(self):
+        """Zeitstempel des jüngsten Satzes (None bei leerem Puffer)."""
+        return self._read(lambda tail, count: self._ts(tail, count - 1) if count else None)
+
+    def first_ts(self):
+        return self._read(lambda tail, count: self._ts(tail, 0) if count else None)
+
+    # --- Schreiben ---
+
+    def append(self, ts, values):
+        """Hängt einen Satz an (O(1)). False, wenn ts nicht jünger als der letzte Satz ist."""
+        head, tail, count, seq = _STATE.unpack_from(self.mm, _STATE_OFFSET)
+        if count and ts <= self._ts(tail, count - 1): return False
+        row = [float(ts)]
+        for name in self.channels:
+            v = values.get(name)
+            try:
+                row.append(float(v) if v is not None else math.nan)
+            except (TypeError, ValueError):
+                row.append(math.nan)
+        _STATE.pack_into(self.mm, _STATE_OFFSET, head, tail, count, seq + 1)
+        self.record.pack_into(self.mm, self.offset + head * self.record.size, *row)
+        head = (head + 1) % self.capacity
+        if count == self.capacity: tail = head
+        else: count += 1
+        _STATE.pack_into(self.mm, _STATE_OFFSET, head, tail, count, seq + 2)
+        return True
+
+    def flush(self):
+        self.mm.flush()
+
+    # --- Lesen ---
+
+    def _bisect(self, tail, count, t):
+        """Erster logischer Index mit ts >= t."""
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._ts(tail, mid) < t: lo = mid + 1
+            else: hi = mid
+        return lo
+
+    def _range(self, tail, count, t0, t1):
+        i0 = self._bisect(tail, count, t0) if t0 is not None else 0
+        i1 = self._bisect(tail, count, t1) if t1 is not None else count
+        return i0, max(i0, i1)
+
+    def rows(self, t0=None, t1=None):
+        """Sätze mit t0 <= ts < t1 als Tupel (ts, Kanal 0, Kanal 1, ...)."""
+        def read(tail, count):
+            i0, i1 = self._range(tail, count, t0, t1)
+            return [self.record.unpack_from(self.mm, self._pos(tail, i)) for i in range(i0, i1)]
+        return self._read(read)
+
+    def entries(self, t0=None, t1=None, iso=True):
+        """Sätze als Dictionaries im Format der live_history.txt (fehlende Werte entfallen)."""
+        out = []
+        for row in self.rows(t0, t1):
+            e = {'ts': iso_ts(row[0]) if iso else row[0]}
+            for name, v in zip(self.channels, row[1:]):
+                if math.isnan(v):
+                    if name in NULLABLE_CHANNELS: e[name] = None
+                    continue
+                # float32 -> kürzeste Dezimaldarstellung (12.34 statt 12.34000015258789)
+                e[name] = bool(v) if name in BOOL_CHANNELS else float(f"{v:.7g}")
+            out.append(e)
+        return out
+
+    def as_array(self, t0=None, t1=None):
+        """
+        Strukturiertes NumPy-Array (Felder 'ts' + Kanäle). Ohne Überlauf am Pufferende
+        eine Ansicht auf die mmap ohne Kopie - ein späteres append() kann deren älteste
+        Zeilen überschreiben; für längere Auswertungen .copy() verwenden.
+        """
+        import numpy as np  # optional
+        dtype = numpy_dtype(self.channels)
+
+        def read(tail, count):
+            i0, i1 = self._range(tail, count, t0, t1)
+            n = i1 - i0
+            start = (tail + i0) % self.capacity
+            first = min(n, self.capacity - start)
+            a = np.frombuffer(self.mm, dtype=dtype, count=first, offset=self.offset + start * self.record.size)
+            if first == n: return a
+            b = np.frombuffer(self.mm, dtype=dtype, count=n - first, offset=self.offset)
+            return np.concatenate((a, b))
+        return self._read(read)
+
+    def export_jsonl(self, f, t0=None, t1=None):
+        """Schreibt die Sätze als JSON-Lines wie live_history.txt; liefert die Anzahl."""
+        entries = self.entries(t0, t1)
+        for e in entries:
+            f.write(json.dumps(e, separators=(',', ':')) + "\n")   # kompakt wie json_encode()
+        return len(entries)
+
+    def import_jsonl(self, path, since=None):
+        """Übernimmt Zeilen einer live_history.txt (nur jüngere als der letzte Satz)."""
+        from history_tail import parse_ts
+        added = 0
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                ts = parse_ts(entry.get('ts')) if isinstance(entry, dict) else None
+                if ts is None or (since is not None and ts < since): continue
+                if self.append(ts, entry): added += 1
+        return added
+
+    def close(self):
+        self.mm.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Ringpuffer der Live-History")
+    ap.add_argument('--file', default=RING_FILE)
+    sub = ap.add_subparsers(dest='cmd')
+    sub.add_parser('info', help="Kapazität, Füllstand, Zeitraum")
+    ex = sub.add_parser('export', help="als JSON-Lines ausgeben (Format der live_history.txt)")
+    ex.add_argument('--hours', type=float, help="nur die letzten N Stunden")
+    ex.add_argument('-o', '--output')
+    im = sub.add_parser('import', help="JSON-Lines-Datei übernehmen")
+    im.add_argument('source', nargs='?', default=LIVE_HISTORY_FILE)
+    args = ap.parse_args()
+
+    if args.cmd == 'import':
+        ring = LiveRing(args.file, writable=True)
+        added = ring.import_jsonl(args.source, since=time.time() - HISTORY_HOURS * 3600)
+        ring.close()
+        print(f"{added} Einträge übernommen")
+        return 0
+
+    ring = LiveRing(args.file)
+    try:
+        if args.cmd == 'export':
+            t0 = time.time() - args.hours * 3600 if args.hours else None
+            if args.output:
+                with open(args.output, 'w') as f: ring.export_jsonl(f, t0)
+            else:
+                ring.export_jsonl(sys.stdout, t0)
+        else:
+            first, last = ring.first_ts(), ring.last_ts()
+            print(json.dumps({"file": args.file, "capacity": ring.capacity, "count": len(ring),
+                              "record_size": ring.record.size, "channels": list(ring.channels),
+                              "first": iso_ts(first) if first else None, "last": iso_ts(last) if last else None}))
+    finally:
+        ring.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+"""
+E3DC-Livewerte für den Energy Manager ohne Umweg über PHP.
+
+Bisher hat der Energy Manager get_live_json.php per HTTP abgefragt. Jede
+Abfrage hat live.txt per Regex zerlegt, value_filter.json neu geschrieben und
+ggf. live_history.txt sowie die Tagesstatistik neu berechnet. Dieses Modul
+liefert denselben Snapshot direkt im Prozess:
+
+  1. live_snapshot.json in der RAM-Disk (strukturierter Snapshot mit "seq"
+     vom Dienst e3dc-grabber, siehe e3dc_grabber.py) - nur bei neuer Sequenz
+     neu geladen, Preise/Prognose wie bei live.txt aus dem Forecast-Artefakt
+  2. live.txt (Screen-Dump von E3DC-Control) - nur bei geänderter mtime neu geparst,
+     Preise/Prognose aus dem gemeinsamen Forecast-Artefakt (forecast_cache.py)
+  3. HTTP-Abfrage von get_live_json.php als Rückfallebene
+
+Die Schlüssel entsprechen denen von get_live_json.php.
+"""
+
+import os
+import re
+import json
+import time
+
+from forecast_cache import load_forecast, price_ct, pv_watts
+
+RAMDISK = "/var/www/html/ramdisk"
+LIVE_FILE = os.path.join(RAMDISK, "live.txt")
+SNAPSHOT_FILE = os.path.join(RAMDISK, "live_snapshot.json")
+HTTP_URL = "http://localhost/get_live_json.php"
+# Strukturierter Snapshot gilt nur, solange er nicht älter als 60s ist (sonst läuft der Grabber nicht)
+SNAPSHOT_MAX_AGE = 60
+
+# Regex wie in get_live_json.php
+RE_POWER = re.compile(r'PV\s+\d+\+\d+=(\d+)\s+BAT\s+(-?\d+)\s+home\s+(\d+)\s+grid\s+(-?\d+)')
+RE_SOC_FULL = re.compile(r'SOC\s+(\d+\.?\d*)%\s+([-\d\.]+)V\s+([-\d\.]+)A')
+RE_SOC = re.compile(r'SOC\s+(\d+\.?\d*)%')
+RE_WB_TOTAL = re.compile(r'Total\s+([\d\.]+)\s+W')
+RE_RB_PRICE = re.compile(r'RB.*?%.*?%.*?%([^%\n]*)')
+RE_FLOAT = re.compile(r'(-?\d+(?:\.\d+)?)')
+RE_DC = re.compile(r'DC0\s+(\d+)\s*W\s+(\d+)\s*V\s+([\d\.]+)\s*A\s+DC1\s+(\d+)\s*W\s+(\d+)\s*V\s+([\d\.]+)\s*A')
+RE_AC = re.compile(r'AC0\s+([-\d\.]+)W\s+([-\d\.]+)V\s+([-\d\.]+)A\s+AC1\s+([-\d\.]+)W\s+([-\d\.]+)V\s+([-\d\.]+)A\s+AC2\s+([-\d\.]+)W\s+([-\d\.]+)V\s+([-\d\.]+)A')
+RE_WB_PHASES = re.compile(r'WB is\s+([\d\.]+)\s*W\s+([\d\.]+)\s*W\s+([\d\.]+)\s*W')
+RE_WB_LOCK = re.compile(r'WB:.*?\slock\s')
+RE_WB_MODE = re.compile(r'WBMode\s+(\d+)')
+RE_RB_FALLBACK = re.compile(r'RB\s+\d{1,2}:\d{2}\s+\d+\.?\d*%\s+RE\s+\d{1,2}:\d{2}\s+\d+\.?\d*%\s+LE\s+\d{1,2}:\d{2}\s+\d+\.?\d*%\s+(-?\d+(?:\.\d+)?)\s+(-?\d+(?:\.\d+)?)\s+(-?\d+(?:\.\d+)?)')
+RE_WP_S0 = re.compile(r'WP.*?([\d\.]+)\s*W')
+
+
+class ZeroFilter:
+    """
+    Überbrückt kurze 0-Werte (Lesefehler im Screen-Dump) wie value_filter.json in
+    get_live_json.php: bis zu 6 Zyklen wird der letzte Wert gehalten. Zustand nur im Speicher.
+    """
+
+    def __init__(self, max_zero=6):
+        self.max_zero = max_zero
+        self.state = {}
+
+    def __call__(self, key, value):
+        st = self.state.setdefault(key, {'last': value, 'z': 0})
+        if value == 0:
+            if st['z'] < self.max_zero:
+                st['z'] += 1
+                return st['last']
+            st['last'] = 0
+        else:
+            st['last'] = value
+            st['z'] = 0
+        return value
+
+
+def _num(value):
+    # PHP (int)"1.5" -> 1, Python int() würde fehlschlagen
+    return int(float(value))
+
+
+def parse_live_text(content, wurzelzaehler=0):
+    """
+    Zerlegt den Screen-Dump (live.txt). Gibt (Werte, gültig) zurück; gültig ist False,
+    wenn die PV/BAT/home/grid-Zeile fehlt (die Werte sind dann 0).
+    """
+    d = {'pv': 0, 'bat': 0, 'home_raw': 0, 'grid': 0, 'soc': 0, 'bat_v': 0, 'bat_a': 0, 'wb': 0,
+         'dc0_w': 0, 'dc0_v': 0, 'dc0_a': 0, 'dc1_w': 0, 'dc1_v': 0, 'dc1_a': 0,
+         'ac0_w': 0, 'ac0_v': 0, 'ac0_a': 0, 'ac1_w': 0, 'ac1_v': 0, 'ac1_a': 0,
+         'ac2_w': 0, 'ac2_v': 0, 'ac2_a': 0,
+         'wb_p1': 0, 'wb_p2': 0, 'wb_p3': 0, 'grid_p1': 0, 'grid_p2': 0, 'grid_p3': 0,
+         'wb_locked': False, 'wb_mode': 0, 'wp': 0, 'price_ct': None, 'price_source': None}
+    valid = False
+
+    m = RE_POWER.search(content)
+    if m:
+        d['pv'], d['bat'], d['home_raw'], d['grid'] = (int(x) for x in m.groups())
+        valid = True
+
+    m = RE_SOC_FULL.search(content)
+    if m:
+        d['soc'], d['bat_v'], d['bat_a'] = (float(x) for x in m.groups())
+    else:
+        m = RE_SOC.search(content)
+        if m: d['soc'] = float(m.group(1))
+
+    m = RE_WB_TOTAL.search(content)
+    if m: d['wb'] = float(m.group(1))
+
+    m = RE_RB_PRICE.search(content)
+    if m:
+        v = RE_FLOAT.search(m.group(1).strip())
+        if v:
+            d['price_ct'] = float(v.group(1))
+            d['price_source'] = 'live_rb'
+
+    m = RE_DC.search(content)
+    if m:
+        g = m.groups()
+        d['dc0_w'], d['dc0_v'], d['dc0_a'] = int(g[0]), int(g[1]), float(g[2])
+        d['dc1_w'], d['dc1_v'], d['dc1_a'] = int(g[3]), int(g[4]), float(g[5])
+
+    m = RE_AC.search(content)
+    if m:
+        g = m.groups()
+        for i in range(3):
+            d[f'ac{i}_w'], d[f'ac{i}_v'], d[f'ac{i}_a'] = _num(g[3 * i]), _num(g[3 * i + 1]), float(g[3 * i + 2])
+
+    m = RE_WB_PHASES.search(content)
+    if m: d['wb_p1'], d['wb_p2'], d['wb_p3'] = (float(x) for x in m.groups())
+
+    if RE_WB_LOCK.search(content): d['wb_locked'] = True
+
+    m = RE_WB_MODE.search(content)
+    if m: d['wb_mode'] = int(m.group(1))
+
+    m = re.search(r'#' + str(int(wurzelzaehler)) + r'\s+([-\d\.]+)W\s+([-\d\.]+)W\s+([-\d\.]+)W', content)
+    if m: d['grid_p1'], d['grid_p2'], d['grid_p3'] = (float(x) for x in m.groups())
+
+    if d['price_ct'] is None:
+        m = RE_RB_FALLBACK.search(content)
+        if m:
+            d['price_ct'] = float(m.group(1))
+            d['price_source'] = 'live_fallback'
+
+    m = RE_WP_S0.search(content)
+    if m: d['wp'] = float(m.group(1)) * 1000
+
+    return d, valid
+
+
+def build_snapshot(content, wurzelzaehler, zero_filter, mtime):
+    """Geparster und gefilterter Snapshot (ohne Preise) eines Screen-Dumps vom Zeitpunkt mtime."""
+    d, valid = parse_live_text(content, wurzelzaehler)
+    # Filter wie get_live_json.php (auch wenn die Regex fehlschlug -> Rohwerte 0)
+    for k, fk in (('pv', 'pv'), ('bat', 'bat'), ('home_raw', 'home'), ('grid', 'grid')):
+        d[k] = zero_filter(fk, d[k])
+    d['valid'] = valid
+    d['ts'] = int(mtime)
+    d['time'] = time.strftime("%H:%M:%S", time.localtime(mtime))
+    return d
+
+
+def price_vector(artifact, awmwst=19.0, awnebenkosten=0.0, speichergroesse=0.0):
+    """
+    Preise, Startstunde, Intervall und PV-Prognose aus dem Forecast-Artefakt
+    (gleiche Auswahl und Skalierung wie parsePricesFromAwattarDebug() in helpers.php).
+    """
+    prices = []; forecast = []
+    start_hour = None; interval = 1.0
+    if not artifact: return prices, start_hour, interval, forecast
+
+    data = artifact['data']
+    src_mtime = artifact['src']['mtime']
+    for h, raw, pv in zip(data['h'], data['price'], data['pv']):
+        price = price_ct(raw, src_mtime, awmwst, awnebenkosten)
+        if not (0 <= price <= 100): continue
+        if start_hour is None: start_hour = h
+        elif len(prices) == 1 and h - start_hour > 0: interval = round(h - start_hour, 4)
+        prices.append(price)
+        forecast.append({'h': h, 'w': pv_watts(pv, speichergroesse)})
+    return prices, start_hour, interval, forecast
+
+
+class LiveSnapshotProvider:
+    """
+    Liefert den aktuellen E3DC-Snapshot. get() wählt die erste verfügbare Quelle
+    (Snapshot-Datei, live.txt, HTTP); 'source' enthält die zuletzt genutzte.
+    """
+
+    def __init__(self, awattar_path, live_file=LIVE_FILE, snapshot_file=SNAPSHOT_FILE, http_url=HTTP_URL, timeout=5):
+        self.awattar_path = awattar_path
+        self.live_file = live_file
+        self.snapshot_file = snapshot_file
+        self.http_url = http_url
+        self.timeout = timeout
+        self.source = None
+        self.filter = ZeroFilter()
+        self._snap_key = None
+        self._snap = None
+        self._live_key = None
+        self._live = None
+        self._price_key = None
+        self._price = None
+
+    def _from_snapshot(self, cfg):
+        try:
+            st = os.stat(self.snapshot_file)
+        except OSError:
+            return None
+        if time.time() - st.st_mtime > SNAPSHOT_MAX_AGE: return None
+        key = (st.st_mtime_ns, st.st_size)
+        if key != self._snap_key:
+            try:
+                with open(self.snapshot_file, 'r') as f: snap = json.load(f)
+            except (OSError, ValueError):
+                return None
+            if not isinstance(snap, dict) or 'seq' not in snap: return None
+            if self._snap is None or snap['seq'] != self._snap.get('seq'): self._snap = snap
+            self._snap_key = key
+
+        d = dict(self._snap)
+        d['prices'], d['price_start_hour'], d['price_interval'], d['forecast'] = self._prices(cfg)
+        return d
+
+    def _prices(self, cfg):
+        artifact = load_forecast(self.awattar_path)
+        src = artifact['src'] if artifact else {}
+        key = (src.get('mtime_ns'), src.get('size'), cfg.awmwst, cfg.awnebenkosten, cfg.speichergroesse)
+        if key != self._price_key:
+            self._price = price_vector(artifact, cfg.awmwst, cfg.awnebenkosten, cfg.speichergroesse)
+            self._price_key = key
+        return self._price
+
+    def _from_live(self, cfg):
+        try:
+            st = os.stat(self.live_file)
+        except OSError:
+            return None
+        key = (st.st_mtime_ns, st.st_size, cfg.wurzelzaehler)
+        if key != self._live_key:
+            with open(self.live_file, 'r', encoding='utf-8', errors='replace') as f:
+                content = f.read()
+            self._live = build_snapshot(content, cfg.wurzelzaehler, self.filter, st.st_mtime)
+            self._live_key = key
+
+        d = dict(self._live)
+        d['prices'], d['price_start_hour'], d['price_interval'], d['forecast'] = self._prices(cfg)
+        return d
+
+    def _from_http(self):
+        import requests  # nur für die Rückfallebene benötigt
+        r = requests.get(self.http_url, timeout=self.timeout)
+        if r.status_code != 200:
+            raise ValueError(f"HTTP {r.status_code}")
+        return r.json()
+
+    def get(self, cfg):
+        """Aktueller Snapshot als Dictionary. Wirft eine Exception, wenn keine Quelle Daten liefert."""
+        d = self._from_snapshot(cfg)
+        if d is not None:
+            self.source = "snapshot"
+            return d
+        try:
+            d = self._from_live(cfg)
+        except Exception:
+            d = None
+        if d is not None:
+            self.source = "live"
+            return d
+        self.source = "http"
+        return self._from_http()
@@ -1,171 +1,119 @@
-import socket
-import struct
 import time
-import json
-import os
-
-def _read_e3dc_config_value(key, default=None):
-    """Liest einen Wert aus der zentralen e3dc.config.txt."""
-    # Finde den Installationspfad über die Web-Konfig
-    try:
-        with open('/var/www/html/e3dc_paths.json', 'r') as f:
-            paths = json.load(f)
-            install_path = paths.get('install_path', '/home/pi/E3DC-Control/')
-    except:
-        install_path = '/home/pi/E3DC-Control/'
-    
-    config_path = os.path.join(install_path, 'e3dc.config.txt')
-    if not os.path.exists(config_path): return default
-
-    try:
-        with open(config_path, 'r') as f:
-            for line in f:
-                if line.strip().startswith('#') or '=' not in line: continue
-                k, v = line.split('=', 1)
-                if k.strip().lower() == key.lower():
-                    return v.strip()
-    except Exception: pass
-    return default
+from register_map import (DEFAULT_MAX_GAP, DEFAULT_MAX_LEN, SHI_BLOCK, SHI_FALLBACK, register_addresses,
+                          plan_reads, sensor_scan, decode_registers, decode_shi)
+from modbus_session import ModbusSession, DEFAULT_MIN_GAP, DEFAULT_IDLE_TIMEOUT
+from mbap import ModbusExceptionResponse
+from e3dc_config import read_config_value
 
 class LuxtronikModbus:
-    def __init__(self, host=None, port=502):
+    def __init__(self, host=None, port=502, max_gap=DEFAULT_MAX_GAP, max_len=DEFAULT_MAX_LEN,
+                 min_gap=DEFAULT_MIN_GAP, idle_timeout=DEFAULT_IDLE_TIMEOUT):
         if host is None:
-            host = _read_e3dc_config_value('luxtronik_ip', '192.168.178.88')
+            host = read_config_value('luxtronik_ip', '192.168.178.88')
 
         self.host = host
         self.port = port
         self.unit_id = 1
-        self.socket = None
+        # Optional: Callback (Name, Sekunden) für Laufzeitmessungen (z.B. Energy Manager)
+        self.on_timing = None
+        # Eine Verbindung mit Mindestabstand zwischen den Anfragen (Schutz vor Fehler 816)
+        self.session = ModbusSession(host, port, self.unit_id, min_gap=min_gap,
+                                     idle_timeout=idle_timeout, on_timing=self._timed)
+        # Leseplan für read_all_sensors(); von der WP abgelehnte Blöcke werden künftig wie früher einzeln gelesen
+        self.max_gap = max_gap
+        self.max_len = max_len
+        self.read_plan = plan_reads(register_addresses(), max_gap, max_len)
+        # Optional: RegisterCache (Gruppen mit eigenem Intervall), sonst wird immer alles gelesen
+        self.cache = None
+        self.rejected_blocks = set()
+        self.last_exception = None
+
+    def _timed(self, name, t0):
+        if self.on_timing:
+            try: self.on_timing(name, time.monotonic() - t0)
+            except Exception: pass
 
     def connect(self):
-        try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.settimeout(3)
-            self.socket.connect((self.host, self.port))
-            return True
-        except:
-            return False
+        """Baut die Verbindung auf bzw. verwendet die bestehende weiter."""
+        return self.session.connect()
 
     def close(self):
-        if self.socket:
-            self.socket.close()
-            self.socket = None
+        self.session.close()
 
-    def _recv_exact(self, n):
-        data = b''
-        while len(data) < n:
-            chunk = self.socket.recv(n - len(data))
-            if not chunk: break
-            data += chunk
-        return data
+    @property
+    def stats(self):
+        return self.session.stats
 
     def _send_request(self, func_code, addr, val_or_count):
-        if not self.socket: return None
-        # WICHTIG: Kurze Pause für die Hardware-Stabilität der Luxtronik
-        time.sleep(0.2) 
-        req = struct.pack('>HHHBBHH', 1, 0, 6, self.unit_id, func_code, addr, val_or_count)
+        t0 = time.monotonic()
+        self.last_exception = None
         try:
-            self.socket.sendall(req)
-            header = self._recv_exact(9)
-            if not header or len(header) < 9: return None
-            
-            if func_code == 6: # Write Single Register
-                self._recv_exact(3) 
-                return True
-                
-            byte_count = header[8]
-            data = self._recv_exact(byte_count)
-            if not data: return None
-            return struct.unpack('>' + 'H' * (byte_count // 2), data)
-        except:
+            return self.session.request(func_code, addr, val_or_count)
+        except ModbusExceptionResponse as e:
+            # z.B. 2 = ungültige Adresse (Block wird von der WP abgelehnt)
+            self.last_exception = e.code
             return None
+        except Exception:
+            return None
+        finally:
+            self._timed(f"modbus_{'write' if func_code == 6 else 'read'}_{addr}", t0)
 
-    def read_all_sensors(self):
-        data = {}
-        def to_s(v): return struct.unpack('>h', struct.pack('>H', v))[0] / 10
-
-        # 1. Wärmequellen-Status (10000)
-        status_wp = self._send_request(4, 10000, 1)
-        if status_wp:
-            data['Verdichter_Ein'] = bool(status_wp[0] & 0x01)
-
-        # 2. Betriebsart (10002)
-        status_ba = self._send_request(4, 10002, 1)
-        if status_ba:
-            data['Betriebsart'] = status_ba[0]
-
-        # 3. Fehlernummer (10201)
-        status_err = self._send_request(4, 10201, 1)
-        if status_err:
-            data['Fehler_Nr'] = status_err[0]
-
-        # 4. Temperaturen Block A: Heizungskreis (10100 - 10106)
-        t_regs_a = self._send_request(4, 10100, 7)
-        if t_regs_a:
-            data['Ruecklauf_Soll'] = to_s(t_regs_a[1])   # 10101
-            data['Ruecklauf_Ist'] = to_s(t_regs_a[0])    # 10100
-            data['Ruecklauf_Extern'] = to_s(t_regs_a[2]) # 10102
-            data['Vorlauf_Ist'] = to_s(t_regs_a[5])      # 10105
-
-        # 5. Temperaturen Block B: Umwelt (10108 - 10111)
-        t_regs_b = self._send_request(4, 10108, 4)
-        if t_regs_b:
-            data['Aussentemp'] = to_s(t_regs_b[0])        # 10108
-            data['Aussentemp_Mittel'] = to_s(t_regs_b[1]) # 10109
-            data['Sole_Ein'] = to_s(t_regs_b[2])          # 10110
-            data['Sole_Aus'] = to_s(t_regs_b[3])          # 10111
-
-        # 6. Warmwasser Block (10120 - 10121)
-        ww_regs = self._send_request(4, 10120, 2)
-        if ww_regs:
-            data['Warmwasser_Ist'] = to_s(ww_regs[0])
-            data['Warmwasser_Soll'] = to_s(ww_regs[1])
+    def _read_block(self, start, count):
+        regs = self._send_request(4, start, count)
+        if not regs or len(regs) != count: return None
+        return regs
 
-        # 7. Aktuelle Leistung (Elektrisch & Thermisch)
-        # 10300: Thermische Heizleistung in kW (x10) -> z.B. 65 = 6.5 kW
-        # 10301: Elektrische Leistungsaufnahme in W (x100) -> z.B. 15 = 1500 W
-        p_regs = self._send_request(4, 10300, 2)
-        if p_regs:
-            data['Leistung_Heiz_kW'] = p_regs[0] / 10.0
-            # Skalierung x100 für grobe 100W-Schritte (15 -> 1500W)
-            data['Leistung_Verdichter_W'] = p_regs[1] * 100.0
+    def read_all_sensors(self):
+        """
+        Liest alle Sensoren aus REGISTER_MAP mit möglichst wenigen Blockzugriffen.
+        Mit Cache nur die fälligen Gruppen, die übrigen Werte kommen aus dem Cache.
+        """
+        now = time.monotonic()
+        plan = self.cache.plan(self.max_gap, self.max_len, now) if self.cache else self.read_plan
+        values = self._scan(plan)
+        return decode_registers(self.cache.merge(values, now) if self.cache else values)
 
-        # Energie Zähler
-        e_elek_hw = self._send_request(4, 10310, 1)
-        e_elek_lw = self._send_request(4, 10311, 1)
-        if e_elek_hw and e_elek_lw:
-            data['Energie_Elek_kWh'] = ((e_elek_hw[0] << 16) + e_elek_lw[0])
-            
-        e_waerme_hw = self._send_request(4, 10320, 1)
-        e_waerme_lw = self._send_request(4, 10321, 1)
-        if e_waerme_hw and e_waerme_lw:
-            data['Energie_Waerme_kWh'] = ((e_waerme_hw[0] << 16) + e_waerme_lw[0])
-        
-        return data
+    def _scan(self, plan):
+        scan = sensor_scan(plan, self.rejected_blocks)
+        try:
+            start, count = next(scan)
+            while True:
+                regs = self._read_block(start, count)
+                start, count = scan.send((regs, self.last_exception))
+        except StopIteration as done:
+            return done.value
 
     def read_shi_status(self):
         """Liest Holding Register für den SHI-Status"""
-        data = {}
+        return decode_shi(self._read_shi_values())
+
+    def _read_shi_values(self):
+        values = {}
         # Holding Register ab 10000 (FC 03)
-        regs = self._send_request(3, 10000, 10)
+        start, count = SHI_BLOCK
+        regs = self._send_request(3, start, count)
         if regs:
-            data['HZ_Mode'] = regs[0]      # 10000
-            data['HZ_Setpoint'] = regs[1] / 10 # 10001
-            data['WW_Mode'] = regs[5]      # 10005
-            data['WW_Setpoint'] = regs[6] / 10 # 10006
+            values.update(zip(range(start, start + count), regs))
         else:
             # Fallback: Einzeln lesen falls Block-Read fehlschlägt
-            r1 = self._send_request(3, 10000, 2)
-            if r1: 
-                data['HZ_Mode'] = r1[0]
-                data['HZ_Setpoint'] = r1[1] / 10
-            
-            r2 = self._send_request(3, 10005, 2)
-            if r2:
-                data['WW_Mode'] = r2[0]
-                data['WW_Setpoint'] = r2[1] / 10
-        return data
+            for start, count in SHI_FALLBACK:
+                regs = self._send_request(3, start, count)
+                if regs: values.update(zip(range(start, start + count), regs))
+        return values
     
+    def write_register(self, addr, value):
+        """Schreibt ein einzelnes Holding Register (FC 06). True bei Bestätigung durch die WP."""
+        return self._send_request(6, addr, value) is True
+
+    def write_shi(self, writes):
+        """
+        Schreibt SHI-Register [(Register, Wert), ...] in der angegebenen Reihenfolge und liest
+        den SHI-Block in derselben Verbindung zurück. Liefert (Echo-Ergebnis je Zugriff,
+        zurückgelesene Rohwerte {Register: Wert}, leer wenn das Rücklesen fehlschlug).
+        """
+        results = [self.write_register(reg, value) for reg, value in writes]
+        return results, self._read_shi_values()
+
     def write_ww_boost(self, mode, temp):
         """Schreibt Werte in das SHI für Warmwasser"""
         # Temperatur mal 10
@@ -0,0 +1,243 @@
+"""
+asyncio-Variante des Luxtronik-Modbus-Clients.
+
+Gleiche Register-API wie LuxtronikModbus (read_all_sensors, read_shi_status,
+write_register, write_ww_boost, write_hz_boost), aber als Coroutinen auf
+asyncio-Streams. Wartezeiten (Taktung, Antwort der WP) blockieren keinen
+Thread, die WP-Abfrage läuft damit im selben Event-Loop parallel zur
+E3DC-Abfrage und zur Preisverarbeitung.
+
+- Timeouts über asyncio.wait_for, Taktung über den Token-Bucket mit asyncio.sleep.
+- Wird eine Anfrage abgebrochen (Cancel), wird die Verbindung verworfen, damit
+  keine halb gelesene Antwort den nächsten Zugriff stört.
+- Anfragen laufen nacheinander (asyncio.Lock), auch wenn mehrere Tasks den Client nutzen.
+"""
+
+import time
+import asyncio
+
+from e3dc_config import read_config_value
+from register_map import (DEFAULT_MAX_GAP, DEFAULT_MAX_LEN, SHI_BLOCK, SHI_FALLBACK, register_addresses,
+                          plan_reads, sensor_scan, decode_registers, decode_shi)
+from modbus_session import TokenBucket, DEFAULT_MIN_GAP, DEFAULT_IDLE_TIMEOUT, DEFAULT_TIMEOUT, MAX_STALE_FRAMES
+from mbap import (MBAP_SIZE, build_request, decode_header, decode_pdu, ModbusConnectionError, ModbusFrameError,
+                  ModbusExceptionResponse)
+
+
+class AsyncLuxtronikModbus:
+    def __init__(self, host=None, port=502, max_gap=DEFAULT_MAX_GAP, max_len=DEFAULT_MAX_LEN,
+                 min_gap=DEFAULT_MIN_GAP, idle_timeout=DEFAULT_IDLE_TIMEOUT, timeout=DEFAULT_TIMEOUT):
+        if host is None:
+            host = read_config_value('luxtronik_ip', '192.168.178.88')
+
+        self.host = host
+        self.port = port
+        self.unit_id = 1
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.bucket = TokenBucket(1.0 / min_gap) if min_gap > 0 else None
+        # Optional: Callback (Name, Sekunden) für Laufzeitmessungen (z.B. Energy Manager)
+        self.on_timing = None
+        self.max_gap = max_gap
+        self.max_len = max_len
+        self.read_plan = plan_reads(register_addresses(), max_gap, max_len)
+        # Optional: RegisterCache (Gruppen mit eigenem Intervall), sonst wird immer alles gelesen
+        self.cache = None
+        self.rejected_blocks = set()
+        self.last_exception = None
+        self.reader = None
+        self.writer = None
+        self.last_used = 0.0
+        self.tid = 0
+        self._lock = None
+        self.stats = {"connects": 0, "reconnects": 0, "requests": 0, "errors": 0, "timeouts": 0, "frame_errors": 0,
+                      "exceptions": 0, "stale_frames": 0, "paced_seconds": 0.0}
+
+    def _timed(self, name, t0):
+        if self.on_timing:
+            try: self.on_timing(name, time.monotonic() - t0)
+            except Exception: pass
+
+    @property
+    def lock(self):
+        # Erst im laufenden Event-Loop anlegen (Python 3.7 bindet den Lock an den Loop)
+        if self._lock is None: self._lock = asyncio.Lock()
+        return self._lock
+
+    # --- Verbindung ---
+
+    async def connect(self):
+        """
+        Baut die Verbindung auf bzw. verwendet die bestehende weiter. Unter dem Lock,
+        damit nicht zwei Tasks gleichzeitig verbinden (die erste Verbindung bliebe offen).
+        """
+        async with self.lock:
+            return await self._connect()
+
+    async def _connect(self):
+        if self.writer and time.monotonic() - self.last_used > self.idle_timeout:
+            self.close()
+        if self.writer: return True
+        t0 = time.monotonic()
+        try:
+            self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+            self.last_used = time.monotonic()
+            self.stats["connects"] += 1
+            return True
+        except (OSError, asyncio.TimeoutError):
+            return False
+        finally:
+            self._timed("modbus_connect", t0)
+
+    def close(self):
+        """Verwirft die Verbindung (ohne auf das Schließen zu warten)."""
+        if self.writer:
+            try: self.writer.close()
+            except Exception: pass
+        self.reader = self.writer = None
+
+    # --- Anfragen ---
+
+    async def _read_frame(self):
+        tid, pdu_len, unit = decode_header(await asyncio.wait_for(self.reader.readexactly(MBAP_SIZE), self.timeout))
+        return tid, unit, await asyncio.wait_for(self.reader.readexactly(pdu_len), self.timeout)
+
+    async def _exchange(self, func_code, addr, val_or_count):
+        self.tid = tid = (self.tid + 1) & 0xFFFF
+        self.writer.write(build_request(tid, self.unit_id, func_code, addr, val_or_count))
+        await asyncio.wait_for(self.writer.drain(), self.timeout)
+        for _ in range(MAX_STALE_FRAMES):
+            r_tid, unit, pdu = await self._read_frame()
+            if r_tid != tid:
+                self.stats["stale_frames"] += 1
+                continue
+            if unit != self.unit_id: raise ModbusFrameError(f"Unit {unit} statt {self.unit_id}")
+            return decode_pdu(func_code, addr, val_or_count, pdu)
+        raise ModbusFrameError("Keine Antwort zur Transaktions-ID")
+
+    async def request(self, func_code, addr, val_or_count):
+        """
+        Sendet eine Anfrage und liefert die Register (FC 03/04) bzw. True (FC 06).
+        Fehler wie bei ModbusSession.request() als ModbusError-Typen.
+        """
+        async with self.lock:
+            for _ in range(2):
+                reused = self.writer is not None and time.monotonic() - self.last_used <= self.idle_timeout
+                if not await self._connect(): raise ModbusConnectionError(f"Keine Verbindung zu {self.host}:{self.port}")
+                if self.bucket:
+                    wait = self.bucket.reserve()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                        self.stats["paced_seconds"] += wait
+                self.stats["requests"] += 1
+                t0 = time.monotonic()
+                try:
+                    try:
+                        result = await self._exchange(func_code, addr, val_or_count)
+                    finally:
+                        if self.bucket: self.bucket.drain()
+                        self._timed("modbus_rtt", t0)
+                    self.last_used = time.monotonic()
+                    return result
+                except asyncio.CancelledError:
+                    self.close()
+                    raise
+                except ModbusExceptionResponse:
+                    self.last_used = time.monotonic()
+                    self.stats["exceptions"] += 1
+                    raise
+                except ModbusFrameError:
+                    self.stats["frame_errors"] += 1
+                    self.close()
+                    raise
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ModbusConnectionError) as e:
+                    self.stats["errors"] += 1
+                    if isinstance(e, asyncio.TimeoutError): self.stats["timeouts"] += 1
+                    self.close()
+                    if not reused: raise ModbusConnectionError(str(e) or type(e).__name__) from e
+                    self.stats["reconnects"] += 1
+
+    async def _try_request(self, func_code, addr, val_or_count):
+        """
+        Liefert (Ergebnis, Exception-Code); bei Fehlern (None, Code bzw. None).
+        Der Code kommt mit dem Ergebnis zurück statt über last_exception, weil sich
+        Abfrage und Schreiben den Client im selben Event-Loop teilen.
+        """
+        t0 = time.monotonic()
+        try:
+            return await self.request(func_code, addr, val_or_count), None
+        except asyncio.CancelledError:
+            raise
+        except ModbusExceptionResponse as e:
+            return None, e.code
+        except Exception:
+            return None, None
+        finally:
+            self._timed(f"modbus_{'write' if func_code == 6 else 'read'}_{addr}", t0)
+
+    async def _send_request(self, func_code, addr, val_or_count):
+        result, self.last_exception = await self._try_request(func_code, addr, val_or_count)
+        return result
+
+    async def _read_block(self, start, count):
+        """Liefert (Register, Exception-Code) für sensor_scan()."""
+        regs, code = await self._try_request(4, start, count)
+        if not regs or len(regs) != count: return None, code
+        return regs, None
+
+    # --- Register-API ---
+
+    async def read_all_sensors(self):
+        """
+        Liest alle Sensoren aus REGISTER_MAP mit möglichst wenigen Blockzugriffen.
+        Mit Cache nur die fälligen Gruppen, die übrigen Werte kommen aus dem Cache.
+        """
+        now = time.monotonic()
+        plan = self.cache.plan(self.max_gap, self.max_len, now) if self.cache else self.read_plan
+        values = await self._scan(plan)
+        return decode_registers(self.cache.merge(values, now) if self.cache else values)
+
+    async def _scan(self, plan):
+        scan = sensor_scan(plan, self.rejected_blocks)
+        try:
+            start, count = next(scan)
+            while True:
+                start, count = scan.send(await self._read_block(start, count))
+        except StopIteration as done:
+            return done.value
+
+    async def read_shi_status(self):
+        """Liest Holding Register für den SHI-Status"""
+        return decode_shi(await self._read_shi_values())
+
+    async def _read_shi_values(self):
+        values = {}
+        start, count = SHI_BLOCK
+        regs = await self._send_request(3, start, count)
+        if regs:
+            values.update(zip(range(start, start + count), regs))
+        else:
+            for start, count in SHI_FALLBACK:
+                regs = await self._send_request(3, start, count)
+                if regs: values.update(zip(range(start, start + count), regs))
+        return values
+
+    async def write_register(self, addr, value):
+        """Schreibt ein einzelnes Holding Register (FC 06). True bei Bestätigung durch die WP."""
+        return await self._send_request(6, addr, value) is True
+
+    async def write_shi(self, writes):
+        """Wie LuxtronikModbus.write_shi(): schreiben, dann den SHI-Block zurücklesen."""
+        results = [await self.write_register(reg, value) for reg, value in writes]
+        return results, await self._read_shi_values()
+
+    async def write_ww_boost(self, mode, temp):
+        """Schreibt Werte in das SHI für Warmwasser (erst Sollwert 10006, dann Modus 10005)"""
+        await self._send_request(6, 10006, int(temp * 10))
+        await self._send_request(6, 10005, mode)
+
+    async def write_hz_boost(self, mode, setpoint=None):
+        """Schreibt Werte für den Heizungs-Boost (mode: 0=Auto/Aus, 1=Setpoint, setpoint in °C)"""
+        if setpoint is not None:
+            await self._send_request(6, 10001, int(setpoint * 10))
+        await self._send_request(6, 10000, mode)
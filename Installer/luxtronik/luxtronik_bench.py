@@ -0,0 +1,242 @@
+"""
+Benchmark des Luxtronik-Modbus-Clients (Antwortzeiten, Taktung, Stabilität).
+
+Führt N Abfragezyklen wie der Energy Manager aus (read_all_sensors() und
+read_shi_status()) und schreibt vergleichbare JSON-Ergebnisse:
+
+- Histogramme mit festen Grenzen (ms): reine Antwortzeit je Anfrage (rtt),
+  Anfrage inkl. Wartezeit der Taktung (request), Verbindungsaufbau, Dauer je
+  Scan und je Zyklus
+- Fehler-, Timeout- und Exception-Zähler, unvollständige Scans
+- effektive Anfragerate und Auslastung des Busses
+
+Mehrere Werte für --min-gap/--max-gap/--max-len werden nacheinander gemessen
+(ein Lauf pro Kombination, jeweils mit neuer Verbindung). Mit --sim läuft ein
+lokaler Simulator (luxtronik_sim.py) im selben Prozess, dessen Zähler
+(zu dichte Anfragen, Sperren wie bei Fehler 816) mit ausgegeben werden.
+
+    python3 luxtronik_bench.py --sim --cycles 20 --min-gap 0.1,0.2,0.3 --max-len 8,32 -o bench.json
+    python3 luxtronik_bench.py --host 192.168.178.88 --cycles 10
+
+Gegen eine echte WP mit Bedacht messen: zu kleine --min-gap oder --interval
+können die Luxtronik zum Absturz bringen (Fehler 816). Ohne --sim liegen
+deshalb standardmäßig 30s zwischen den Zyklen.
+"""
+
+import sys
+import json
+import time
+import bisect
+import asyncio
+import argparse
+import itertools
+
+from metrics import _percentile
+from register_map import REGISTER_MAP, DEFAULT_MAX_GAP, DEFAULT_MAX_LEN
+from register_cache import RegisterCache
+from modbus_session import DEFAULT_MIN_GAP
+from luxtronik import LuxtronikModbus
+from luxtronik_async import AsyncLuxtronikModbus
+
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+REAL_INTERVAL = 30.0    # Pause zwischen den Zyklen gegen eine echte WP
+SHI_KEYS = 4            # HZ_Mode, HZ_Setpoint, WW_Mode, WW_Setpoint
+ERROR_KEYS = ("errors", "timeouts", "frame_errors", "exceptions", "reconnects", "stale_frames")
+
+
+class Histogram:
+    """Laufzeiten mit festen Bucket-Grenzen in ms, damit Läufe und Geräte vergleichbar bleiben."""
+
+    def __init__(self, bounds=BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.values = []
+
+    def add(self, seconds):
+        ms = seconds * 1000.0
+        self.values.append(ms)
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+
+    def as_dict(self):
+        values = sorted(self.values)
+        buckets = {f"le_{b}": c for b, c in zip(self.bounds, self.counts)}
+        buckets["inf"] = self.counts[-1]
+        return {
+            "count": len(values),
+            "mean": round(sum(values) / len(values), 3) if values else 0.0,
+            "min": round(values[0], 3) if values else 0.0,
+            "p50": round(_percentile(values, 50), 3),
+            "p95": round(_percentile(values, 95), 3),
+            "p99": round(_percentile(values, 99), 3),
+            "max": round(values[-1], 3) if values else 0.0,
+            "buckets": buckets,
+        }
+
+
+class Run:
+    """Messwerte eines Laufs (eine Parameterkombination)."""
+
+    def __init__(self, params):
+        self.params = params
+        self.hist = {name: Histogram() for name in ("rtt", "request", "connect", "scan_sensors", "scan_shi", "cycle")}
+        self.incomplete = {"sensors": 0, "shi": 0}
+        self.wall = 0.0
+
+    def on_timing(self, name, seconds):
+        if name == "modbus_rtt": self.hist["rtt"].add(seconds)
+        elif name == "modbus_connect": self.hist["connect"].add(seconds)
+        elif name.startswith("modbus_"): self.hist["request"].add(seconds)
+
+    def cycle(self, t_sensors, sensors, t_shi, status):
+        self.hist["scan_sensors"].add(t_sensors)
+        self.hist["scan_shi"].add(t_shi)
+        self.hist["cycle"].add(t_sensors + t_shi)
+        self.wall += t_sensors + t_shi
+        if any(entry[0] not in sensors for entry in REGISTER_MAP): self.incomplete["sensors"] += 1
+        if len(status) < SHI_KEYS: self.incomplete["shi"] += 1
+
+    def result(self, stats, sim=None):
+        requests = stats["requests"]
+        busy = sum(self.hist["rtt"].values) / 1000.0
+        res = {
+            "params": self.params,
+            "cycles": len(self.hist["cycle"].values),
+            "wall_s": round(self.wall, 3),
+            "requests": requests,
+            "requests_per_cycle": round(requests / max(1, len(self.hist["cycle"].values)), 2),
+            "requests_per_s": round(requests / self.wall, 2) if self.wall else 0.0,
+            "bus_busy": round(busy / self.wall, 3) if self.wall else 0.0,
+            "paced_s": round(stats["paced_seconds"], 3),
+            "failures": {k: stats.get(k, 0) for k in ERROR_KEYS},
+            "incomplete": self.incomplete,
+            "hist": {name: h.as_dict() for name, h in self.hist.items()},
+        }
+        if sim is not None:
+            s = sim.stats
+            res["sim"] = {"gap_violations": s["gap_violations"], "lockups": s["lockups"],
+                          "dropped_locked": s["dropped_locked"], "min_gap": s["min_gap"], "faults": s["faults"]}
+        return res
+
+
+def _pause(run_no, cycle, interval):
+    # Pause vor jedem Zyklus außer dem allerersten (auch zwischen zwei Läufen)
+    return interval if (run_no or cycle) else 0.0
+
+
+def bench_sync(host, port, params, cycles, interval, cache, run_no):
+    run = Run(params)
+    wp = LuxtronikModbus(host, port, max_gap=params["max_gap"], max_len=params["max_len"], min_gap=params["min_gap"])
+    wp.on_timing = run.on_timing
+    if cache: wp.cache = RegisterCache()
+    try:
+        for i in range(cycles):
+            time.sleep(_pause(run_no, i, interval))
+            t0 = time.perf_counter()
+            sensors = wp.read_all_sensors() if wp.connect() else {}
+            t1 = time.perf_counter()
+            status = wp.read_shi_status() if wp.connect() else {}
+            run.cycle(t1 - t0, sensors, time.perf_counter() - t1, status)
+    finally:
+        wp.close()
+    return run, wp.stats
+
+
+async def _bench_async(host, port, params, cycles, interval, cache, run_no):
+    run = Run(params)
+    wp = AsyncLuxtronikModbus(host, port, max_gap=params["max_gap"], max_len=params["max_len"], min_gap=params["min_gap"])
+    wp.on_timing = run.on_timing
+    if cache: wp.cache = RegisterCache()
+    try:
+        for i in range(cycles):
+            await asyncio.sleep(_pause(run_no, i, interval))
+            t0 = time.perf_counter()
+            sensors = await wp.read_all_sensors() if await wp.connect() else {}
+            t1 = time.perf_counter()
+            status = await wp.read_shi_status() if await wp.connect() else {}
+            run.cycle(t1 - t0, sensors, time.perf_counter() - t1, status)
+    finally:
+        wp.close()
+    return run, wp.stats
+
+
+def bench_async(*args):
+    return asyncio.run(_bench_async(*args))
+
+
+def _floats(text):
+    return [float(v) for v in text.split(',') if v.strip()]
+
+
+def _ints(text):
+    return [int(v) for v in text.split(',') if v.strip()]
+
+
+def _summary(res):
+    h = res["hist"]
+    p = res["params"]
+    f = res["failures"]
+    line = (f"min_gap={p['min_gap']:<5} max_gap={p['max_gap']:<3} max_len={p['max_len']:<3} "
+            f"Zyklus p50={h['cycle']['p50']:.0f}ms p95={h['cycle']['p95']:.0f}ms  "
+            f"RTT p50={h['rtt']['p50']:.1f}ms p95={h['rtt']['p95']:.1f}ms  "
+            f"{res['requests_per_cycle']} Anfr./Zyklus {res['requests_per_s']}/s  "
+            f"Fehler={f['errors']} Timeouts={f['timeouts']} Exc={f['exceptions']}")
+    if "sim" in res: line += f"  816-Verstöße={res['sim']['gap_violations']} Sperren={res['sim']['lockups']}"
+    return line
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark des Luxtronik-Modbus-Clients")
+    ap.add_argument('--host', help="WP-Adresse (Standard: luxtronik_ip aus e3dc.config.txt)")
+    ap.add_argument('--port', type=int, default=502)
+    ap.add_argument('--sim', action='store_true', help="lokalen Simulator starten und gegen ihn messen")
+    ap.add_argument('--cycles', type=int, default=10, help="Abfragezyklen pro Lauf")
+    ap.add_argument('--interval', type=float, help=f"Pause zwischen den Zyklen in s (Standard {REAL_INTERVAL:g}, mit --sim 0)")
+    ap.add_argument('--min-gap', default=str(DEFAULT_MIN_GAP), help="Mindestabstand der Anfragen in s, Liste mit Komma")
+    ap.add_argument('--max-gap', default=str(DEFAULT_MAX_GAP), help="Lücke im Leseplan (Register), Liste mit Komma")
+    ap.add_argument('--max-len', default=str(DEFAULT_MAX_LEN), help="max. Blocklänge (Register), Liste mit Komma")
+    ap.add_argument('--async', dest='use_async', action='store_true', help="asyncio-Client messen")
+    ap.add_argument('--cache', action='store_true', help="mit RegisterCache wie im Energy Manager")
+    ap.add_argument('--sim-latency', type=float, default=0.0)
+    ap.add_argument('--sim-jitter', type=float, default=0.0)
+    ap.add_argument('--sim-min-gap', type=float, default=0.2, help="Mindestabstand, ab dem der Simulator Fehler 816 zählt")
+    ap.add_argument('--sim-fault', action='append', help="timeout=P, short=P oder exception=P (mehrfach möglich)")
+    ap.add_argument('--seed', type=int)
+    ap.add_argument('-o', '--output', help="JSON-Ergebnis in diese Datei (sonst stdout)")
+    args = ap.parse_args()
+
+    interval = args.interval if args.interval is not None else (0.0 if args.sim else REAL_INTERVAL)
+    combos = list(itertools.product(_floats(args.min_gap), _ints(args.max_gap), _ints(args.max_len)))
+    runner = bench_async if args.use_async else bench_sync
+
+    if args.sim:
+        from luxtronik_sim import start_background, _parse_faults
+        faults = _parse_faults(ap, args.sim_fault)
+        host = '127.0.0.1'
+    else:
+        from e3dc_config import read_config_value
+        host = args.host or read_config_value('luxtronik_ip', '192.168.178.88')
+
+    runs = []
+    for run_no, (min_gap, max_gap, max_len) in enumerate(combos):
+        params = {"min_gap": min_gap, "max_gap": max_gap, "max_len": max_len}
+        sim, port = None, args.port
+        if args.sim:
+            # Eigener Simulator pro Lauf: eine Sperre aus dem vorigen Lauf verfälscht sonst den nächsten
+            sim, port = start_background(latency=args.sim_latency, jitter=args.sim_jitter, min_gap=args.sim_min_gap,
+                                         faults=faults, seed=args.seed)
+        run, stats = runner(host, port, params, args.cycles, interval, args.cache, run_no)
+        res = run.result(stats, sim)
+        runs.append(res)
+        print(_summary(res), file=sys.stderr, flush=True)
+
+    result = {"ts": time.time(), "host": "sim" if args.sim else host, "port": args.port if not args.sim else None,
+              "client": "async" if args.use_async else "sync", "cache": args.cache, "cycles": args.cycles,
+              "interval": interval, "buckets_ms": BUCKETS_MS, "runs": runs}
+    if args.output:
+        with open(args.output, 'w') as f: json.dump(result, f, indent=1)
+    else:
+        print(json.dumps(result, indent=1))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
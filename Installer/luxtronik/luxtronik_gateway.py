@@ -0,0 +1,90 @@
+"""
+Gateway zur Wärmepumpe: ein einziger Besitzer der Modbus-Verbindung.
+
+Der Energy Manager hält die einzige Verbindung zur Luxtronik und stellt über
+einen Unix-Socket in der RAM-Disk seinen letzten Stand bereit. get_luxtronik.py
+und set_manual_boost.py fragen zuerst dort an, statt selbst eine zweite
+Verbindung aufzubauen (parallele Zugriffe können die Luxtronik zum Absturz
+bringen). Läuft der Dienst nicht, verbinden sie sich wie bisher direkt.
+
+Protokoll: eine JSON-Zeile pro Anfrage, eine JSON-Zeile als Antwort.
+    {"cmd": "ping"}
+    {"cmd": "snapshot"}                          -> letzter Stand (data, status, age, ...)
+    {"cmd": "write", "ww": [1, 55.0], "hz": [0]} -> Schreibzugriffe über die gemeinsame Verbindung
+"""
+
+import os
+import json
+import time
+import asyncio
+
+from gateway_client import GATEWAY_SOCKET, MAX_LINE
+
+
+class LuxtronikGateway:
+    """
+    Unix-Socket-Server im Event-Loop des Energy Managers.
+
+    snapshot: Funktion, die den letzten Stand als Dictionary liefert (ohne Buszugriff)
+    write:    Coroutine-Funktion write(ww, hz), ww/hz = (Modus, Temperatur) bzw. None
+    """
+
+    def __init__(self, snapshot, write, path=GATEWAY_SOCKET, logger=None):
+        self.snapshot = snapshot
+        self.write = write
+        self.path = path
+        self.logger = logger
+        self.server = None
+        self.stats = {"connections": 0, "snapshot": 0, "write": 0, "errors": 0}
+
+    async def serve(self):
+        """Startet den Server und läuft, bis der Task abgebrochen wird."""
+        try: os.unlink(self.path)
+        except FileNotFoundError: pass
+        self.server = await asyncio.start_unix_server(self._handle, path=self.path, limit=MAX_LINE)
+        # Gruppe (www-data) darf verbinden, z.B. get_luxtronik.py aus luxtronik.php
+        try: os.chmod(self.path, 0o660)
+        except OSError: pass
+        if self.logger: self.logger.info(f"Luxtronik-Gateway bereit ({self.path}).")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            self.server.close()
+            try: os.unlink(self.path)
+            except OSError: pass
+
+    async def _handle(self, reader, writer):
+        self.stats["connections"] += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line: break
+                try:
+                    reply = await self._dispatch(json.loads(line))
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    reply = {"ok": False, "error": str(e)}
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, req):
+        cmd = req.get("cmd")
+        if cmd == "ping":
+            return {"ok": True}
+        if cmd == "snapshot":
+            self.stats["snapshot"] += 1
+            return {"ok": True, **self.snapshot()}
+        if cmd == "write":
+            self.stats["write"] += 1
+            ww, hz = req.get("ww"), req.get("hz")
+            report = await self.write(ww and tuple(ww), hz and tuple(hz))
+            return {"ok": report is not None and not report.get("failed"), "report": report}
+        return {"ok": False, "error": f"Unbekanntes Kommando '{cmd}'"}
+
+
+def snapshot_age(ts):
+    return round(time.time() - ts, 1) if ts else None
@@ -0,0 +1,374 @@
+"""
+Lokaler Simulator einer Luxtronik-Wärmepumpe (Modbus TCP) für Tests und Benchmarks.
+
+- FC 04 (Input-Register) auf den Sensor-Registern aus register_map.py,
+  FC 03/06 (Holding-Register) auf dem SHI-Block 10000-10009.
+- Thermisches Modell: Warmwasser und Rücklauf laufen mit der WP auf ihre
+  Sollwerte (SHI-Sollwerte, wenn der jeweilige Modus aktiv ist), sonst kühlen
+  sie langsam ab. Leistung, Betriebsart und Energiezähler folgen dem Verdichter.
+- Fehler 816: Kommen mehrere Anfragen schneller als --min-gap hintereinander,
+  sperrt sich der Simulator für --lockup Sekunden (keine Antworten, Fehler_Nr = 816).
+- Fehlerinjektion: Timeout (keine Antwort), abgeschnittene Rahmen und
+  Exception-Antworten mit einstellbarer Wahrscheinlichkeit.
+- Szenario-Datei (JSON) für Startwerte, Modellparameter und zeitgesteuerte Ereignisse:
+    {"initial": {"ww": 45.0, "at": -2.0},
+     "params": {"ww_rate": 1.0},
+     "events": [{"t": 600, "set": {"at": -8.0}},
+                {"t": 900, "faults": {"timeout": 0.2}},
+                {"t": 1200, "holding": {"10005": 1, "10006": 550}}]}
+
+Aufruf (z.B. Port 5020, Zeitraffer x60):
+    python3 luxtronik_sim.py --port 5020 --speed 60 --latency 0.02 --fault timeout=0.05
+    python3 -c "from luxtronik import LuxtronikModbus; c = LuxtronikModbus('127.0.0.1', 5020); print(c.read_all_sensors())"
+
+Für Benchmarks im selben Prozess: sim, port = start_background().
+"""
+
+import sys
+import json
+import math
+import time
+import random
+import struct
+import asyncio
+import argparse
+import threading
+
+from mbap import MBAP_SIZE, MAX_PDU
+from register_map import REGISTER_MAP, LEGACY_LAYOUT, register_addresses
+
+INPUT_SPACE = (10000, 10400)   # lesbarer Bereich (FC 04), unbekannte Register liefern 0
+HOLDING_SPACE = (10000, 10010)
+WRITABLE = (10000, 10001, 10005, 10006)
+FAULT_KINDS = ('timeout', 'short', 'exception')
+
+# Betriebsart (10002)
+MODE_HEATING = 0
+MODE_WW = 1
+MODE_IDLE = 5
+
+
+class ThermalModel:
+    """Stark vereinfachtes Modell von Warmwasserspeicher und Heizkreis."""
+
+    PARAMS = {
+        'ww_soll': 48.0,        # Warmwasser-Soll ohne SHI
+        'ww_rate': 0.5,         # K/min Aufheizen Warmwasser
+        'ww_loss': 0.02,        # K/min Abkühlung Speicher
+        'rl_rate': 0.3,         # K/min Aufheizen Rücklauf
+        'rl_loss': 0.05,        # K/min Abkühlung Rücklauf (Richtung Raum)
+        'hysteresis': 2.0,      # K
+        'power_el': 1500.0,     # W elektrisch bei laufendem Verdichter
+        'heat_kw': 6.5,         # kW thermisch bei laufendem Verdichter
+        'at_amplitude': 4.0,    # K Tagesgang der Außentemperatur
+    }
+
+    def __init__(self, initial=None, params=None):
+        self.p = dict(self.PARAMS)
+        if params: self.p.update(params)
+        self.ww = 46.0
+        self.rl = 28.0
+        self.at = 5.0           # Mittel der Außentemperatur
+        self.sole_in = 8.0
+        self.compressor = False
+        self.mode = MODE_IDLE
+        self.e_elek = 1000.0    # kWh
+        self.e_heat = 4200.0
+        self.t = 0.0            # Modellzeit in Sekunden
+        if initial: self.set(initial)
+
+    def set(self, values):
+        for k, v in values.items():
+            if k in self.p: self.p[k] = v
+            else: setattr(self, k, v)
+
+    def rl_soll(self):
+        # Heizkurve: 30°C bei 10°C außen, +0.6 K je K kälter
+        return max(20.0, min(50.0, 30.0 + 0.6 * (10.0 - self.at)))
+
+    def outside(self):
+        return self.at + self.p['at_amplitude'] * math.sin(2 * math.pi * (self.t / 86400.0 - 0.375))
+
+    def step(self, dt, holding):
+        """Rechnet das Modell dt Sekunden weiter."""
+        if dt <= 0: return
+        self.t += dt
+        p = self.p
+        minutes = dt / 60.0
+        ww_target = holding[10006] / 10.0 if holding[10005] == 1 else p['ww_soll']
+        rl_target = holding[10001] / 10.0 if holding[10000] == 1 else self.rl_soll()
+        hyst = p['hysteresis']
+        need_ww = self.ww < ww_target - (0.0 if self.mode == MODE_WW else hyst)
+        need_hz = self.rl < rl_target - (0.0 if self.mode == MODE_HEATING else hyst)
+        self.compressor = need_ww or need_hz
+        self.mode = MODE_WW if need_ww else (MODE_HEATING if need_hz else MODE_IDLE)
+        if self.mode == MODE_WW: self.ww = min(ww_target, self.ww + p['ww_rate'] * minutes)
+        if self.mode == MODE_HEATING: self.rl = min(rl_target, self.rl + p['rl_rate'] * minutes)
+        self.ww -= p['ww_loss'] * minutes
+        self.rl -= p['rl_loss'] * minutes * max(0.0, (self.rl - 20.0) / 10.0)
+        if self.compressor:
+            self.e_elek += p['power_el'] / 1000.0 * dt / 3600.0
+            self.e_heat += p['heat_kw'] * dt / 3600.0
+
+    def sensors(self, holding, error=0):
+        """Sensorwerte wie von read_all_sensors() geliefert."""
+        on = self.compressor
+        rl_soll = holding[10001] / 10.0 if holding[10000] == 1 else self.rl_soll()
+        ww_soll = holding[10006] / 10.0 if holding[10005] == 1 else self.p['ww_soll']
+        return {
+            'Verdichter_Ein': on, 'Betriebsart': self.mode, 'Fehler_Nr': error,
+            'Ruecklauf_Ist': self.rl, 'Ruecklauf_Soll': rl_soll, 'Ruecklauf_Extern': 0.0,
+            'Vorlauf_Ist': self.rl + (5.0 if on else 1.0),
+            'Aussentemp': self.outside(), 'Aussentemp_Mittel': self.at,
+            'Sole_Ein': self.sole_in, 'Sole_Aus': self.sole_in - (3.0 if on else 0.0),
+            'Warmwasser_Ist': self.ww, 'Warmwasser_Soll': ww_soll,
+            'Leistung_Heiz_kW': self.p['heat_kw'] if on else 0.0,
+            'Leistung_Verdichter_W': self.p['power_el'] if on else 0.0,
+            'Energie_Elek_kWh': int(self.e_elek), 'Energie_Waerme_kWh': int(self.e_heat),
+        }
+
+
+def encode_sensors(data):
+    """Sensorwerte -> Input-Register {Adresse: u16} (Umkehrung von decode_registers())."""
+    regs = {}
+    for name, addr, kind, scale in REGISTER_MAP:
+        value = data.get(name)
+        if value is None: continue
+        raw = int(round(value / scale)) if kind != 'bit0' else int(bool(value))
+        if kind == 'u32':
+            regs[addr] = (raw >> 16) & 0xFFFF
+            regs[addr + 1] = raw & 0xFFFF
+        else:
+            regs[addr] = raw & 0xFFFF
+    return regs
+
+
+class LuxtronikSimulator:
+    """Modbus-TCP-Server mit Modell, 816-Erkennung und Fehlerinjektion."""
+
+    def __init__(self, scenario=None, speed=1.0, latency=0.0, jitter=0.0, min_gap=0.2,
+                 lockup_after=3, lockup=30.0, faults=None, strict=False, exception_code=4, seed=None):
+        scenario = scenario or {}
+        self.model = ThermalModel(scenario.get('initial'), scenario.get('params'))
+        self.events = sorted(scenario.get('events', []), key=lambda e: e.get('t', 0))
+        self.speed = speed
+        self.latency = latency
+        self.jitter = jitter
+        self.min_gap = min_gap
+        self.lockup_after = lockup_after
+        self.lockup = lockup
+        self.faults = dict(faults or {})
+        self.strict = strict
+        self.exception_code = exception_code
+        self.rng = random.Random(seed)
+        # --strict: nur die belegten Register und die bisherigen Einzelzugriffe sind lesbar
+        self.known_inputs = set(register_addresses())
+        for start, count in LEGACY_LAYOUT: self.known_inputs.update(range(start, start + count))
+        self.holding = {a: 0 for a in range(*HOLDING_SPACE)}
+        self.holding[10001] = 300
+        self.holding[10006] = 480
+        self.error = 0
+        self.started = time.monotonic()
+        self.last_model = self.started
+        self.last_request = None
+        self.violations = []
+        self.locked_until = 0.0
+        self.stats = {"requests": 0, "fc03": 0, "fc04": 0, "fc06": 0, "exceptions": 0,
+                      "gap_violations": 0, "lockups": 0, "dropped_locked": 0,
+                      "faults": {k: 0 for k in FAULT_KINDS}, "min_gap": None, "connections": 0}
+        self.server = None
+
+    # --- Modell und Ereignisse ---
+
+    def _advance(self, now):
+        self.model.step((now - self.last_model) * self.speed, self.holding)
+        self.last_model = now
+        while self.events and self.events[0].get('t', 0) <= self.model.t:
+            ev = self.events.pop(0)
+            if 'set' in ev: self.model.set(ev['set'])
+            if 'faults' in ev: self.faults.update(ev['faults'])
+            if 'holding' in ev:
+                for addr, value in ev['holding'].items(): self.holding[int(addr)] = int(value)
+
+    def input_registers(self):
+        return encode_sensors(self.model.sensors(self.holding, self.error))
+
+    # --- Fehler 816 ---
+
+    def _check_gap(self, now):
+        """True, wenn die WP gerade gesperrt ist (Anfrage wird nicht beantwortet)."""
+        if now < self.locked_until:
+            self.stats["dropped_locked"] += 1
+            return True
+        if self.error == 816 and now >= self.locked_until + self.lockup:
+            # Fehler bleibt nach der Sperre noch eine Weile sichtbar
+            self.error = 0
+        if self.last_request is not None:
+            gap = now - self.last_request
+            if self.stats["min_gap"] is None or gap < self.stats["min_gap"]: self.stats["min_gap"] = round(gap, 4)
+            if gap < self.min_gap:
+                self.stats["gap_violations"] += 1
+                self.violations = [t for t in self.violations if now - t < 10.0] + [now]
+                if len(self.violations) >= self.lockup_after:
+                    self.violations = []
+                    self.locked_until = now + self.lockup
+                    self.error = 816
+                    self.stats["lockups"] += 1
+                    self.last_request = now
+                    return True
+        self.last_request = now
+        return False
+
+    # --- Modbus ---
+
+    def _exception(self, fc, code):
+        self.stats["exceptions"] += 1
+        return struct.pack('>BB', fc | 0x80, code)
+
+    def handle_pdu(self, pdu):
+        """Beantwortet eine Anfrage-PDU (ohne MBAP-Header)."""
+        if len(pdu) != 5: return self._exception(pdu[0] if pdu else 0, 3)
+        fc, addr, value = struct.unpack('>BHH', pdu)
+        if fc in (3, 4):
+            self.stats[f"fc0{fc}"] += 1
+            if not 1 <= value <= 125: return self._exception(fc, 3)
+            lo, hi = INPUT_SPACE if fc == 4 else HOLDING_SPACE
+            if addr < lo or addr + value > hi: return self._exception(fc, 2)
+            if fc == 4:
+                regs = self.input_registers()
+                if self.strict and any(a not in self.known_inputs for a in range(addr, addr + value)):
+                    return self._exception(fc, 2)
+            else:
+                regs = self.holding
+            values = [regs.get(a, 0) for a in range(addr, addr + value)]
+            return struct.pack(f'>BB{value}H', fc, 2 * value, *values)
+        if fc == 6:
+            self.stats["fc06"] += 1
+            if addr not in WRITABLE: return self._exception(fc, 2)
+            if addr in (10000, 10005) and value > 2: return self._exception(fc, 3)
+            self.holding[addr] = value
+            return pdu
+        return self._exception(fc, 1)
+
+    async def _handle(self, reader, writer):
+        self.stats["connections"] += 1
+        try:
+            while True:
+                header = await reader.readexactly(MBAP_SIZE)
+                tid, _, length, unit = struct.unpack('>HHHB', header)
+                if not 2 <= length <= MAX_PDU + 1: break
+                pdu = await reader.readexactly(length - 1)
+                now = time.monotonic()
+                self.stats["requests"] += 1
+                self._advance(now)
+                if self._check_gap(now): continue
+                if self.latency or self.jitter:
+                    await asyncio.sleep(self.latency + self.rng.uniform(0, self.jitter))
+                fault = self._pick_fault()
+                if fault == 'timeout': continue
+                if fault == 'exception':
+                    reply = self._exception(pdu[0], self.exception_code)
+                else:
+                    reply = self.handle_pdu(pdu)
+                frame = struct.pack('>HHHB', tid, 0, len(reply) + 1, unit) + reply
+                if fault == 'short':
+                    writer.write(frame[:max(1, len(frame) // 2)])
+                    await writer.drain()
+                    break
+                writer.write(frame)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _pick_fault(self):
+        for kind in FAULT_KINDS:
+            prob = self.faults.get(kind, 0)
+            if prob and self.rng.random() < prob:
+                self.stats["faults"][kind] += 1
+                return kind
+        return None
+
+    async def start(self, host='127.0.0.1', port=5020):
+        self.server = await asyncio.start_server(self._handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    def snapshot(self):
+        """Statistik und aktueller Modellstand."""
+        data = self.model.sensors(self.holding, self.error)
+        return {"stats": self.stats, "model_time": round(self.model.t, 1), "holding": self.holding,
+                "sensors": {k: (round(v, 2) if isinstance(v, float) else v) for k, v in data.items()}}
+
+
+def start_background(host='127.0.0.1', port=0, **kwargs):
+    """Startet einen Simulator in einem eigenen Thread. Liefert (Simulator, Port)."""
+    sim = LuxtronikSimulator(**kwargs)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    result = {}
+
+    def run():
+        asyncio.set_event_loop(loop)
+        result['port'] = loop.run_until_complete(sim.start(host, port))
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name="luxtronik-sim", daemon=True).start()
+    ready.wait(5)
+    sim.loop = loop
+    return sim, result.get('port')
+
+
+def _parse_faults(ap, items):
+    faults = {}
+    for item in items or []:
+        kind, _, prob = item.partition('=')
+        if kind not in FAULT_KINDS: ap.error(f"Unbekannter Fehler '{kind}' ({', '.join(FAULT_KINDS)})")
+        faults[kind] = float(prob or 1.0)
+    return faults
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Luxtronik Modbus-TCP-Simulator")
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=5020)
+    ap.add_argument('--scenario', help="JSON-Datei mit initial/params/events")
+    ap.add_argument('--speed', type=float, default=1.0, help="Zeitraffer-Faktor des Modells")
+    ap.add_argument('--latency', type=float, default=0.0, help="Antwortzeit pro Anfrage in s")
+    ap.add_argument('--jitter', type=float, default=0.0, help="zusätzliche zufällige Antwortzeit in s")
+    ap.add_argument('--min-gap', type=float, default=0.2, help="Mindestabstand zwischen Anfragen (Fehler 816)")
+    ap.add_argument('--lockup-after', type=int, default=3, help="Verstöße innerhalb 10s bis zur Sperre")
+    ap.add_argument('--lockup', type=float, default=30.0, help="Dauer der Sperre in s")
+    ap.add_argument('--fault', action='append', help="timeout=P, short=P oder exception=P (mehrfach möglich)")
+    ap.add_argument('--exception-code', type=int, default=4)
+    ap.add_argument('--strict', action='store_true', help="Blöcke über unbelegte Register mit Exception 2 ablehnen")
+    ap.add_argument('--seed', type=int)
+    ap.add_argument('--stats-interval', type=float, default=0, help="Statistik alle N Sekunden ausgeben")
+    args = ap.parse_args()
+
+    scenario = None
+    if args.scenario:
+        with open(args.scenario) as f: scenario = json.load(f)
+    sim = LuxtronikSimulator(scenario, speed=args.speed, latency=args.latency, jitter=args.jitter,
+                             min_gap=args.min_gap, lockup_after=args.lockup_after, lockup=args.lockup,
+                             faults=_parse_faults(ap, args.fault), strict=args.strict,
+                             exception_code=args.exception_code, seed=args.seed)
+
+    async def run():
+        port = await sim.start(args.host, args.port)
+        print(f"Luxtronik-Simulator läuft auf {args.host}:{port}", flush=True)
+        while True:
+            await asyncio.sleep(args.stats_interval or 3600)
+            if args.stats_interval: print(json.dumps(sim.snapshot()), flush=True)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(sim.snapshot(), indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""
+Typisierte Konfiguration für den Energy Manager.
+
+Die e3dc.config.txt wird nur bei einer Dateiänderung gelesen und in ein
+unveränderliches EnergyManagerConfig-Objekt übersetzt: alle Zahlen sind
+bereits geparst, geprüft und mit Defaults belegt. Die Regel-Schleife greift
+danach nur noch auf Attribute zu.
+
+Änderungen werden per inotify erkannt (ohne zusätzliche Abhängigkeit über
+ctypes). Ist inotify nicht verfügbar, wird auf mtime/Größe zurückgefallen.
+"""
+
+import os
+import struct
+import ctypes
+import ctypes.util
+from dataclasses import dataclass, fields
+
+from e3dc_config import parse_config_file
+
+_TRUE = ('true', '1')
+_FALSE = ('false', '0')
+
+
+def _flag(value):
+    # Wie früher get_cfg_int(...) == 1: nur 1 (bzw. true) schaltet ein; 2, yes, on o.ä. -> Warnung und Default
+    v = value.strip().lower()
+    if v in _TRUE: return 1
+    if v in _FALSE: return 0
+    try:
+        f = float(v)
+    except ValueError:
+        f = None
+    if f in (0.0, 1.0): return int(f)
+    raise ValueError("erwartet 0 oder 1")
+
+
+def _int(value):
+    return int(float(value))
+
+
+def _time_hm(value):
+    h, m = map(int, value.split(':'))
+    if not (0 <= h <= 23 and 0 <= m <= 59): raise ValueError(value)
+    return (h, m)
+
+
+# Feld -> (Config-Key, Parser, Minimum, Maximum). Default steht in der Dataclass.
+_SPEC = {
+    'luxtronik':                 ('luxtronik', _flag, None, None),
+    'luxtronik_ip':              ('luxtronik_ip', str, None, None),
+    'luxtronik_async':           ('luxtronik_async', _flag, None, None),
+    'auto_mode':                 ('auto_mode', _flag, None, None),
+    'auto_update_enable':        ('auto_update_enable', _flag, None, None),
+    'auto_update_time':          ('auto_update_time', _time_hm, None, None),
+    'grid_start_limit':          ('grid_start_limit', float, -50000, 50000),
+    'stop_delay_minutes':        ('stop_delay_minutes', float, 0, 1440),
+    'min_soc':                   ('min_soc', float, 0, 100),
+    'at_limit':                  ('at_limit', float, -40, 40),
+    'wws':                       ('wws', float, 10, 80),
+    'www':                       ('www', float, 10, 80),
+    'hz':                        ('hz', float, 10, 70),
+    'price_boost_enable':        ('price_boost_enable', _flag, None, None),
+    'price_limit':               ('price_limit', float, -100, 200),
+    'price_min_duration':        ('price_min_duration', float, 0, 1440),
+    'price_max_daily':           ('price_max_daily', float, 0, 1440),
+    'price_hard_limit':          ('price_hard_limit', float, -1000, 200),
+    'wq_min_temp':               ('wq_min_temp', float, -30, 30),
+    'rl_source':                 ('rl_source', str, None, None),
+    'manual_boost_min_soc':      ('manual_boost_min_soc', float, 0, 100),
+    'manual_boost_max_duration': ('manual_boost_max_duration', float, 0, 1440),
+    'mb_enable':                 ('morning_boost_enable', _flag, None, None),
+    'mb_prio':                   ('morning_boost_prio', str, None, None),
+    'mb_wb_power':               ('morning_boost_wb_power', float, 0, 50),
+    'mb_min_hours':              ('morning_boost_min_hours', float, 0, 48),
+    'mb_min_pv_pct':             ('morning_boost_min_pv_pct', float, 0, 10000),
+    'mb_target_soc':             ('morning_boost_target_soc', float, 0, 100),
+    'mb_deadline':               ('morning_boost_deadline', _int, 0, 23),
+    'si_enable':                 ('super_intelligence_enable', _flag, None, None),
+    'si_deadline':               ('super_intelligence_deadline', _int, 0, 23),
+    'telegram_token':            ('telegram_token', str, None, None),
+    'telegram_chat_id':          ('telegram_chat_id', str, None, None),
+    'pv_pause_enable':           ('pv_pause_enable', _flag, None, None),
+    'pv_pause_soc':              ('pv_pause_soc', float, 0, 100),
+    'pv_pause_watt':             ('pv_pause_watt', float, 0, 100000),
+    'pv_pause_timeout_minutes':  ('pv_pause_timeout_minutes', float, 0, 1440),
+    'pv_pause_min_at':           ('pv_pause_min_at', float, -40, 40),
+    'speichergroesse':           ('speichergroesse', float, 0, 1000),
+    'wpmax':                     ('wpmax', float, 0, 50),
+    'wbmode':                    ('wbmode', str, None, None),
+    'wbminsoc':                  ('wbminsoc', str, None, None),
+    'awmwst':                    ('awmwst', float, 0, 100),
+    'awnebenkosten':             ('awnebenkosten', float, -100, 100),
+    'wurzelzaehler':             ('wurzelzaehler', _int, 0, 9),
+    'archive_gzip':              ('luxtronik_archive_gzip', _flag, None, None),
+}
+
+# Werte, die beim Protokollieren von Änderungen nicht im Klartext erscheinen
+_SECRET = ('telegram_token',)
+
+
+@dataclass(frozen=True)
+class EnergyManagerConfig:
+    """Unveränderlicher, vorab geparster Stand der Energy-Manager-Parameter."""
+    luxtronik: int = 0
+    luxtronik_ip: str = ''
+    luxtronik_async: int = 0
+    auto_mode: int = 1
+    auto_update_enable: int = 0
+    auto_update_time: tuple = (23, 0)
+    grid_start_limit: float = -3500.0
+    stop_delay_minutes: float = 10.0
+    min_soc: float = 80.0
+    at_limit: float = 10.0
+    wws: float = 50.0
+    www: float = 48.0
+    hz: float = 32.0
+    price_boost_enable: int = 0
+    price_limit: float = 20.0
+    price_min_duration: float = 60.0
+    price_max_daily: float = 180.0
+    price_hard_limit: float = -99.0
+    wq_min_temp: float = 1.0
+    rl_source: str = 'internal'
+    manual_boost_min_soc: float = 25.0
+    manual_boost_max_duration: float = 180.0
+    mb_enable: int = 0
+    mb_prio: str = 'wallbox'
+    mb_wb_power: float = 7.0
+    mb_min_hours: float = 3.0
+    mb_min_pv_pct: float = 50.0
+    mb_target_soc: float = 20.0
+    mb_deadline: int = 8
+    si_enable: int = 0
+    si_deadline: int = 8
+    telegram_token: str = ''
+    telegram_chat_id: str = ''
+    pv_pause_enable: int = 0
+    pv_pause_soc: float = 80.0
+    pv_pause_watt: float = 3000.0
+    pv_pause_timeout_minutes: float = 120.0
+    pv_pause_min_at: float = 0.0
+    speichergroesse: float = 10.0
+    wpmax: float = 4.0
+    wbmode: str = None
+    wbminsoc: str = None
+    awmwst: float = 19.0
+    awnebenkosten: float = 0.0
+    wurzelzaehler: int = 0
+    archive_gzip: int = 0
+
+    @classmethod
+    def from_dict(cls, raw, warn=None):
+        """Baut die Konfiguration aus Rohwerten. Ungültige Werte fallen (mit Warnung) auf den Default zurück."""
+        values = {}
+        for f in fields(cls):
+            key, parser, lo, hi = _SPEC[f.name]
+            value = raw.get(key)
+            if value is None or (value == '' and parser is not str): continue
+            try:
+                parsed = parser(value)
+                if lo is not None and not (lo <= parsed <= hi):
+                    raise ValueError(f"außerhalb {lo}..{hi}")
+            except (ValueError, TypeError) as e:
+                if warn: warn(f"Ungültiger Config-Wert {key} = '{value}' ({e}), nutze Default {f.default}.")
+                continue
+            values[f.name] = parsed
+        return cls(**values)
+
+    @classmethod
+    def load(cls, path, warn=None):
+        return cls.from_dict(parse_config_file(path), warn)
+
+    def diff(self, other):
+        """Liste (Feld, alt, neu) aller Parameter, die sich gegenüber 'other' unterscheiden."""
+        changes = []
+        for f in fields(self):
+            old, new = getattr(other, f.name), getattr(self, f.name)
+            if old != new: changes.append((f.name, old, new))
+        return changes
+
+
+def format_changes(changes):
+    """Kurzbeschreibung einer diff()-Liste für das Log."""
+    parts = []
+    for name, old, new in changes:
+        if name in _SECRET: parts.append(f"{name} (geändert)")
+        else: parts.append(f"{name}: {old} -> {new}")
+    return ", ".join(parts)
+
+
+class ConfigWatcher:
+    """
+    Erkennt Änderungen an einer Datei.
+
+    Bevorzugt inotify auf das Verzeichnis (erkennt auch Ersetzen per rename);
+    changed() ist dann ein einzelner nicht-blockierender read(). Ohne inotify
+    wird mtime und Größe verglichen.
+    """
+
+    # inotify Event-Masken (linux/inotify.h)
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    _EVENT = struct.Struct('iIII')
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.fd = None
+        self.mode = "mtime"
+        self._stamp = self._stat()
+        self._init_inotify()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def _init_inotify(self):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0: return
+            mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE
+            directory = os.path.dirname(os.path.abspath(self.path))
+            if libc.inotify_add_watch(fd, directory.encode(), mask) < 0:
+                os.close(fd)
+                return
+            self.fd = fd
+            self.mode = "inotify"
+        except (OSError, AttributeError):
+            self.fd = None
+
+    def _drain(self):
+        hit = False
+        while True:
+            try:
+                buf = os.read(self.fd, 4096)
+            except BlockingIOError:
+                return hit
+            if not buf: return hit
+            pos = 0
+            while pos + self._EVENT.size <= len(buf):
+                _wd, _mask, _cookie, length = self._EVENT.unpack_from(buf, pos)
+                pos += self._EVENT.size
+                name = buf[pos:pos + length].rstrip(b'\0').decode('utf-8', 'replace')
+                pos += length
+                if name == self.name: hit = True
+
+    def changed(self):
+        """True, wenn sich die Datei seit dem letzten Aufruf geändert hat."""
+        if self.fd is not None:
+            try:
+                if not self._drain(): return False
+            except OSError:
+                # inotify kaputt -> dauerhaft auf mtime umschalten
+                self.close()
+        stamp = self._stat()
+        if stamp == self._stamp: return False
+        self._stamp = stamp
+        return True
+
+    def close(self):
+        if self.fd is not None:
+            try: os.close(self.fd)
+            except OSError: pass
+        self.fd = None
+        self.mode = "mtime"
@@ -0,0 +1,111 @@
+"""
+Modbus-TCP-Rahmen (MBAP-Header + PDU) für die Luxtronik: Aufbau, Empfang und Prüfung.
+
+Jede Antwort wird vollständig geprüft (Protokoll-ID, Längenfeld, Transaktions-ID,
+Unit, Funktionscode, Byte-Anzahl bzw. Echo beim Schreiben). Exception-Antworten
+(Funktionscode | 0x80) und fehlerhafte Rahmen werden sofort als eigene
+Exception-Typen gemeldet, statt auf Bytes zu warten, die nie kommen
+(früher: 3s Socket-Timeout).
+
+Der Empfang läuft per recv_into in einen einmal angelegten Puffer.
+"""
+
+import struct
+
+MBAP = struct.Struct('>HHHB')     # Transaktions-ID, Protokoll-ID, Länge, Unit
+REQUEST = struct.Struct('>HHHBBHH')
+MBAP_SIZE = MBAP.size             # 7
+MAX_PDU = 253
+MAX_ADU = MBAP_SIZE + MAX_PDU
+
+EXCEPTION_NAMES = {
+    1: "ungültige Funktion",
+    2: "ungültige Registeradresse",
+    3: "ungültiger Wert",
+    4: "Gerätefehler",
+    5: "Bestätigung (in Arbeit)",
+    6: "Gerät beschäftigt",
+    10: "Gateway-Pfad nicht verfügbar",
+    11: "Gateway: Zielgerät antwortet nicht",
+}
+
+
+class ModbusError(Exception):
+    """Basis aller Modbus-Fehler."""
+
+
+class ModbusConnectionError(ModbusError):
+    """Keine Verbindung, Verbindung abgebrochen oder keine Antwort (Timeout)."""
+
+
+class ModbusFrameError(ModbusError):
+    """Fehlerhafter oder unpassender Antwortrahmen. Der Datenstrom ist danach nicht mehr synchron."""
+
+
+class ModbusExceptionResponse(ModbusError):
+    """Die WP hat die Anfrage mit einer Modbus-Exception abgelehnt. Die Verbindung bleibt nutzbar."""
+
+    def __init__(self, function, code):
+        self.function = function
+        self.code = code
+        super().__init__(f"Modbus-Exception {code} ({EXCEPTION_NAMES.get(code, 'unbekannt')}) auf FC {function}")
+
+
+def build_request(tid, unit_id, func_code, addr, val_or_count):
+    """MBAP-Header + PDU einer Anfrage (FC 03/04: Anzahl, FC 06: Wert)."""
+    return REQUEST.pack(tid, 0, 6, unit_id, func_code, addr, val_or_count)
+
+
+def decode_header(header):
+    """Prüft einen MBAP-Header. Liefert (Transaktions-ID, PDU-Länge, Unit)."""
+    tid, protocol, length, unit = MBAP.unpack_from(header)
+    if protocol != 0:
+        raise ModbusFrameError(f"Protokoll-ID {protocol} statt 0")
+    if not 2 <= length <= MAX_PDU + 1:
+        raise ModbusFrameError(f"Ungültiges Längenfeld {length}")
+    return tid, length - 1, unit
+
+
+def decode_pdu(func_code, addr, val_or_count, pdu):
+    """
+    Prüft eine Antwort-PDU gegen die Anfrage. Liefert die Register (FC 03/04)
+    bzw. True (FC 06). Exception-Antworten lösen ModbusExceptionResponse aus.
+    """
+    fc = pdu[0]
+    if fc == func_code | 0x80:
+        if len(pdu) != 2: raise ModbusFrameError(f"Exception-Antwort mit {len(pdu)} Byte")
+        raise ModbusExceptionResponse(func_code, pdu[1])
+    if fc != func_code:
+        raise ModbusFrameError(f"Funktionscode {fc} statt {func_code}")
+    if func_code == 6:
+        if len(pdu) != 5 or struct.unpack_from('>HH', pdu, 1) != (addr, val_or_count):
+            raise ModbusFrameError("Schreib-Echo passt nicht zur Anfrage")
+        return True
+    byte_count = pdu[1] if len(pdu) > 1 else -1
+    if byte_count != 2 * val_or_count or len(pdu) != 2 + byte_count:
+        raise ModbusFrameError(f"{byte_count} Datenbytes statt {2 * val_or_count}")
+    return struct.unpack_from(f'>{val_or_count}H', pdu, 2)
+
+
+class FrameReader:
+    """Liest Antwortrahmen von einem blockierenden Socket in einen wiederverwendeten Puffer."""
+
+    def __init__(self):
+        self.buf = bytearray(MAX_ADU)
+        self.view = memoryview(self.buf)
+
+    def _fill(self, sock, start, end):
+        while start < end:
+            n = sock.recv_into(self.view[start:end])
+            if not n: raise ModbusConnectionError("Verbindung von der WP geschlossen")
+            start += n
+
+    def read(self, sock):
+        """
+        Liest einen vollständigen Rahmen. Liefert (Transaktions-ID, Unit, PDU als memoryview).
+        Die PDU gilt nur bis zum nächsten read().
+        """
+        self._fill(sock, 0, MBAP_SIZE)
+        tid, pdu_len, unit = decode_header(self.buf)
+        self._fill(sock, MBAP_SIZE, MBAP_SIZE + pdu_len)
+        return tid, unit, self.view[MBAP_SIZE:MBAP_SIZE + pdu_len]
@@ -0,0 +1,125 @@
+"""
+Laufzeitmessung der einzelnen Phasen des Energy Managers.
+
+Jede Phase (Modbus-Verbindung, einzelne Register, E3DC-Abfrage, Regelblöcke,
+Dateien, Telegram) sammelt ihre letzten Laufzeiten in einem begrenzten
+Ringpuffer. Daraus werden p50/p95/max berechnet und als JSON sowie im
+Prometheus-Textformat in die RAM-Disk geschrieben.
+"""
+
+import os
+import json
+import math
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+METRICS_PREFIX = "energy_manager"
+
+
+def _percentile(sorted_values, pct):
+    # Nearest-Rank
+    if not sorted_values: return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+class PhaseStats:
+    """Rollende Laufzeiten einer Phase (die letzten 'window' Messungen)."""
+
+    def __init__(self, window=256):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+
+    def as_dict(self):
+        values = sorted(self.samples)
+        return {
+            "count": self.count,
+            "sum": round(self.total, 4),
+            "last": round(self.last, 4),
+            "p50": round(_percentile(values, 50), 4),
+            "p95": round(_percentile(values, 95), 4),
+            "max": round(values[-1], 4) if values else 0.0,
+        }
+
+
+class Lap:
+    """Misst aufeinanderfolgende Abschnitte: mark() verbucht die Zeit seit dem letzten mark()."""
+
+    def __init__(self, metrics, prefix):
+        self.metrics = metrics
+        self.prefix = prefix
+        self.t = time.monotonic()
+
+    def mark(self, name):
+        now = time.monotonic()
+        self.metrics.observe(f"{self.prefix}_{name}", now - self.t)
+        self.t = now
+
+
+class Metrics:
+    """Thread-sichere Sammlung aller Phasen."""
+
+    def __init__(self, window=256):
+        self.window = window
+        self.phases = {}
+        self.lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self.lock:
+            st = self.phases.get(name)
+            if st is None:
+                st = self.phases[name] = PhaseStats(self.window)
+            st.add(seconds)
+
+    @contextmanager
+    def span(self, name):
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - t0)
+
+    def lap(self, prefix):
+        return Lap(self, prefix)
+
+    def snapshot(self):
+        with self.lock:
+            return {name: st.as_dict() for name, st in sorted(self.phases.items())}
+
+    def render_prometheus(self, snap=None):
+        if snap is None: snap = self.snapshot()
+        name = f"{METRICS_PREFIX}_phase_seconds"
+        lines = [f"# HELP {name} Laufzeit der Phasen des Energy Managers in Sekunden.",
+                 f"# TYPE {name} summary"]
+        for phase, st in snap.items():
+            lines.append(f'{name}{{phase="{phase}",quantile="0.5"}} {st["p50"]}')
+            lines.append(f'{name}{{phase="{phase}",quantile="0.95"}} {st["p95"]}')
+            lines.append(f'{name}_sum{{phase="{phase}"}} {st["sum"]}')
+            lines.append(f'{name}_count{{phase="{phase}"}} {st["count"]}')
+        lines.append(f"# HELP {name}_max Maximale Laufzeit im rollenden Fenster.")
+        lines.append(f"# TYPE {name}_max gauge")
+        for phase, st in snap.items():
+            lines.append(f'{name}_max{{phase="{phase}"}} {st["max"]}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, json_path, prom_path=None):
+        """Schreibt die Metriken atomar als JSON (und optional im Prometheus-Format)."""
+        snap = self.snapshot()
+        _atomic_write(json_path, json.dumps({"ts": time.time(), "phases": snap}))
+        if prom_path: _atomic_write(prom_path, self.render_prometheus(snap))
+
+
+def _atomic_write(path, text):
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f: f.write(text)
+    os.replace(tmp, path)
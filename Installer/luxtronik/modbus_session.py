@@ -0,0 +1,168 @@
+"""
+Dauerhafte Modbus-TCP-Verbindung zur Luxtronik mit Taktung über einen Token-Bucket.
+
+- Die TCP-Verbindung bleibt zwischen den Abfragen offen. Nach idle_timeout
+  Sekunden ohne Verkehr wird sie vor dem nächsten Zugriff neu aufgebaut, nach
+  einem Fehler sofort. Scheitert ein Zugriff auf einer wiederverwendeten
+  Verbindung (z.B. von der WP geschlossen), wird einmal neu verbunden.
+- Jede Anfrage bekommt eine fortlaufende Transaktions-ID. Antworten mit einer
+  fremden ID (verspätete Antwort einer früheren Anfrage) werden verworfen.
+  Rahmen werden mit mbap.py geprüft, Fehler kommen als ModbusError-Typen.
+- Der schwache Prozessor der Luxtronik verträgt keine dichten Anfragen
+  (Fehler 816). Statt vor jeder Anfrage pauschal 0,2s zu schlafen, wartet der
+  Token-Bucket nur so lange, bis der Mindestabstand zur letzten Antwort erreicht ist.
+"""
+
+import socket
+import time
+import threading
+
+from mbap import (FrameReader, build_request, decode_pdu, ModbusConnectionError,
+                  ModbusFrameError, ModbusExceptionResponse)
+
+DEFAULT_MIN_GAP = 0.2
+DEFAULT_IDLE_TIMEOUT = 60.0
+DEFAULT_TIMEOUT = 3.0
+MAX_STALE_FRAMES = 4
+
+
+class TokenBucket:
+    """Token-Bucket: 'rate' Tokens pro Sekunde, höchstens 'capacity' auf Vorrat."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Nimmt ein Token und liefert die Wartezeit in Sekunden, bis es gültig ist."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def drain(self):
+        """Leert den Vorrat: das nächste Token gibt es erst nach 1/rate Sekunden ab jetzt."""
+        with self.lock:
+            self.tokens = 0
+            self.stamp = time.monotonic()
+
+    def acquire(self):
+        """Wartet auf ein Token. Liefert die tatsächlich gewartete Zeit."""
+        wait = self.reserve()
+        if wait > 0: time.sleep(wait)
+        return wait
+
+
+class ModbusSession:
+    """Eine offen gehaltene Modbus-TCP-Verbindung (FC 03/04/06)."""
+
+    def __init__(self, host, port=502, unit_id=1, min_gap=DEFAULT_MIN_GAP,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, timeout=DEFAULT_TIMEOUT, on_timing=None):
+        self.host = host
+        self.port = port
+        self.unit_id = unit_id
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.bucket = TokenBucket(1.0 / min_gap) if min_gap > 0 else None
+        # Callback (Name, Startzeit monotonic) für Laufzeitmessungen
+        self.on_timing = on_timing
+        self.sock = None
+        self.last_used = 0.0
+        self.tid = 0
+        self.frames = FrameReader()
+        self.stats = {"connects": 0, "reconnects": 0, "requests": 0, "errors": 0, "timeouts": 0, "frame_errors": 0,
+                      "exceptions": 0, "stale_frames": 0, "paced_seconds": 0.0}
+
+    # --- Verbindung ---
+
+    @property
+    def connected(self):
+        return self.sock is not None
+
+    def connect(self):
+        """Stellt sicher, dass eine Verbindung besteht (alte nach idle_timeout verwerfen)."""
+        if self.sock and time.monotonic() - self.last_used > self.idle_timeout:
+            self.close()
+        if self.sock: return True
+        t0 = time.monotonic()
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.sock = sock
+            self.last_used = time.monotonic()
+            self.stats["connects"] += 1
+            return True
+        except OSError:
+            return False
+        finally:
+            if self.on_timing: self.on_timing("modbus_connect", t0)
+
+    def close(self):
+        if self.sock:
+            try: self.sock.close()
+            except OSError: pass
+            self.sock = None
+
+    # --- Anfragen ---
+
+    def _next_tid(self):
+        self.tid = (self.tid + 1) & 0xFFFF
+        return self.tid
+
+    def _exchange(self, func_code, addr, val_or_count):
+        tid = self._next_tid()
+        self.sock.sendall(build_request(tid, self.unit_id, func_code, addr, val_or_count))
+        for _ in range(MAX_STALE_FRAMES):
+            r_tid, unit, pdu = self.frames.read(self.sock)
+            if r_tid != tid:
+                self.stats["stale_frames"] += 1
+                continue
+            if unit != self.unit_id: raise ModbusFrameError(f"Unit {unit} statt {self.unit_id}")
+            return decode_pdu(func_code, addr, val_or_count, pdu)
+        raise ModbusFrameError("Keine Antwort zur Transaktions-ID")
+
+    def request(self, func_code, addr, val_or_count):
+        """
+        Sendet eine Anfrage und liefert die Register (FC 03/04) bzw. True (FC 06).
+
+        Fehler kommen als ModbusError:
+        - ModbusExceptionResponse: WP lehnt ab, die Verbindung bleibt bestehen.
+        - ModbusFrameError: fehlerhafte Antwort, die Verbindung wird geschlossen.
+        - ModbusConnectionError: keine Verbindung/Antwort. Auf einer wiederverwendeten
+          Verbindung wird vorher einmal neu verbunden und wiederholt.
+        """
+        for _ in range(2):
+            reused = self.sock is not None and time.monotonic() - self.last_used <= self.idle_timeout
+            if not self.connect(): raise ModbusConnectionError(f"Keine Verbindung zu {self.host}:{self.port}")
+            if self.bucket: self.stats["paced_seconds"] += self.bucket.acquire()
+            self.stats["requests"] += 1
+            t0 = time.monotonic()
+            try:
+                try:
+                    result = self._exchange(func_code, addr, val_or_count)
+                finally:
+                    # Mindestabstand ab Ende des Zugriffs (die WP verarbeitet die Anfrage noch)
+                    if self.bucket: self.bucket.drain()
+                    # Reine Antwortzeit der WP (ohne Taktung und Verbindungsaufbau)
+                    if self.on_timing: self.on_timing("modbus_rtt", t0)
+                self.last_used = time.monotonic()
+                return result
+            except ModbusExceptionResponse:
+                self.last_used = time.monotonic()
+                self.stats["exceptions"] += 1
+                raise
+            except ModbusFrameError:
+                self.stats["frame_errors"] += 1
+                self.close()
+                raise
+            except (OSError, ModbusConnectionError) as e:
+                self.stats["errors"] += 1
+                if isinstance(e, socket.timeout): self.stats["timeouts"] += 1
+                self.close()
+                if not reused: raise ModbusConnectionError(str(e) or type(e).__name__) from e
+                self.stats["reconnects"] += 1
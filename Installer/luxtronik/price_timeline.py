@@ -0,0 +1,118 @@
+"""
+Preis-Zeitleiste für die Preis-Steuerung des Energy Managers.
+
+Die Preisliste aus get_live_json.php (prices, price_start_hour in Stunden GMT,
+price_interval 1.0 oder 0.25) wird einmal pro neuem Preisvektor auf absolute
+UTC-Zeitstempel verankert. Günstige/teure Blöcke werden je Limit und
+Mindestdauer einmal berechnet; Abfragen ("Aktion zum Zeitpunkt t", "nächster
+günstiger Block") laufen per Binärsuche.
+"""
+
+import time
+import math
+import bisect
+
+
+def anchor_start_ts(start_hour, now=None):
+    """
+    Startzeit der Preisliste als Unix-Zeit.
+
+    price_start_hour enthält nur die Stunde (GMT). Der Tag wird so gewählt, dass
+    der Start höchstens 12h in der Zukunft und höchstens 36h in der Vergangenheit liegt.
+    """
+    if now is None: now = time.time()
+    midnight = now - (now % 86400)
+    start_ts = midnight + float(start_hour) * 3600
+    diff_h = (now - start_ts) / 3600.0
+    if diff_h < -12: start_ts -= 86400
+    if diff_h > 36: start_ts += 86400
+    return start_ts
+
+
+class PriceTimeline:
+    """Unveränderlicher Preisvektor mit Blöcken je (Limit, Mindestdauer)."""
+
+    def __init__(self, prices, start_hour, interval, now=None):
+        self.prices = list(prices)
+        self.start_hour = start_hour
+        self.interval = float(interval) if interval else 1.0
+        self.slot_s = self.interval * 3600
+        self.start_ts = anchor_start_ts(start_hour, now)
+        self.end_ts = self.start_ts + len(self.prices) * self.slot_s
+        self._blocks = {}
+
+    @classmethod
+    def build(cls, prices, start_hour, interval, previous=None, now=None):
+        """
+        Liefert eine Zeitleiste für den Snapshot. Die vorherige wird wiederverwendet,
+        solange sich prices und price_start_hour (bzw. das Intervall) nicht ändern.
+        """
+        if not prices or start_hour is None: return None
+        if previous is not None and previous.start_hour == start_hour \
+                and previous.interval == (float(interval) if interval else 1.0) \
+                and previous.prices == prices:
+            return previous
+        return cls(prices, start_hour, interval, now)
+
+    def slot_index(self, t=None):
+        """Position (Slots, als float) relativ zum Start der Preisliste."""
+        if t is None: t = time.time()
+        return (t - self.start_ts) / self.slot_s
+
+    def _min_slots(self, min_duration_min):
+        return int(math.ceil(min_duration_min / 60.0 / self.interval))
+
+    def _index(self, limit, min_duration_min, cheap=True):
+        key = (limit, self._min_slots(min_duration_min), cheap)
+        cached = self._blocks.get(key)
+        if cached is not None: return cached
+
+        min_slots = key[1]
+        blocks = []
+        start = None
+        for i, p in enumerate(self.prices):
+            if (p <= limit) == cheap:
+                if start is None: start = i
+            else:
+                if start is not None and i - start >= min_slots: blocks.append((start, i - 1))
+                start = None
+        if start is not None and len(self.prices) - start >= min_slots:
+            blocks.append((start, len(self.prices) - 1))
+
+        # Das effektive Limit schwankt mit dem COP -> Cache klein halten
+        if len(self._blocks) >= 8: self._blocks.clear()
+        self._blocks[key] = (blocks, [b[0] for b in blocks])
+        return self._blocks[key]
+
+    def blocks(self, limit, min_duration_min, cheap=True):
+        """
+        Zusammenhängende Blöcke (Start-Index, End-Index inkl.) mit Preis <= limit
+        (cheap=True) bzw. > limit, die mindestens min_duration_min lang sind.
+        """
+        return self._index(limit, min_duration_min, cheap)[0]
+
+    def action_at(self, limit, min_duration_min, t=None):
+        """
+        BOOST innerhalb eines günstigen Blocks, PAUSE in der Stunde davor, sonst NONE.
+        """
+        blocks, starts = self._index(limit, min_duration_min)
+        if not blocks: return "NONE"
+        idx = self.slot_index(t)
+
+        pos = bisect.bisect_right(starts, idx) - 1
+        if pos >= 0 and idx < blocks[pos][1] + 1: return "BOOST"
+        if pos + 1 < len(blocks):
+            start_idx = blocks[pos + 1][0]
+            if start_idx - 1.0 / self.interval <= idx < start_idx: return "PAUSE"
+        return "NONE"
+
+    def next_block(self, limit, min_duration_min, t=None, cheap=True):
+        """Nächster (oder laufender) Block als (start_ts, end_ts), None wenn keiner mehr folgt."""
+        blocks, starts = self._index(limit, min_duration_min, cheap)
+        if not blocks: return None
+        idx = self.slot_index(t)
+        pos = bisect.bisect_right(starts, idx) - 1
+        if pos < 0 or idx >= blocks[pos][1] + 1: pos += 1
+        if pos >= len(blocks): return None
+        s, e = blocks[pos]
+        return (self.start_ts + s * self.slot_s, self.start_ts + (e + 1) * self.slot_s)
@@ -0,0 +1,96 @@
+"""
+Register-Cache mit eigenem Aktualisierungsintervall pro Registergruppe.
+
+Temperaturen, Leistung und Verdichter-Status werden bei jeder Abfrage gelesen,
+Betriebsart, Fehlernummer und Energiezähler nur alle paar Minuten (siehe
+REFRESH_GROUPS in register_map.py). Der Leseplan enthält nur die fälligen
+Gruppen, die übrigen Werte kommen ohne Buszugriff aus dem Cache.
+
+- Jede Gruppe hat einen Zeitstempel des letzten erfolgreichen Lesens (ages()).
+- Werte einer langsamen Gruppe gelten bis zum dreifachen Intervall, danach
+  fehlen sie im Ergebnis (wie bei einem fehlgeschlagenen Lesen).
+- invalidate() erzwingt das Lesen beim nächsten Scan. Schaltet der Verdichter
+  um, werden Betriebsart und Fehlernummer automatisch neu gelesen.
+"""
+
+import time
+
+from register_map import REGISTER_MAP, REFRESH_GROUPS, register_addresses, plan_reads
+
+STALE_FACTOR = 3
+# Bei einem Wechsel des Verdichter-Status (Register 10000, Bit 0) sofort neu lesen
+FORCE_ON_COMPRESSOR_CHANGE = ('mode', 'errors')
+
+
+class RegisterCache:
+    """Zwischenspeicher der Rohwerte {Adresse: Wert} mit Fälligkeit pro Gruppe."""
+
+    def __init__(self, groups=REFRESH_GROUPS, register_map=REGISTER_MAP):
+        self.groups = {name: (interval, tuple(register_addresses(register_map, names)))
+                       for name, (interval, names) in groups.items()}
+        self.values = {}
+        self.read_at = {}    # Gruppe -> time.monotonic() des letzten erfolgreichen Lesens
+        self.forced = set()
+        self.stats = {"scans": 0, "group_reads": 0, "group_hits": 0}
+
+    def due(self, now=None):
+        """Gruppen, die beim nächsten Scan vom Bus gelesen werden müssen."""
+        if now is None: now = time.monotonic()
+        result = []
+        for name, (interval, _) in self.groups.items():
+            t = self.read_at.get(name)
+            if t is None or interval <= 0 or name in self.forced or now - t >= interval:
+                result.append(name)
+        return result
+
+    def plan(self, max_gap, max_len, now=None):
+        """Leseplan (Start, Anzahl) nur für die fälligen Gruppen."""
+        addrs = set()
+        for name in self.due(now): addrs.update(self.groups[name][1])
+        return plan_reads(addrs, max_gap, max_len)
+
+    def invalidate(self, *groups):
+        """Erzwingt das Lesen der Gruppen (ohne Angabe: aller Gruppen) beim nächsten Scan."""
+        self.forced.update(groups or self.groups)
+
+    def merge(self, values, now=None):
+        """
+        Übernimmt die gelesenen Register und liefert alle gültigen Rohwerte: frisch
+        gelesene Gruppen und langsame Gruppen, deren Wert noch nicht veraltet ist.
+        """
+        if now is None: now = time.monotonic()
+        old = self.values.get(10000)
+        if old is not None and 10000 in values and (old ^ values[10000]) & 0x01:
+            self.forced.update(g for g in FORCE_ON_COMPRESSOR_CHANGE if g in self.groups)
+        self.stats["scans"] += 1
+        result = {}
+        for name, (interval, addrs) in self.groups.items():
+            fresh = [a for a in addrs if a in values]
+            if len(fresh) == len(addrs):
+                self.read_at[name] = now
+                self.forced.discard(name)
+                self.stats["group_reads"] += 1
+            elif interval <= 0:
+                # Teilweise gelesen: wie bisher nur die erhaltenen Werte
+                pass
+            elif name in self.read_at and now - self.read_at[name] <= STALE_FACTOR * interval:
+                # Nicht fällig oder Lesen fehlgeschlagen: zusammenhängender Stand aus dem Cache
+                self.stats["group_hits"] += 1
+                for a in addrs: result[a] = self.values[a]
+                continue
+            else:
+                continue
+            for a in fresh:
+                self.values[a] = result[a] = values[a]
+        return result
+
+    def ages(self, now=None):
+        """Alter jeder Gruppe in Sekunden (None = noch nie gelesen)."""
+        if now is None: now = time.monotonic()
+        return {name: (round(now - self.read_at[name], 1) if name in self.read_at else None) for name in self.groups}
+
+    def meta(self):
+        """Intervalle, Alter und Zähler für die Task-Statistik."""
+        ages = self.ages()
+        return {"groups": {name: {"interval": interval, "age": ages[name]} for name, (interval, _) in self.groups.items()},
+                **self.stats}
@@ -0,0 +1,164 @@
+"""
+Registerbeschreibung der Luxtronik-Sensoren (Input-Register, FC 04) und Leseplaner.
+
+Statt jedes Register einzeln abzufragen, fasst plan_reads() benachbarte
+Adressen zu möglichst wenigen Blockzugriffen zusammen. Lücken bis max_gap
+Register werden mitgelesen, ein Block umfasst höchstens max_len Register.
+Zwischen zwei Zugriffen hält die Verbindung (modbus_session.py) einen
+Mindestabstand von 0,2s zur letzten Antwort ein - jeder eingesparte Zugriff
+spart diese Wartezeit und einen Roundtrip.
+"""
+
+import struct
+
+# (Name, Adresse, Typ, Skalierung)
+# Typen: u16, s16 (vorzeichenbehaftet), bit0 (Bit 0 als bool), u32 (High-Word an Adresse, Low-Word an Adresse+1)
+# Skalierung: Faktor (0.1 = Wert / 10, 100 = Wert * 100, 1 = unverändert)
+REGISTER_MAP = (
+    ('Verdichter_Ein', 10000, 'bit0', 1),
+    ('Betriebsart', 10002, 'u16', 1),
+    ('Fehler_Nr', 10201, 'u16', 1),
+    ('Ruecklauf_Soll', 10101, 's16', 0.1),
+    ('Ruecklauf_Ist', 10100, 's16', 0.1),
+    ('Ruecklauf_Extern', 10102, 's16', 0.1),
+    ('Vorlauf_Ist', 10105, 's16', 0.1),
+    ('Aussentemp', 10108, 's16', 0.1),
+    ('Aussentemp_Mittel', 10109, 's16', 0.1),
+    ('Sole_Ein', 10110, 's16', 0.1),
+    ('Sole_Aus', 10111, 's16', 0.1),
+    ('Warmwasser_Ist', 10120, 's16', 0.1),
+    ('Warmwasser_Soll', 10121, 's16', 0.1),
+    ('Leistung_Heiz_kW', 10300, 'u16', 0.1),       # thermisch, kW x10
+    ('Leistung_Verdichter_W', 10301, 'u16', 100),  # elektrisch, 100W-Schritte
+    ('Energie_Elek_kWh', 10310, 'u32', 1),
+    ('Energie_Waerme_kWh', 10320, 'u32', 1),
+)
+
+# Aktualisierungsgruppen für den Register-Cache: Name -> (Intervall in s, Sensoren).
+# Intervall 0 = bei jeder Abfrage lesen. Zähler, Fehlernummer und Betriebsart
+# ändern sich selten und werden nur alle paar Minuten vom Bus gelesen.
+REFRESH_GROUPS = {
+    'status': (0, ('Verdichter_Ein',)),
+    'temperatures': (0, ('Ruecklauf_Soll', 'Ruecklauf_Ist', 'Ruecklauf_Extern', 'Vorlauf_Ist', 'Aussentemp',
+                         'Aussentemp_Mittel', 'Sole_Ein', 'Sole_Aus', 'Warmwasser_Ist', 'Warmwasser_Soll')),
+    'power': (0, ('Leistung_Heiz_kW', 'Leistung_Verdichter_W')),
+    'mode': (120, ('Betriebsart',)),
+    'errors': (120, ('Fehler_Nr',)),
+    'counters': (600, ('Energie_Elek_kWh', 'Energie_Waerme_kWh')),
+}
+
+# Bisherige Aufteilung der Zugriffe (Adresse, Anzahl). Rückfallebene, falls die
+# WP einen zusammengefassten Block ablehnt.
+LEGACY_LAYOUT = (
+    (10000, 1), (10002, 1), (10201, 1), (10100, 7), (10108, 4), (10120, 2), (10300, 2),
+    (10310, 1), (10311, 1), (10320, 1), (10321, 1),
+)
+
+# SHI-Status (Holding-Register, FC 03): ein Block, bei Ablehnung zwei kleine Zugriffe
+SHI_BLOCK = (10000, 10)
+SHI_FALLBACK = ((10000, 2), (10005, 2))
+
+DEFAULT_MAX_GAP = 8
+DEFAULT_MAX_LEN = 32
+
+
+def register_addresses(register_map=REGISTER_MAP, names=None):
+    """Alle belegten Adressen (u32 belegt zwei Register), optional nur für die genannten Sensoren."""
+    addrs = set()
+    for name, addr, kind, _ in register_map:
+        if names is not None and name not in names: continue
+        addrs.add(addr)
+        if kind == 'u32': addrs.add(addr + 1)
+    return sorted(addrs)
+
+
+def plan_reads(addrs, max_gap=DEFAULT_MAX_GAP, max_len=DEFAULT_MAX_LEN):
+    """
+    Fasst Adressen zu Blöcken (Start, Anzahl) zusammen. Zwei Adressen landen im
+    selben Block, wenn höchstens max_gap ungenutzte Register dazwischen liegen
+    und der Block dadurch nicht länger als max_len wird.
+    """
+    blocks = []
+    start = end = None
+    for addr in sorted(set(addrs)):
+        if start is not None and addr - end - 1 <= max_gap and addr - start + 1 <= max_len:
+            end = addr
+            continue
+        if start is not None: blocks.append((start, end - start + 1))
+        start = end = addr
+    if start is not None: blocks.append((start, end - start + 1))
+    return blocks
+
+
+def legacy_blocks_overlapping(start, count, layout=LEGACY_LAYOUT):
+    """Die bisherigen Einzelzugriffe, die sich mit einem geplanten Block überschneiden."""
+    return [(a, n) for a, n in layout if a < start + count and start < a + n]
+
+
+def _scaled(raw, scale):
+    if scale == 1: return raw
+    # Teilen statt mit 0.1 multiplizieren, damit die Werte exakt wie bisher sind (215 -> 21.5)
+    if scale < 1: return raw / round(1 / scale)
+    return raw * float(scale)
+
+
+def decode_registers(values, register_map=REGISTER_MAP):
+    """
+    Wandelt gelesene Register {Adresse: Rohwert} in das Sensor-Dictionary.
+    Fehlende Register lassen den jeweiligen Wert weg.
+    """
+    data = {}
+    for name, addr, kind, scale in register_map:
+        raw = values.get(addr)
+        if raw is None: continue
+        if kind == 'bit0':
+            data[name] = bool(raw & 0x01)
+        elif kind == 's16':
+            data[name] = _scaled(struct.unpack('>h', struct.pack('>H', raw))[0], scale)
+        elif kind == 'u32':
+            lo = values.get(addr + 1)
+            if lo is None: continue
+            data[name] = _scaled((raw << 16) + lo, scale)
+        else:
+            data[name] = _scaled(raw, scale)
+    return data
+
+
+def sensor_scan(plan, rejected_blocks):
+    """
+    Ablauf eines Sensor-Scans, unabhängig vom Transport (blockierend oder asyncio).
+
+    Der Generator liefert (Start, Anzahl) der nächsten Leseanfrage, der Aufrufer
+    schickt per send() (Register oder None, Exception-Code oder None) zurück.
+    Blöcke, die die WP mit einer Exception ablehnt, landen in rejected_blocks und
+    werden künftig wie früher einzeln gelesen. Rückgabewert (StopIteration.value)
+    sind die gelesenen Register {Adresse: Rohwert}.
+    """
+    values = {}
+    legacy_done = set()
+    for start, count in plan:
+        if (start, count) not in rejected_blocks:
+            regs, exc = yield start, count
+            if regs is not None:
+                values.update(zip(range(start, start + count), regs))
+                continue
+            if exc is not None: rejected_blocks.add((start, count))
+        # Rückfall auf die bisherigen Einzelzugriffe
+        for a, n in legacy_blocks_overlapping(start, count):
+            if (a, n) in legacy_done: continue
+            legacy_done.add((a, n))
+            regs, _ = yield a, n
+            if regs is not None: values.update(zip(range(a, a + n), regs))
+    return values
+
+
+def decode_shi(values):
+    """SHI-Status aus {Adresse: Rohwert} (Modus und Sollwert für Heizung und Warmwasser)."""
+    data = {}
+    if 10000 in values and 10001 in values:
+        data['HZ_Mode'] = values[10000]
+        data['HZ_Setpoint'] = values[10001] / 10
+    if 10005 in values and 10006 in values:
+        data['WW_Mode'] = values[10005]
+        data['WW_Setpoint'] = values[10006] / 10
+    return data
@@ -0,0 +1,136 @@
+"""
+Gesammelte Schreibzugriffe auf die SHI-Register der Luxtronik.
+
+Die Regel-Logik ruft write_hz_boost()/write_ww_boost() auf der Queue statt
+direkt auf dem Modbus-Client auf. Pro Zyklus werden die Aufträge
+zusammengeführt (letzter Wert je Register gewinnt), Schreibzugriffe auf den
+bereits bekannten Registerwert verworfen und der Rest über eine einzige
+Verbindung gesendet. Jeder eingesparte Zugriff spart den Mindestabstand
+zwischen zwei Anfragen (Token-Bucket der Verbindung) und einen Roundtrip zur WP.
+
+Nach dem Schreiben wird der SHI-Block in derselben Verbindung zurückgelesen
+(write_shi() des Clients). Weicht ein Register vom geschriebenen Wert ab (von
+der WP abgelehnt oder sofort überschrieben), zählt der Zugriff als
+fehlgeschlagen. Der bestätigte Stand steht im Bericht ("status"), statt erst
+mit der nächsten Abfrage 30s später bekannt zu werden.
+"""
+
+import time
+import threading
+
+from register_map import decode_shi
+
+REG_HZ_MODE = 10000
+REG_HZ_SETPOINT = 10001
+REG_WW_MODE = 10005
+REG_WW_SETPOINT = 10006
+
+# Reihenfolge wie in LuxtronikModbus: erst Sollwert, dann Modus
+WRITE_ORDER = (REG_HZ_SETPOINT, REG_HZ_MODE, REG_WW_SETPOINT, REG_WW_MODE)
+
+
+class RegisterWriteQueue:
+    """
+    Schreib-Queue mit letztem bestätigten Stand der Register 10000/10001/10005/10006.
+
+    Der bekannte Stand stammt aus read_shi_status() (observe()) und aus
+    erfolgreichen Schreibzugriffen. Er gilt max_age Sekunden, danach wird wieder
+    geschrieben, auch wenn der Wert gleich scheint.
+    """
+
+    def __init__(self, max_age=120):
+        self.max_age = max_age
+        self.known = {}       # Register -> (Wert, Zeitpunkt)
+        self.pending = {}     # Register -> Wert
+        self.merged = 0       # im aktuellen Zyklus überschriebene Aufträge
+        self.totals = {"written": 0, "failed": 0, "mismatch": 0, "merged": 0, "dropped": 0}
+        self.lock = threading.Lock()
+
+    def batch(self):
+        """
+        Eigene Queue für Aufträge außerhalb des Regelzyklus (z.B. Gateway): gleicher bekannter
+        Stand und gleiche Summen, aber getrennte offene Aufträge, damit take() nichts aus
+        einem halb aufgebauten Zyklus mitnimmt.
+        """
+        q = RegisterWriteQueue(self.max_age)
+        q.known, q.totals, q.lock = self.known, self.totals, self.lock
+        return q
+
+    def observe(self, status):
+        """Übernimmt den gelesenen SHI-Status (Dictionary aus read_shi_status())."""
+        now = time.time()
+        with self.lock:
+            for reg, key, scale in ((REG_HZ_MODE, 'HZ_Mode', 1), (REG_HZ_SETPOINT, 'HZ_Setpoint', 10),
+                                    (REG_WW_MODE, 'WW_Mode', 1), (REG_WW_SETPOINT, 'WW_Setpoint', 10)):
+                if status.get(key) is not None:
+                    self.known[reg] = (int(round(status[key] * scale)), now)
+
+    def _put(self, reg, value):
+        with self.lock:
+            if reg in self.pending: self.merged += 1
+            self.pending[reg] = value
+
+    def write_ww_boost(self, mode, temp):
+        self._put(REG_WW_SETPOINT, int(temp * 10))
+        self._put(REG_WW_MODE, mode)
+
+    def write_hz_boost(self, mode, setpoint=None):
+        if setpoint is not None:
+            self._put(REG_HZ_SETPOINT, int(setpoint * 10))
+        self._put(REG_HZ_MODE, mode)
+
+    def take(self):
+        """
+        Entnimmt die Aufträge des Zyklus. Liefert (Schreibzugriffe, Bericht); No-Op-Zugriffe
+        auf den bekannten Wert sind bereits entfernt.
+        """
+        now = time.time()
+        with self.lock:
+            writes = []
+            dropped = 0
+            for reg in WRITE_ORDER:
+                if reg not in self.pending: continue
+                value = self.pending[reg]
+                known = self.known.get(reg)
+                if known and known[0] == value and now - known[1] <= self.max_age:
+                    dropped += 1
+                else:
+                    writes.append((reg, value))
+            report = {"written": 0, "failed": 0, "mismatch": 0, "merged": self.merged, "dropped": dropped}
+            self.pending = {}
+            self.merged = 0
+        return writes, report
+
+    def apply(self, client, writes, report):
+        """Sendet die Schreibzugriffe über einen verbundenen Client (None = keine Verbindung) und liest zurück."""
+        if client is None or not writes:
+            return self.record(writes, [False] * len(writes), report)
+        results, readback = client.write_shi(writes)
+        return self.record(writes, results, report, readback)
+
+    def record(self, writes, results, report, readback=None):
+        """
+        Verbucht die Ergebnisse (True/False je Schreibzugriff, z.B. vom asyncio-Client) und
+        gleicht sie mit den zurückgelesenen Rohwerten {Register: Wert} ab.
+        """
+        now = time.time()
+        readback = readback or {}
+        with self.lock:
+            for (reg, value), ok in zip(writes, results):
+                if ok and reg in readback and readback[reg] != value:
+                    # Echo bestätigt, aber die WP hat den Wert nicht übernommen
+                    report["mismatch"] += 1
+                    ok = False
+                if ok:
+                    self.known[reg] = (value, now)
+                    report["written"] += 1
+                else:
+                    self.known.pop(reg, None)
+                    report["failed"] += 1
+            # Zurückgelesener Stand ist der bestätigte Stand (auch für nicht geschriebene Register)
+            for reg in WRITE_ORDER:
+                if reg in readback: self.known[reg] = (readback[reg], now)
+            for k in self.totals: self.totals[k] += report[k]
+        report["saved"] = report["merged"] + report["dropped"]
+        report["status"] = decode_shi(readback)
+        return report
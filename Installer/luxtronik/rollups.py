@@ -0,0 +1,326 @@
+"""
+Laufend gepflegte Verdichtungen der Live-Werte (1 min, 15 min, 1 h, 1 Tag).
+
+Jede Live-Ansicht rechnet bisher aus den Rohzeilen Minutenmittel neu; Wochen-,
+Monats- oder Jahresansichten gibt es nicht. RollupEngine aktualisiert bei
+jedem neuen Live-Wert (Grabber, alle 2 s) die offenen Intervalle aller
+Auflösungen: Mittelwert, Minimum, Maximum und bei Leistungen die Energie (Wh,
+Trapezregel; bei Batterie und Netz getrennt nach Richtung). Ein abgeschlossenes
+Intervall wird als Satz an einen Ringpuffer (live_ring.py) angehängt:
+
+    1m    RAM-Disk, 48 Stunden (wie die Live-History)
+    15m   neben den Tagesarchiven, ca. 2 Monate
+    1h    neben den Tagesarchiven, ca. 13 Monate
+    1d    neben den Tagesarchiven, ca. 10 Jahre (lokale Kalendertage)
+
+Die offenen Intervalle werden bei jedem abgeschlossenen Intervall (also
+einmal pro Minute) als rollup_state.json in die RAM-Disk gesichert. Nach einem
+Neustart des Dienstes geht es dort weiter; nur die Werte seit der Sicherung
+werden aus dem Ringpuffer der Live-History (ein Satz pro Minute) nachgerechnet.
+Fehlt die Sicherung (Neustart des Pi), werden die offenen Intervalle ganz aus
+der Live-History nachgerechnet. Bereits gespeicherte Intervalle werden dabei
+nicht doppelt angehängt.
+
+    python3 rollups.py show 1h --hours 48 --channels pv,grid
+    python3 rollups.py rebuild     # 15m/1h/1d aus allen Tagesarchiven + Live-History neu
+                                   # (vorher "systemctl stop e3dc-grabber")
+"""
+
+import os
+import sys
+import json
+import glob
+import math
+import argparse
+from datetime import date, datetime
+
+from live_ring import LiveRing, RING_FILE, iso_ts
+from history_archive import ARCHIVE_DIR, MAX_GAP, DailyArchive, day_bounds
+
+RAMDISK = os.path.dirname(RING_FILE)
+RESOLUTIONS = ('1m', '15m', '1h', '1d')
+STEP = {'1m': 60, '15m': 900, '1h': 3600}        # 1d: lokaler Kalendertag
+ROLLUP_FILES = {
+    '1m': os.path.join(RAMDISK, "rollup_1m.ring"),
+    '15m': os.path.join(ARCHIVE_DIR, "rollup_15m.ring"),
+    '1h': os.path.join(ARCHIVE_DIR, "rollup_1h.ring"),
+    '1d': os.path.join(ARCHIVE_DIR, "rollup_1d.ring"),
+}
+CAPACITY = {'1m': 48 * 60, '15m': 62 * 96, '1h': 400 * 24, '1d': 3660}
+STATE_FILE = os.path.join(RAMDISK, "rollup_state.json")
+
+CHANNELS = ('pv', 'bat', 'home', 'grid', 'wb', 'wp', 'soc', 'price_ct')
+POWER = ('pv', 'bat', 'home', 'grid', 'wb', 'wp')   # W -> Energie in Wh
+SIGNED = ('bat', 'grid')                            # zusätzlich *_wh_neg (Entladung bzw. Einspeisung)
+
+
+def _record_layout():
+    # (Kanal im Ringpuffer, zugehöriger Live-Kanal)
+    layout = [('n', None)]
+    for ch in CHANNELS:
+        layout += [(f"{ch}_mean", ch), (f"{ch}_min", ch), (f"{ch}_max", ch)]
+        if ch in POWER: layout.append((f"{ch}_wh", ch))
+        if ch in SIGNED: layout.append((f"{ch}_wh_neg", ch))
+    return layout
+
+
+RECORD_LAYOUT = _record_layout()
+RECORD_CHANNELS = tuple(name for name, _ in RECORD_LAYOUT)
+
+
+class Bucket:
+    """Offenes Intervall einer Auflösung."""
+
+    __slots__ = ('start', 'n', 'count', 'sum', 'min', 'max', 'wh', 'wh_neg')
+
+    def __init__(self, start):
+        k = len(CHANNELS)
+        self.start = start
+        self.n = 0
+        self.count = [0] * k
+        self.sum = [0.0] * k
+        self.min = [math.inf] * k
+        self.max = [-math.inf] * k
+        self.wh = [0.0] * k
+        self.wh_neg = [0.0] * k
+
+    def add(self, values, energy):
+        self.n += 1
+        for i, v in enumerate(values):
+            if v is None: continue
+            self.count[i] += 1
+            self.sum[i] += v
+            if v < self.min[i]: self.min[i] = v
+            if v > self.max[i]: self.max[i] = v
+        for i, e in energy:
+            if e >= 0: self.wh[i] += e
+            else: self.wh_neg[i] -= e
+
+    def as_record(self):
+        rec = {'n': self.n}
+        for i, ch in enumerate(CHANNELS):
+            if self.count[i]:
+                rec[f"{ch}_mean"] = self.sum[i] / self.count[i]
+                rec[f"{ch}_min"] = self.min[i]
+                rec[f"{ch}_max"] = self.max[i]
+            if ch in POWER:
+                rec[f"{ch}_wh"] = self.wh[i]
+                if ch in SIGNED: rec[f"{ch}_wh_neg"] = self.wh_neg[i]
+        return rec
+
+    def state(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def restore(cls, st):
+        bucket = cls(st['start'])
+        for name in cls.__slots__:
+            value = st[name]
+            if name not in ('start', 'n') and len(value) != len(CHANNELS): raise ValueError(name)
+            setattr(bucket, name, value)
+        return bucket
+
+
+def _values(sample):
+    out = []
+    for ch in CHANNELS:
+        v = sample.get(ch)
+        try:
+            v = float(v) if v is not None else None
+        except (TypeError, ValueError):
+            v = None
+        out.append(None if v is None or math.isnan(v) else v)
+    return out
+
+
+class RollupEngine:
+    """
+    Nimmt Live-Werte entgegen und schreibt abgeschlossene Intervalle.
+
+    Auflösungen, deren Verzeichnis fehlt (z.B. RAM-Disk im Test), werden
+    ausgelassen, ebenso die Sicherung der offenen Intervalle (state_file=None:
+    keine Sicherung). add() ist O(Auflösungen x Kanäle).
+    """
+
+    def __init__(self, files=None, resolutions=RESOLUTIONS, state_file=STATE_FILE):
+        self.files = dict(ROLLUP_FILES, **(files or {}))
+        self.resolutions = resolutions
+        self.state_file = state_file
+        self.rings = {}
+        self.open = {}
+        self.last_ts = None
+        self._last = None
+        self._day = (0, 0)
+        self.stats = {"samples": 0, "closed": 0, "duplicates": 0}
+        self._power = [i for i, ch in enumerate(CHANNELS) if ch in POWER]
+
+    def _ring(self, res):
+        ring = self.rings.get(res)
+        if ring is None:
+            path = self.files[res]
+            if not os.path.isdir(os.path.dirname(path)): return None
+            ring = self.rings[res] = LiveRing(path, writable=True, capacity=CAPACITY[res], channels=RECORD_CHANNELS)
+        return ring
+
+    def _close(self, res, bucket):
+        ring = self._ring(res)
+        if ring is None: return
+        if ring.append(bucket.start, bucket.as_record()): self.stats["closed"] += 1
+        else: self.stats["duplicates"] += 1   # schon gespeichert (Nachrechnen nach Neustart)
+
+    def add(self, ts, sample):
+        """Neuer Live-Wert (Unix-Zeit, Dictionary wie eine Zeile der live_history.txt)."""
+        if self.last_ts is not None and ts <= self.last_ts: return False
+        values = _values(sample)
+        energy = []
+        if self._last is not None and 0 < ts - self.last_ts < MAX_GAP:
+            dt_h = (ts - self.last_ts) / 3600.0
+            for i in self._power:
+                a, b = self._last[i], values[i]
+                if a is not None and b is not None: energy.append((i, (a + b) / 2 * dt_h))
+        if not (self._day[0] <= ts < self._day[1]): self._day = day_bounds(date.fromtimestamp(ts))
+        closed = False
+        for res in self.resolutions:
+            start = self._day[0] if res == '1d' else ts - ts % STEP[res]
+            bucket = self.open.get(res)
+            if bucket is not None and bucket.start != start:
+                self._close(res, bucket)
+                closed = True
+                bucket = None
+            if bucket is None: bucket = self.open[res] = Bucket(start)
+            bucket.add(values, energy)
+        self.last_ts = ts
+        self._last = values
+        self.stats["samples"] += 1
+        if closed: self.save()
+        return True
+
+    def save(self):
+        """Sichert die offenen Intervalle (atomar), damit ein Neustart dort weitermachen kann."""
+        if not self.state_file or not os.path.isdir(os.path.dirname(self.state_file)): return False
+        st = {'channels': CHANNELS, 'last_ts': self.last_ts, 'last': self._last,
+              'open': {res: bucket.state() for res, bucket in self.open.items()}}
+        tmp = f"{self.state_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, 'w') as f: json.dump(st, f)
+            os.replace(tmp, self.state_file)
+        except OSError:
+            try: os.remove(tmp)
+            except OSError: pass
+            raise
+        return True
+
+    def load(self):
+        """Setzt die gesicherten offenen Intervalle fort. False, wenn keine (passende) Sicherung vorhanden ist."""
+        if not self.state_file: return False
+        try:
+            with open(self.state_file, 'r') as f: st = json.load(f)
+            if tuple(st['channels']) != CHANNELS: return False
+            last = st['last']
+            if last is not None and len(last) != len(CHANNELS): return False
+            buckets = {res: Bucket.restore(b) for res, b in st['open'].items() if res in self.resolutions}
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        self.open = buckets
+        self.last_ts = st['last_ts']
+        self._last = last
+        self._day = (0, 0)
+        return True
+
+    def current(self, res):
+        """Teilergebnis des offenen Intervalls (z.B. 'heute bisher' für 1d) oder None."""
+        bucket = self.open.get(res)
+        return dict(bucket.as_record(), ts=bucket.start) if bucket else None
+
+    def resume_from(self):
+        """
+        Ab wann nach einem Neustart nachgerechnet werden muss: nach der Sicherung
+        (load() erfolgreich), sonst ab dem Ende des letzten gespeicherten Tages.
+        """
+        if self.last_ts is not None: return self.last_ts
+        ring = self._ring('1d')
+        last = ring.last_ts() if ring is not None else None
+        return day_bounds(date.fromtimestamp(last))[1] if last is not None else None
+
+    def replay(self, rows, channels):
+        """Speist Zeilen des Ringpuffers (ts, Kanal 0, ...) ein."""
+        index = [(ch, channels.index(ch)) for ch in CHANNELS if ch in channels]
+        for row in rows:
+            self.add(row[0], {ch: row[i + 1] for ch, i in index})
+
+    def close(self):
+        for ring in self.rings.values(): ring.close()
+        self.rings = {}
+
+
+def read_series(res, t0=None, t1=None, channels=None, path=None):
+    """
+    Gespeicherte Intervalle einer Auflösung als Dictionaries (ts = Intervallbeginn, Unix-Zeit).
+
+    n, min und max zählen die Live-Werte (alle 2 s) des Intervalls. Für das
+    Intervall, in das ein Neustart des Grabbers fällt, fehlen die Werte zwischen
+    der letzten Sicherung und dem Neustart; an ihrer Stelle steht höchstens ein
+    Minutensatz der Live-History. Ohne Sicherung (Neustart des Pi) gilt das für
+    alle damals offenen Intervalle bis zum Neustart: n ist dann deutlich kleiner,
+    min/max stammen aus Minutenwerten. Mittelwerte und Energie bleiben brauchbar.
+    """
+    ring = LiveRing(path or ROLLUP_FILES[res])
+    try:
+        entries = ring.entries(t0, t1, iso=False)
+    finally:
+        ring.close()
+    if channels:
+        keep = {'ts', 'n'} | {name for name, ch in RECORD_LAYOUT if ch in channels}
+        entries = [{k: v for k, v in e.items() if k in keep} for e in entries]
+    return entries
+
+
+def rebuild(archive_dir=ARCHIVE_DIR, ring_file=RING_FILE, files=None):
+    """Baut 15m/1h/1d aus allen Tagesarchiven (.col) und der Live-History neu auf."""
+    files = dict(ROLLUP_FILES, **(files or {}))
+    for res in ('15m', '1h', '1d'):
+        try: os.remove(files[res])
+        except OSError: pass
+    engine = RollupEngine(files, resolutions=('15m', '1h', '1d'), state_file=None)
+    for path in sorted(glob.glob(os.path.join(archive_dir, "history_*.col"))):
+        arc = DailyArchive(path)
+        cols = arc.load([ch for ch in CHANNELS if ch in arc.columns])
+        names = [ch for ch in CHANNELS if ch in cols]
+        for i, ts in enumerate(cols['ts']):
+            engine.add(ts, {ch: cols[ch][i] for ch in names})
+    if os.path.exists(ring_file):
+        ring = LiveRing(ring_file)
+        engine.replay(ring.rows(engine.last_ts + 1 if engine.last_ts else None), ring.channels)
+        ring.close()
+    # letztes (offenes) Intervall je Auflösung bleibt offen; der Grabber rechnet es nach
+    stats = engine.stats
+    engine.close()
+    return stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Verdichtungen der Live-Werte")
+    sub = ap.add_subparsers(dest='cmd')
+    sh = sub.add_parser('show', help="gespeicherte Intervalle als JSON-Lines")
+    sh.add_argument('resolution', choices=RESOLUTIONS)
+    sh.add_argument('--hours', type=float)
+    sh.add_argument('--channels', help="z.B. pv,grid")
+    sub.add_parser('rebuild', help="15m/1h/1d aus Tagesarchiven und Live-History neu aufbauen")
+    args = ap.parse_args()
+
+    if args.cmd == 'show':
+        t0 = datetime.now().timestamp() - args.hours * 3600 if args.hours else None
+        channels = args.channels.split(',') if args.channels else None
+        for e in read_series(args.resolution, t0, channels=channels):
+            e['ts'] = iso_ts(e['ts'])
+            sys.stdout.write(json.dumps(e, separators=(',', ':')) + "\n")
+        return 0
+    if args.cmd == 'rebuild':
+        print(json.dumps(rebuild()))
+        return 0
+    ap.print_help()
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
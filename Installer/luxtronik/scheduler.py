@@ -0,0 +1,262 @@
+"""
+Asyncio-Scheduler für den Energy Manager.
+
+Jede Aufgabe (WP-Abfrage, E3DC-Snapshot, Regel-Entscheidung, Schreiben,
+Benachrichtigungen) läuft als eigener Task mit eigenem Takt. Blockierende
+Arbeit wird in Executor-Threads ausgelagert, damit ein langsamer Schritt
+(z.B. ein 3s Socket-Timeout) die anderen Tasks nicht aufhält.
+
+Für jeden Task werden Laufzeit, Verspätung und Deadline-Überschreitungen
+mitgezählt (siehe Scheduler.snapshot()).
+"""
+
+import asyncio
+import time
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import Metrics
+
+# Warnungen bei Deadline-Überschreitung höchstens alle 10 Minuten pro Task loggen
+OVERRUN_LOG_INTERVAL = 600
+
+
+class TaskStats:
+    """Laufzeit- und Overrun-Statistik eines einzelnen Tasks."""
+
+    def __init__(self, name, interval, deadline):
+        self.name = name
+        self.interval = interval
+        self.deadline = deadline
+        self.runs = 0
+        self.errors = 0
+        self.overruns = 0
+        self.late_starts = 0
+        self.last_start = 0.0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+        self.total_duration = 0.0
+        self.max_lateness = 0.0
+        self.last_error = ""
+        self._last_overrun_log = 0.0
+
+    def record(self, started, duration, lateness=0.0):
+        """Verbucht einen Lauf. Gibt True zurück, wenn die Deadline überschritten wurde."""
+        self.runs += 1
+        self.last_start = started
+        self.last_duration = duration
+        self.total_duration += duration
+        if duration > self.max_duration: self.max_duration = duration
+        if lateness > 0:
+            self.late_starts += 1
+            if lateness > self.max_lateness: self.max_lateness = lateness
+        if self.deadline and duration > self.deadline:
+            self.overruns += 1
+            return True
+        return False
+
+    def as_dict(self):
+        return {
+            "interval": self.interval,
+            "deadline": self.deadline,
+            "runs": self.runs,
+            "errors": self.errors,
+            "overruns": self.overruns,
+            "late_starts": self.late_starts,
+            "last_start": round(self.last_start, 3),
+            "last_duration": round(self.last_duration, 4),
+            "avg_duration": round(self.total_duration / self.runs, 4) if self.runs else 0.0,
+            "max_duration": round(self.max_duration, 4),
+            "max_lateness": round(self.max_lateness, 4),
+            "last_error": self.last_error,
+        }
+
+
+class Scheduler:
+    """
+    Verwaltet periodische, ereignisgesteuerte und Hintergrund-Tasks.
+
+    - add_periodic(): fester Takt (mit Mindestabstand, z.B. für die Luxtronik)
+    - add_triggered(): läuft, sobald trigger() aufgerufen wurde (spätestens nach max_wait)
+    - post(): reiht blockierende Arbeit (Dateien, Telegram) abseits des kritischen Pfads ein;
+      jede Warteschlange hat einen eigenen Worker, ein langsamer Telegram-Versand hält
+      also das Schreiben der Dateien nicht auf
+    - add_service(): dauerhaft laufende Coroutine (z.B. ein Socket-Server)
+
+    Normale (blockierende) Funktionen laufen in einem eigenen Executor-Thread pro
+    Task, Coroutine-Funktionen direkt im Event-Loop. Gemeinsam genutzte Ressourcen
+    (z.B. der Modbus-Bus der Wärmepumpe) muss der Aufrufer selbst per Lock schützen.
+    """
+
+    def __init__(self, logger=None):
+        self.logger = logger
+        self.stats = {}
+        # Rollende Laufzeiten (p50/p95/max) aller Tasks und der vom Aufrufer gemessenen Phasen
+        self.metrics = Metrics()
+        self._specs = []
+        self._events = {}
+        self._loop = None
+        self._outboxes = None
+        self._workers = []
+        self._executors = {}
+
+    def _new_stats(self, name, interval, deadline):
+        st = TaskStats(name, interval, deadline)
+        self.stats[name] = st
+        self._executors[name] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        return st
+
+    def add_periodic(self, name, interval, func, deadline=None, min_interval=None):
+        """Registriert einen Task mit festem Takt. min_interval begrenzt den Takt nach unten."""
+        if min_interval is not None: interval = max(interval, min_interval)
+        self._new_stats(name, interval, deadline if deadline is not None else interval)
+        self._specs.append(("periodic", name, interval, func))
+
+    def add_triggered(self, name, func, max_wait, deadline=None):
+        """Registriert einen Task, der durch trigger(name) oder spätestens nach max_wait läuft."""
+        self._new_stats(name, max_wait, deadline if deadline is not None else max_wait)
+        self._specs.append(("triggered", name, max_wait, func))
+
+    def add_service(self, name, coro_func):
+        """Registriert eine dauerhaft laufende Coroutine. Ein Fehler wird geloggt und beendet nur diesen Dienst."""
+        self._new_stats(name, 0, 0)
+        self._specs.append(("service", name, 0, coro_func))
+
+    def trigger(self, name):
+        """Weckt einen ereignisgesteuerten Task auf (auch aus Executor-Threads aufrufbar)."""
+        event = self._events.get(name)
+        if event is None or self._loop is None: return
+        if _in_loop_thread(self._loop): event.set()
+        else: self._loop.call_soon_threadsafe(event.set)
+
+    def post(self, name, func, *args, queue=None):
+        """
+        Reiht einen blockierenden Aufruf im Hintergrund ein (thread-safe). Aufrufe derselben
+        Warteschlange (Standard: name) laufen nacheinander in Reihenfolge, verschiedene
+        Warteschlangen unabhängig voneinander.
+        """
+        if self._loop is None or self._outboxes is None:
+            # Scheduler läuft (noch) nicht: direkt ausführen
+            try: func(*args)
+            except Exception as e: self._log_error(name, e)
+            return
+        self._loop.call_soon_threadsafe(self._enqueue, queue or name, (name, func, args))
+
+    def _enqueue(self, queue, item):
+        # Läuft im Event-Loop: Warteschlange und Worker beim ersten Aufruf anlegen
+        outbox = self._outboxes.get(queue)
+        if outbox is None:
+            outbox = self._outboxes[queue] = asyncio.Queue()
+            self._workers.append(asyncio.ensure_future(self._run_outbox(outbox)))
+        outbox.put_nowait(item)
+
+    def run_coroutine(self, coro, timeout=None):
+        """Führt eine Coroutine aus einem Executor-Thread im Event-Loop aus und wartet auf das Ergebnis."""
+        if self._loop is None or _in_loop_thread(self._loop):
+            coro.close()
+            raise RuntimeError("run_coroutine() nur aus Executor-Threads des laufenden Schedulers")
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def snapshot(self):
+        """Aktuelle Statistik aller Tasks als Dictionary."""
+        return {name: st.as_dict() for name, st in self.stats.items()}
+
+    def write_stats(self, path, extra=None):
+        """Schreibt die Task-Statistik atomar als JSON (z.B. in die RAM-Disk). extra wird mit übernommen."""
+        data = {"ts": time.time(), "tasks": self.snapshot()}
+        if extra: data.update(extra)
+        tmp = path + ".tmp"
+        with open(tmp, 'w') as f: json.dump(data, f)
+        os.replace(tmp, path)
+
+    def _log_error(self, name, err):
+        st = self.stats.get(name)
+        if st:
+            st.errors += 1
+            st.last_error = str(err)
+        if self.logger: self.logger.error(f"Task '{name}' fehlgeschlagen: {err}")
+
+    def _check_overrun(self, st, overrun):
+        if not overrun or not self.logger: return
+        now = time.time()
+        if now - st._last_overrun_log > OVERRUN_LOG_INTERVAL:
+            st._last_overrun_log = now
+            self.logger.warning(f"Task '{st.name}' hat Deadline überschritten ({st.last_duration:.2f}s > {st.deadline:.2f}s, gesamt {st.overruns}x).")
+
+    async def _execute(self, name, func, lateness=0.0):
+        st = self.stats[name]
+        executor = self._executors[name]
+        started = time.time()
+        t0 = time.monotonic()
+        try:
+            if asyncio.iscoroutinefunction(func): await func()
+            else: await self._loop.run_in_executor(executor, func)
+        except Exception as e:
+            self._log_error(name, e)
+        duration = time.monotonic() - t0
+        self.metrics.observe(f"task_{name}", duration)
+        self._check_overrun(st, st.record(started, duration, lateness))
+
+    async def _run_periodic(self, name, interval, func):
+        next_run = time.monotonic()
+        lateness = 0.0
+        while True:
+            await self._execute(name, func, lateness)
+            next_run += interval
+            now = time.monotonic()
+            lateness = max(0.0, now - next_run)
+            if lateness > 0:
+                # Takt verpasst: nicht nachholen, sondern neu ausrichten
+                next_run = now
+            await asyncio.sleep(next_run - now)
+
+    async def _run_triggered(self, name, max_wait, func):
+        event = self._events[name]
+        while True:
+            try:
+                await asyncio.wait_for(event.wait(), timeout=max_wait)
+            except asyncio.TimeoutError:
+                pass
+            event.clear()
+            await self._execute(name, func)
+
+    async def _run_service(self, name, coro_func):
+        try:
+            await coro_func()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._log_error(name, e)
+
+    async def _run_outbox(self, outbox):
+        while True:
+            name, func, args = await outbox.get()
+            if name not in self.stats: self._new_stats(name, 0, 0)
+            await self._execute(name, lambda: func(*args))
+
+    async def run(self):
+        """Startet alle registrierten Tasks und läuft, bis einer abbricht."""
+        self._loop = asyncio.get_running_loop()
+        self._outboxes = {}
+        tasks = []
+        for kind, name, interval, func in self._specs:
+            if kind == "periodic":
+                tasks.append(asyncio.ensure_future(self._run_periodic(name, interval, func)))
+            elif kind == "service":
+                tasks.append(asyncio.ensure_future(self._run_service(name, func)))
+            else:
+                self._events[name] = asyncio.Event()
+                tasks.append(asyncio.ensure_future(self._run_triggered(name, interval, func)))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for t in tasks + self._workers: t.cancel()
+            for ex in self._executors.values(): ex.shutdown(wait=False)
+
+
+def _in_loop_thread(loop):
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
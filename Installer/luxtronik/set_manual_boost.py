@@ -1,69 +1,74 @@
 import sys
 import os
-import json
 from luxtronik import LuxtronikModbus
+from register_queue import RegisterWriteQueue
+from gateway_client import GatewayClient, GATEWAY_MAX_AGE
+from e3dc_config import read_config_value
 
 FLAG_FILE = "/var/www/html/ramdisk/manual_boost.flag"
 
-def _read_e3dc_config_value(key, default=None):
-    """Liest einen Wert aus der zentralen e3dc.config.txt."""
-    try:
-        with open('/var/www/html/e3dc_paths.json', 'r') as f:
-            paths = json.load(f)
-            install_path = paths.get('install_path', '/home/pi/E3DC-Control/')
-    except:
-        install_path = '/home/pi/E3DC-Control/'
-    
-    config_path = os.path.join(install_path, 'e3dc.config.txt')
-    if not os.path.exists(config_path): return default
+def _boost_plan(at_mittel, at_limit, wws, www, hz):
+    """SHI-Werte (WW, HZ) und Statusmeldung für den manuellen Boost."""
+    if at_mittel > at_limit:
+        # SOMMER-BOOST: Nur Warmwasser auf WWS (55°C), Heizung bleibt Automatik
+        return (1, wws), (0, None), f"Sommer-Boost: WW {wws}°C"
+    # WINTER-BOOST: WW auf WWW (45°C) + Heizung auf HZ (50°C)
+    return (1, www), (1, hz), f"Winter-Boost: WW {www}°C, HZ {hz}°C"
 
-    try:
-        with open(config_path, 'r') as f:
-            for line in f:
-                if line.strip().startswith('#') or '=' not in line: continue
-                k, v = line.split('=', 1)
-                if k.strip().lower() == key.lower():
-                    return v.strip()
-    except Exception: pass
-    return default
+def _write_direct(wp, ww, hz):
+    """Schreibt über eine eigene Verbindung und prüft per Rücklesen. True, wenn die WP alle Werte übernommen hat."""
+    q = RegisterWriteQueue()
+    q.write_ww_boost(*ww)
+    q.write_hz_boost(*hz)
+    writes, report = q.take()
+    return not q.apply(wp, writes, report)["failed"]
 
 def main():
     action = sys.argv[1] if len(sys.argv) > 1 else "off"
 
-    WP_IP = _read_e3dc_config_value('luxtronik_ip', '192.168.178.88')
-    AT_LIMIT = float(_read_e3dc_config_value('at_limit', 10.0))
-    WWS = float(_read_e3dc_config_value('wws', 50.0))
-    WWW = float(_read_e3dc_config_value('www', 48.0))
-    HZ = float(_read_e3dc_config_value('hz', 32.0))
+    WP_IP = read_config_value('luxtronik_ip', '192.168.178.88')
+    AT_LIMIT = float(read_config_value('at_limit', 10.0))
+    WWS = float(read_config_value('wws', 50.0))
+    WWW = float(read_config_value('www', 48.0))
+    HZ = float(read_config_value('hz', 32.0))
 
-    wp = LuxtronikModbus(WP_IP)
+    # Läuft der Energy Manager, wird über seine Verbindung geschrieben (kein zweiter Client am Bus).
+    # Nur wenn das Gateway nicht erreichbar ist, verbinden wir uns selbst.
+    gateway = GatewayClient()
+    written = None
 
     if action == "on":
-        if wp.connect():
-            data = wp.read_all_sensors()
-            at_mittel = data.get('Aussentemp_Mittel', 20.0) #
-            
-            if at_mittel > AT_LIMIT:
-                # SOMMER-BOOST: Nur Warmwasser auf WWS (55°C)
-                wp.write_ww_boost(1, WWS)
-                wp.write_hz_boost(0) # Heizung bleibt Automatik
-                status_msg = f"Sommer-Boost: WW {WWS}°C"
-            else:
-                # WINTER-BOOST: WW auf WWW (45°C) + Heizung auf HZ (50°C)
-                wp.write_ww_boost(1, WWW)
-                wp.write_hz_boost(1, HZ)
-                status_msg = f"Winter-Boost: WW {WWW}°C, HZ {HZ}°C"
-            
-            wp.close()
+        snap = gateway.snapshot(max_age=GATEWAY_MAX_AGE)
+        if snap and snap.get('success'):
+            ww, hz, status_msg = _boost_plan(snap['data'].get('Aussentemp_Mittel', 20.0), AT_LIMIT, WWS, WWW, HZ)
+            written = gateway.write(ww, hz)
+        elif snap:
+            # Energy Manager erreicht die WP gerade nicht -> nicht zusätzlich selbst verbinden
+            written = False
+        if written is None:
+            wp = LuxtronikModbus(WP_IP)
+            if wp.connect():
+                data = wp.read_all_sensors()
+                ww, hz, status_msg = _boost_plan(data.get('Aussentemp_Mittel', 20.0), AT_LIMIT, WWS, WWW, HZ)
+                written = _write_direct(wp, ww, hz)
+                wp.close()
+        if written:
             with open(FLAG_FILE, 'w') as f: f.write(status_msg)
             print(status_msg)
+        elif written is False:
+            print("Boost konnte nicht gesetzt werden")
     else:
-        if wp.connect():
-            wp.write_ww_boost(0, 45.0)
-            wp.write_hz_boost(0)
-            wp.close()
+        written = gateway.write((0, 45.0), (0, None))
+        if written is None:
+            wp = LuxtronikModbus(WP_IP)
+            if wp.connect():
+                written = _write_direct(wp, (0, 45.0), (0, None))
+                wp.close()
+        if written:
             if os.path.exists(FLAG_FILE): os.remove(FLAG_FILE)
             print("Boost deaktiviert")
+        elif written is False:
+            print("Boost konnte nicht deaktiviert werden")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
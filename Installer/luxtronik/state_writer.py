@@ -0,0 +1,168 @@
+"""
+Schreibt Status (luxtronik.json), History (luxtronik_history.json) und das Tagesarchiv.
+
+- Status: atomar per Temp-Datei + rename. Rechte/Besitzer werden nur gesetzt,
+  wenn eine neu angelegte Datei sie nicht ohnehin schon hat (umask/Owner
+  werden einmal geprüft), statt bei jedem Schreiben chmod/chown aufzurufen.
+- History: kompakte JSON-Zeilen, gesammelt und in Blöcken angehängt.
+- Tageswechsel: die History wird auf der RAM-Disk atomar umbenannt und im
+  Hintergrund ins Archiv auf der SD-Karte übertragen (optional gzip-komprimiert).
+  Reste eines abgebrochenen Archivlaufs werden beim nächsten Start nachgeholt.
+
+Die geschriebenen Bytes werden pro Tag und Ziel (RAM-Disk / SD-Karte) gezählt.
+"""
+
+import os
+import json
+import glob
+import gzip
+import time
+import shutil
+import threading
+from datetime import date
+
+ROTATED_SUFFIX = ".rotated-"
+
+
+def _dumps(obj):
+    return json.dumps(obj, separators=(',', ':'))
+
+
+class StateWriter:
+    """Gepuffertes, SD-schonendes Schreiben der Energy-Manager-Dateien."""
+
+    def __init__(self, status_file, history_file, archive_dir, batch_size=4, batch_seconds=120, logger=None, compress=False):
+        self.status_file = status_file
+        self.history_file = history_file
+        self.archive_dir = archive_dir
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.logger = logger
+        # gzip für nachgeholte Tage (wie luxtronik_archive_gzip); rollover() bekommt es pro Aufruf
+        self.compress = compress
+        self._buffer = []
+        self._buffer_since = None
+        self._meta = {}   # Verzeichnis -> (Modus nötig?, Owner nötig?, uid, gid)
+        self._lock = threading.Lock()
+        self._day = date.today().isoformat()
+        self._bytes = {"ramdisk": 0, "sd": 0}
+        self.last_day_bytes = None
+        self._archive_leftovers()
+
+    # --- Rechte ---
+
+    def _fix_meta(self, fd, directory, mode=0o664):
+        """Setzt Modus und Besitzer (vom Verzeichnis geerbt) nur, wenn die neue Datei sie nicht schon hat."""
+        meta = self._meta.get(directory)
+        if meta is None:
+            umask = os.umask(0); os.umask(umask)
+            need_chown = False; uid = gid = -1
+            try:
+                st = os.stat(directory)
+                uid, gid = st.st_uid, st.st_gid
+                # Neue Dateien bekommen die Gruppe des Verzeichnisses automatisch, wenn es setgid ist
+                new_gid = gid if st.st_mode & 0o2000 else os.getegid()
+                need_chown = os.geteuid() == 0 and (os.geteuid(), new_gid) != (uid, gid)
+            except OSError:
+                pass
+            meta = ((mode & ~umask) != mode, need_chown, uid, gid)
+            self._meta[directory] = meta
+        need_chmod, need_chown, uid, gid = meta
+        try:
+            if need_chmod: os.fchmod(fd, mode)
+            if need_chown: os.fchown(fd, uid, gid)
+        except OSError:
+            pass
+
+    def _count(self, target, n):
+        with self._lock:
+            today = date.today().isoformat()
+            if today != self._day:
+                self.last_day_bytes = {"date": self._day, **self._bytes}
+                self._day = today
+                self._bytes = {"ramdisk": 0, "sd": 0}
+            self._bytes[target] += n
+
+    def _atomic_write(self, path, data, target):
+        directory = os.path.dirname(path) or "."
+        tmp = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o664)
+        try:
+            self._fix_meta(fd, directory)
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        os.replace(tmp, path)
+        self._count(target, len(data))
+
+    # --- Status / History ---
+
+    def write_status(self, obj):
+        """Schreibt luxtronik.json atomar."""
+        self._atomic_write(self.status_file, _dumps(obj).encode(), "ramdisk")
+
+    def append_history(self, record, force=False):
+        """Puffert eine History-Zeile und hängt den Puffer bei Bedarf an die Datei an."""
+        self._buffer.append(_dumps(record) + "\n")
+        if self._buffer_since is None: self._buffer_since = time.monotonic()
+        if force or len(self._buffer) >= self.batch_size or time.monotonic() - self._buffer_since >= self.batch_seconds:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer: return
+        data = "".join(self._buffer).encode()
+        is_new = not os.path.exists(self.history_file)
+        fd = os.open(self.history_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o664)
+        try:
+            if is_new: self._fix_meta(fd, os.path.dirname(self.history_file) or ".")
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        self._count("ramdisk", len(data))
+        self._buffer = []
+        self._buffer_since = None
+
+    # --- Tageswechsel ---
+
+    def rollover(self, date_str, compress=False):
+        """
+        Schließt die History des Tages ab: Puffer schreiben, Datei auf der RAM-Disk
+        umbenennen (neue Zeilen landen sofort in einer frischen Datei) und im
+        Hintergrund ins Archiv übertragen.
+        """
+        self.flush()
+        if not os.path.exists(self.history_file): return
+        rotated = f"{self.history_file}{ROTATED_SUFFIX}{date_str}"
+        os.rename(self.history_file, rotated)
+        threading.Thread(target=self._archive, args=(rotated, date_str, compress), name="archive", daemon=True).start()
+
+    def _archive(self, rotated, date_str, compress=False):
+        target = os.path.join(self.archive_dir, f"luxtronik_{date_str}.json" + (".gz" if compress else ""))
+        tmp = target + ".tmp"
+        try:
+            os.makedirs(self.archive_dir, exist_ok=True)
+            with open(rotated, 'rb') as src:
+                if compress:
+                    with gzip.open(tmp, 'wb', compresslevel=6) as dst: shutil.copyfileobj(src, dst)
+                else:
+                    with open(tmp, 'wb') as dst: shutil.copyfileobj(src, dst)
+            try: os.chmod(tmp, 0o664)
+            except OSError: pass
+            os.replace(tmp, target)
+            self._count("sd", os.path.getsize(target))
+            os.remove(rotated)
+            if self.logger: self.logger.info(f"History archiviert: {os.path.basename(target)} ({os.path.getsize(target) // 1024} KB).")
+        except Exception as e:
+            if self.logger: self.logger.error(f"Archivierung der History fehlgeschlagen: {e}")
+
+    def _archive_leftovers(self):
+        # Nach Absturz/Neustart: umbenannte, aber noch nicht archivierte Tage nachholen
+        for rotated in glob.glob(f"{self.history_file}{ROTATED_SUFFIX}*"):
+            date_str = rotated.rsplit(ROTATED_SUFFIX, 1)[1]
+            threading.Thread(target=self._archive, args=(rotated, date_str, self.compress), name="archive", daemon=True).start()
+
+    def stats(self):
+        """Geschriebene Bytes heute (und am Vortag) je Ziel."""
+        with self._lock:
+            return {"date": self._day, "bytes": dict(self._bytes), "previous": self.last_day_bytes,
+                    "history_buffered": len(self._buffer)}
@@ -296,6 +296,7 @@ FILE_DEFINITIONS = [
     {"path": "/var/www/html/manifest.json", "mode": "664", "owner": INSTALL_USER, "group": "www-data", "optional": False, "executable": False},
     {"path": "/var/www/html/ramdisk/live.txt", "mode": "664", "owner": INSTALL_USER, "group": "www-data", "optional": True, "executable": False},
     {"path": "/var/www/html/ramdisk/live_history.txt", "mode": "664", "owner": INSTALL_USER, "group": "www-data", "optional": True, "executable": False},
+    {"path": "/var/www/html/ramdisk/live_history.ring", "mode": "664", "owner": INSTALL_USER, "group": "www-data", "optional": True, "executable": False},
     {"path": "/var/www/html/tmp/plot_soc_done", "mode": "666", "owner": INSTALL_USER, "group": "www-data", "optional": False, "executable": False},
     {"path": "/var/www/html/tmp/plot_soc_done_archiv", "mode": "666", "owner": INSTALL_USER, "group": "www-data", "optional": False, "executable": False},
     {"path": "/var/www/html/tmp/plot_soc_done_mobile", "mode": "666", "owner": INSTALL_USER, "group": "www-data", "optional": False, "executable": False},
@@ -557,7 +558,7 @@ def fix_webportal_permissions(issues):
         result = run_command(f"sudo chmod 2775 {wp_path}/ramdisk")
         if result['success']:
             # Fix live.txt und live_history.txt spezifisch auf 664
-            for fname in ("live.txt", "live_history.txt", "luxtronik.json", "luxtronik_history.json", "luxtronik_stats.json"):
+            for fname in ("live.txt", "live_history.txt", "live_history.ring", "luxtronik.json", "luxtronik_history.json", "luxtronik_stats.json"):
                 live_f = f"{wp_path}/ramdisk/{fname}"
                 if os.path.exists(live_f):
                     run_command(f"sudo chmod 664 {live_f}")
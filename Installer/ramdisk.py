@@ -9,9 +9,9 @@ from .logging_manager import get_or_create_logger, log_task_completed, log_error
 
 INSTALL_PATH = get_install_path()
 RAMDISK_PATH = "/var/www/html/ramdisk"
-GRABBER_SCRIPT = os.path.join(get_home_dir(get_install_user()), "get_live.sh")
+GRABBER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "luxtronik", "e3dc_grabber.py")
+LEGACY_GRABBER_SCRIPT = os.path.join(get_home_dir(get_install_user()), "get_live.sh")
 FSTAB_PATH = "/etc/fstab"
-CRON_COMMENT = "E3DC Live Grabber"
 SERVICE_NAME = "e3dc-grabber"
 SERVICE_PATH = f"/etc/systemd/system/{SERVICE_NAME}.service"
 ramdisk_logger = get_or_create_logger("ramdisk")
@@ -80,30 +80,18 @@ def setup_ramdisk():
     run_command(f"sudo chmod 2775 {RAMDISK_PATH}")
     ramdisk_logger.info("RAM-Disk gemountet und Berechtigungen gesetzt.")
 
-    # 4. Grabber Skript erstellen
-    print(f"→ Erstelle Grabber-Skript: {GRABBER_SCRIPT}")
-    script_content = f"""#!/bin/bash
-# {CRON_COMMENT}
-while true; do
-  /usr/bin/screen -S E3DC -X hardcopy {RAMDISK_PATH}/live.tmp
-  if [ -f {RAMDISK_PATH}/live.tmp ]; then
-      chmod 664 {RAMDISK_PATH}/live.tmp
-      mv {RAMDISK_PATH}/live.tmp {RAMDISK_PATH}/live.txt
-  fi
-  sleep 2
-done
-"""
-    try:
-        with open(GRABBER_SCRIPT, "w") as f:
-            f.write(script_content)
-
-        run_command(f"sudo chown {install_user}:www-data {GRABBER_SCRIPT}")
-        run_command(f"sudo chmod 755 {GRABBER_SCRIPT}")
-        print("  ✓ Skript erstellt und ausführbar gemacht")
-        ramdisk_logger.info(f"Grabber-Skript erstellt: {GRABBER_SCRIPT}")
-    except Exception as e:
-        print(f"  ✗ Fehler beim Erstellen des Skripts: {e}")
-        log_error("ramdisk", f"Fehler beim Erstellen des Grabber-Skripts: {e}", e)
+    # 4. Grabber (Python, schreibt live.txt und live_snapshot.json) - altes Shell-Skript entfernen
+    print(f"→ Nutze Grabber: {GRABBER_SCRIPT}")
+    if not os.path.exists(GRABBER_SCRIPT):
+        print(f"  ✗ Grabber nicht gefunden: {GRABBER_SCRIPT}")
+        log_error("ramdisk", f"Grabber nicht gefunden: {GRABBER_SCRIPT}")
+    if os.path.exists(LEGACY_GRABBER_SCRIPT):
+        try:
+            os.remove(LEGACY_GRABBER_SCRIPT)
+            print("  ✓ Altes Skript get_live.sh entfernt")
+            ramdisk_logger.info(f"Altes Grabber-Skript entfernt: {LEGACY_GRABBER_SCRIPT}")
+        except Exception as e:
+            log_warning("ramdisk", f"Altes Grabber-Skript konnte nicht entfernt werden: {e}")
 
     # 5. Systemd Service erstellen (ersetzt alten Cronjob)
     print(f"→ Erstelle Systemd Service ({SERVICE_NAME})…")
@@ -115,7 +103,7 @@ After=network.target
 Type=simple
 User={install_user}
 Group=www-data
-ExecStart={GRABBER_SCRIPT}
+ExecStart=/usr/bin/python3 {GRABBER_SCRIPT}
 Restart=always
 RestartSec=5
 
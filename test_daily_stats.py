@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Tests für die laufende Tagesstatistik (daily_stats.py)
+
+Vergleicht DailyEnergyStats mit calculateDailyEnergyStats() aus helpers.php
+(unten wörtlich übertragen, rechnet die ganze History auf einmal) und prüft
+die Wallbox-Sessions, den Tageswechsel und das Fortsetzen nach einem Neustart.
+"""
+
+import os
+import sys
+import json
+import random
+from datetime import date, datetime
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LUXTRONIK_DIR = os.path.join(SCRIPT_DIR, "Installer", "luxtronik")
+if LUXTRONIK_DIR not in sys.path:
+    sys.path.insert(0, LUXTRONIK_DIR)
+
+from daily_stats import DailyEnergyStats, WallboxSession, DailyStatsEngine, ACC_KEYS
+from history_archive import day_bounds
+
+DAY = date(2026, 10, 16)
+
+
+def php_daily_stats(lines):
+    """calculateDailyEnergyStats() aus helpers.php; liefert (Summen, Ergebnis)."""
+    active = None
+    for ln in reversed(lines):
+        d = json.loads(ln)
+        if d and 'ts' in d:
+            active = d['ts'][:10]
+            break
+    st = dict.fromkeys(ACC_KEYS, 0)
+    last_ts = last_row = None
+    for ln in lines:
+        d = json.loads(ln)
+        if not d or 'ts' not in d or not d['ts'].startswith(active): continue
+        ts = datetime.fromisoformat(d['ts']).timestamp()
+        if last_ts is not None:
+            dt = ts - last_ts
+            if 0 < dt < 3600:
+                h = dt / 3600
+                pv = max(0, (d.get('pv', 0) + last_row.get('pv', 0)) / 2)
+                grid = (d.get('grid', 0) + last_row.get('grid', 0)) / 2
+                bat = (d.get('bat', 0) + last_row.get('bat', 0)) / 2
+                home = max(0, (d.get('home', 0) + last_row.get('home', 0)) / 2)
+                wb = max(0, (d.get('wb', 0) + last_row.get('wb', 0)) / 2)
+                wp = max(0, (d.get('wp', 0) + last_row.get('wp', 0)) / 2)
+
+                grid_in, grid_out = max(0, grid), max(0, -grid)
+                bat_in, bat_out = max(0, bat), max(0, -bat)
+                loads = home + wb + wp
+
+                st['total_consumption'] += (loads * h) / 1000
+                st['total_pv'] += (pv * h) / 1000
+                st['total_grid_in'] += (grid_in * h) / 1000
+                st['total_grid_out'] += (grid_out * h) / 1000
+                st['total_bat_out'] += (bat_out * h) / 1000
+
+                pv_to_loads = min(pv, loads)
+                pv_to_bat = min(pv - pv_to_loads, bat_in)
+                pv_to_grid = max(0, pv - pv_to_loads - pv_to_bat)
+                st['pv_bat_kwh'] += (pv_to_bat * h) / 1000
+                st['pv_grid_kwh'] += (pv_to_grid * h) / 1000
+                if loads > 0:
+                    st['pv_home_kwh'] += (pv_to_loads * (home / loads) * h) / 1000
+                    st['pv_wb_kwh'] += (pv_to_loads * (wb / loads) * h) / 1000
+                    st['pv_wp_kwh'] += (pv_to_loads * (wp / loads) * h) / 1000
+
+                grid_to_bat = max(0, bat_in - pv)
+                grid_to_loads = max(0, grid_in - grid_to_bat)
+                st['grid_bat_kwh'] += (grid_to_bat * h) / 1000
+                if loads > 0:
+                    st['grid_home_kwh'] += (grid_to_loads * (home / loads) * h) / 1000
+                    st['grid_wb_kwh'] += (grid_to_loads * (wb / loads) * h) / 1000
+                    st['grid_wp_kwh'] += (grid_to_loads * (wp / loads) * h) / 1000
+
+                if bat_out > 0 and loads > 0:
+                    st['bat_home_kwh'] += (bat_out * (home / loads) * h) / 1000
+                    st['bat_wb_kwh'] += (bat_out * (wb / loads) * h) / 1000
+                    st['bat_wp_kwh'] += (bat_out * (wp / loads) * h) / 1000
+        last_ts, last_row = ts, d
+
+    total_pv = max(0.001, st['total_pv'])
+    total_grid_in = st['total_grid_in']
+    total_grid_out = st['total_grid_out']
+    total_cons = max(0.001, st['total_consumption'])
+    total_bat_out = max(0.001, st['total_bat_out'])
+    res = {
+        'pv_today_kwh': round(st['total_pv'], 2),
+        'autarky_day': round(max(0, min(100, ((total_cons - total_grid_in) / total_cons) * 100)), 1),
+        'selfcon_day': round(max(0, min(100, ((total_pv - total_grid_out) / total_pv) * 100)), 1),
+        'stats': {},
+    }
+    res['stats']['total_pv_kwh'] = round(total_pv, 2)
+    res['stats']['total_grid_in_kwh'] = round(total_grid_in, 2)
+    res['stats']['total_bat_out_kwh'] = round(total_bat_out, 2)
+    for key in ('home', 'bat', 'wb', 'wp', 'grid'):
+        val = st[f'pv_{key}_kwh']
+        res['stats'][f'pv_{key}_kwh'] = round(val, 2)
+        res['stats'][f'pv_{key}_pct'] = round((val / total_pv) * 100)
+    total_grid_in_safe = max(0.001, total_grid_in)
+    for key in ('home', 'bat', 'wb', 'wp'):
+        val = st[f'grid_{key}_kwh']
+        res['stats'][f'grid_{key}_kwh'] = round(val, 2)
+        res['stats'][f'grid_{key}_pct'] = round((val / total_grid_in_safe) * 100)
+    for key in ('home', 'wb', 'wp'):
+        val = st[f'bat_{key}_kwh']
+        res['stats'][f'bat_{key}_kwh'] = round(val, 2)
+        res['stats'][f'bat_{key}_pct'] = round((val / total_bat_out) * 100)
+    return st, res
+
+
+def _samples(seed=3, days=2):
+    """Minutenwerte ab dem Vortag von DAY, mit einer Lücke; Wallbox alle 2 h an- bzw. abgesteckt."""
+    rng = random.Random(seed)
+    t0 = day_bounds(date.fromordinal(DAY.toordinal() - days + 1))[0]
+    samples, lines = [], []
+    locked = False
+    for i in range(0, days * 86400 - 7200, 60):
+        if i % 7200 == 0: locked = not locked
+        s = {'pv': max(0.0, rng.gauss(2000, 2500)), 'grid': rng.gauss(0, 3000), 'bat': rng.gauss(0, 2000),
+             'home': abs(rng.gauss(600, 300)), 'wb': 11000.0 if locked and rng.random() < 0.7 else 0.0,
+             'wp': abs(rng.gauss(500, 400)), 'wb_locked': locked}
+        if 86400 + 3000 <= i < 86400 + 7000: continue   # gut eine Stunde ohne Werte
+        ts = t0 + i
+        samples.append((ts, s))
+        lines.append(json.dumps(dict(s, ts=datetime.fromtimestamp(ts).astimezone().isoformat(timespec='seconds'))))
+    return samples, lines
+
+
+def test_matches_php():
+    samples, lines = _samples()
+    stats = DailyEnergyStats()
+    for ts, s in samples: stats.add(ts, s)
+    assert stats.day == DAY
+    ref_acc, ref = php_daily_stats(lines)
+    for key in ACC_KEYS:
+        assert abs(stats.acc[key] - ref_acc[key]) <= 1e-9 * max(1.0, abs(ref_acc[key])), key
+    assert stats.result() == ref
+    assert ref['stats']['bat_wb_kwh'] > 0 and ref['stats']['grid_bat_kwh'] > 0
+
+
+def test_midnight_reset_and_order():
+    t0 = day_bounds(DAY)[0]
+    stats = DailyEnergyStats()
+    assert stats.add(t0 - 60, {'pv': 1000})
+    assert stats.add(t0 + 60, {'pv': 1000})
+    # neuer Tag beginnt ohne Intervall über Mitternacht
+    assert stats.day == DAY and stats.samples == 1 and stats.acc['total_pv'] == 0.0
+    assert not stats.add(t0 + 60, {'pv': 1000})
+    assert stats.add(t0 + 1860, {'pv': 1000, 'home': None})
+    assert stats.acc['total_pv'] == 0.5 and stats.acc['pv_grid_kwh'] == 0.5
+
+
+def test_wallbox_session():
+    wb = WallboxSession()
+    t0 = 1000.0
+    assert wb.add(t0, False, 0.0) is None
+    assert wb.add(t0 + 60, True, 0.0) == {'event': 'start', 'ts': t0 + 60}
+    assert wb.add(t0 + 1860, True, 11000.0) is None
+    assert wb.add(t0 + 3660, True, 11000.0) is None
+    stop = wb.add(t0 + 3720, False, 0.0)
+    assert stop == {'event': 'stop', 'ts': t0 + 3720, 'start': t0 + 60, 'end': t0 + 3660, 'kwh': 8.25}
+    assert wb.result() == {'locked': False, 'start': None, 'kwh': 0.0, 'last': wb.last_session}
+
+
+def test_engine_events_and_restart(tmp_path):
+    samples, _ = _samples(days=1)
+    stats_file, events_file = str(tmp_path / "daily_energy.json"), str(tmp_path / "wb_events.jsonl")
+    engine = DailyStatsEngine(stats_file, events_file)
+    events = []
+    engine.on_event = events.append
+    half = len(samples) // 2
+    for ts, s in samples[:half]: engine.add(ts, s)
+    engine.publish()
+
+    # Neustart: Zwischenstand laden und mit den restlichen Werten fortsetzen
+    resumed = DailyStatsEngine(stats_file, events_file)
+    assert resumed.load()
+    resumed.on_event = events.append
+    for ts, s in samples[half:]: resumed.add(ts, s)
+    for ts, s in samples[half:]: engine.add(ts, s, emit=False)
+    assert resumed.result() == engine.result()
+
+    with open(events_file) as f:
+        logged = [json.loads(ln) for ln in f]
+    assert logged == events
+    assert [e['event'] for e in events] == ['start', 'stop'] * (len(events) // 2) + ['start'] * (len(events) % 2)
+
+    assert not DailyStatsEngine(str(tmp_path / "fehlt.json"), events_file).load()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Tests für das spaltenbasierte Tagesarchiv (history_archive.py)
+
+Prüft Schreiben und Lesen (int16- und float32-Spalten, fehlende Werte,
+Teilmengen von Kanälen), die Tageswerte im Kopf und die Umwandlung eines
+JSON-Lines-Backups ohne Verlust gegenüber der Ausgangsdatei.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+from datetime import date
+
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LUXTRONIK_DIR = os.path.join(SCRIPT_DIR, "Installer", "luxtronik")
+if LUXTRONIK_DIR not in sys.path:
+    sys.path.insert(0, LUXTRONIK_DIR)
+
+from history_archive import (DailyArchive, write_archive, archive_path, day_bounds, integrate_wh,
+                             columns_from_jsonl, convert, prune, MAX_GAP)
+from live_ring import iso_ts
+
+DAY = date(2026, 10, 16)
+NAN = math.nan
+
+
+def _same(a, b):
+    return len(a) == len(b) and all((math.isnan(x) and math.isnan(y)) or x == y for x, y in zip(a, b))
+
+
+def _day_columns(n=240):
+    t0 = day_bounds(DAY)[0]
+    ts = [t0 + 60 * i for i in range(n)]
+    columns = {
+        'pv': [float((i * 37) % 5000) for i in range(n)],
+        'grid': [float(-2000 + (i * 53) % 4000) for i in range(n)],
+        'soc': [round(20 + i * 0.3, 1) % 100 for i in range(n)],
+        'price_ct': [NAN if i % 50 == 0 else round(25.17 + (i % 7) * 0.01, 2) for i in range(n)],
+        'wb_locked': [float(i // 100 % 2) for i in range(n)],
+        'dc0_w': [1.0e6 + i for i in range(n)],   # passt nicht in int16 -> float32
+    }
+    return ts, columns
+
+
+def test_write_and_load(tmp_path):
+    ts, columns = _day_columns()
+    path = archive_path(DAY, str(tmp_path))
+    header = write_archive(path, DAY, ts, columns)
+    assert header["count"] == len(ts)
+
+    arc = DailyArchive(path)
+    kinds = {name: arc.columns[name]["type"] for name in arc.channels}
+    assert kinds == {'pv': 'i2', 'grid': 'i2', 'soc': 'i2', 'price_ct': 'i2', 'wb_locked': 'i2', 'dc0_w': 'f4'}
+    cols = arc.load()
+    assert cols['ts'] == ts
+    for name in ('pv', 'grid', 'soc', 'price_ct', 'wb_locked', 'dc0_w'):
+        assert _same(cols[name], columns[name]), name
+
+    part = arc.load(['grid', 'unbekannt'], with_ts=False)
+    assert list(part) == ['grid'] and _same(part['grid'], columns['grid'])
+
+
+def test_header_stats(tmp_path):
+    t0 = day_bounds(DAY)[0]
+    # 1 h konstant 1000 W Bezug, dann 2 h Lücke, dann 30 min 2000 W Einspeisung
+    ts = [t0 + 60 * i for i in range(61)] + [t0 + 3 * 3600 + 60 * i for i in range(31)]
+    grid = [1000.0] * 61 + [-2000.0] * 31
+    write_archive(archive_path(DAY, str(tmp_path)), DAY, ts, {'grid': grid})
+    st = DailyArchive(archive_path(DAY, str(tmp_path))).stats['grid']
+    assert st['kwh'] == 1.0 and st['kwh_neg'] == 1.0
+    assert st['min'] == -2000.0 and st['max'] == 1000.0 and st['n'] == 92
+
+
+def test_integrate_wh():
+    assert integrate_wh([0, 1800], [100.0, 300.0]) == (100.0, 0.0)
+    assert integrate_wh([0, 1800, 3600], [-100.0, -100.0, NAN]) == (0.0, 50.0)
+    # Lücken ab MAX_GAP zählen nicht
+    assert integrate_wh([0, MAX_GAP], [100.0, 100.0]) == (0.0, 0.0)
+
+
+def test_convert_jsonl_roundtrip(tmp_path):
+    ts, columns = _day_columns(120)
+    lines = []
+    for i, t in enumerate(ts):
+        e = {'ts': iso_ts(t), 'pv': columns['pv'][i], 'grid': columns['grid'][i], 'soc': columns['soc'][i],
+             'price_ct': None if math.isnan(columns['price_ct'][i]) else columns['price_ct'][i],
+             'wb_locked': bool(columns['wb_locked'][i])}
+        lines.append(e)
+    src = tmp_path / f"history_{DAY.isoformat()}.txt"
+    # Reihenfolge vertauscht und eine Zeile doppelt, wie bei zweimal gesicherten Backups
+    src.write_text("\n".join(json.dumps(e, separators=(',', ':')) for e in lines[60:] + lines[:61]) + "\n")
+
+    t_col, cols = columns_from_jsonl(str(src))
+    assert t_col == ts
+    done = convert(str(tmp_path))
+    assert done == [(str(src), archive_path(DAY, str(tmp_path)))]
+    assert convert(str(tmp_path)) == []
+
+    # Kanäle, die in der Quelle fehlen, stehen auch im Export nicht in den Zeilen
+    assert DailyArchive(archive_path(DAY, str(tmp_path))).entries() == lines
+
+
+def test_bad_file(tmp_path):
+    path = tmp_path / "history_2026-01-01.col"
+    path.write_bytes(b"JUNK" + b"\0" * 16)
+    with pytest.raises(ValueError):
+        DailyArchive(str(path))
+
+
+def test_prune(tmp_path):
+    ts, columns = _day_columns(10)
+    old = archive_path(date(2026, 1, 1), str(tmp_path))
+    new = archive_path(DAY, str(tmp_path))
+    write_archive(old, date(2026, 1, 1), ts, columns)
+    write_archive(new, DAY, ts, columns)
+    past = time.time() - 40 * 86400
+    os.utime(old, (past, past))
+    assert prune(str(tmp_path)) == 1
+    assert not os.path.exists(old) and os.path.exists(new)
+
+
+def test_as_numpy(tmp_path):
+    np = pytest.importorskip("numpy")
+    ts, columns = _day_columns()
+    path = archive_path(DAY, str(tmp_path))
+    write_archive(path, DAY, ts, columns)
+    arc = DailyArchive(path)
+    cols = arc.load()
+    arr = arc.as_numpy(['soc', 'price_ct', 'dc0_w'])
+    assert list(arr['ts']) == cols['ts']
+    for name in ('soc', 'price_ct', 'dc0_w'):
+        assert np.allclose(arr[name], cols[name], equal_nan=True, rtol=1e-6)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Tests für den Ringpuffer der Live-History (live_ring.py)
+
+Prüft Überlauf am Pufferende, Zeitbereiche, das Seqlock-Protokoll zwischen
+Schreiber und Leser, die Wiederherstellung nach abgebrochenem append() und
+Export/Import im Format der live_history.txt.
+"""
+
+import io
+import os
+import sys
+import json
+import math
+
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LUXTRONIK_DIR = os.path.join(SCRIPT_DIR, "Installer", "luxtronik")
+if LUXTRONIK_DIR not in sys.path:
+    sys.path.insert(0, LUXTRONIK_DIR)
+
+import live_ring
+from live_ring import LiveRing, RingBusy
+
+CHANNELS = ('pv', 'grid', 'price_ct', 'wb_locked')
+
+
+def _ring(tmp_path, capacity=5, channels=CHANNELS):
+    return LiveRing(str(tmp_path / "test.ring"), writable=True, capacity=capacity, channels=channels)
+
+
+def _fill(ring, n, t0=1000.0):
+    for i in range(n):
+        assert ring.append(t0 + 60 * i, {'pv': i, 'grid': -i, 'price_ct': 20 + i, 'wb_locked': i % 2})
+
+
+def test_append_and_wraparound(tmp_path):
+    ring = _ring(tmp_path)
+    assert len(ring) == 0 and ring.last_ts() is None
+    _fill(ring, 12)
+    assert len(ring) == 5
+    rows = ring.rows()
+    assert [r[0] for r in rows] == [1000.0 + 60 * i for i in range(7, 12)]
+    assert [r[1] for r in rows] == [7.0, 8.0, 9.0, 10.0, 11.0]
+    assert ring.first_ts() == 1420.0 and ring.last_ts() == 1660.0
+    # Zeitbereich über das physische Pufferende hinweg (Sätze 9..10)
+    assert [r[1] for r in ring.rows(1540.0, 1660.0)] == [9.0, 10.0]
+    assert ring.rows(2000.0) == []
+    ring.close()
+
+
+def test_append_rejects_old_timestamps(tmp_path):
+    ring = _ring(tmp_path)
+    _fill(ring, 2)
+    assert not ring.append(1060.0, {'pv': 1})
+    assert not ring.append(1000.0, {'pv': 1})
+    assert len(ring) == 2
+    ring.close()
+
+
+def test_missing_values_are_nan(tmp_path):
+    ring = _ring(tmp_path)
+    ring.append(1.0, {'pv': 'x', 'grid': None})
+    row = ring.rows()[0]
+    assert all(math.isnan(v) for v in row[1:])
+    ring.close()
+
+
+def test_reader_sees_writer(tmp_path):
+    writer = _ring(tmp_path)
+    reader = LiveRing(writer.path)
+    _fill(writer, 3)
+    assert len(reader) == 3 and reader.last_ts() == 1120.0
+    reader.close()
+    writer.close()
+
+
+def test_seqlock_busy(tmp_path):
+    writer = _ring(tmp_path)
+    _fill(writer, 2)
+    reader = LiveRing(writer.path)
+    head, tail, count, seq = live_ring._STATE.unpack_from(writer.mm, live_ring._STATE_OFFSET)
+    # Schreiber steht mitten in append() (seq ungerade)
+    live_ring._STATE.pack_into(writer.mm, live_ring._STATE_OFFSET, head, tail, count, seq + 1)
+    with pytest.raises(RingBusy):
+        reader.rows()
+    reader.close()
+    writer.close()
+
+
+def test_seqlock_retries_after_concurrent_append(tmp_path):
+    writer = _ring(tmp_path)
+    _fill(writer, 5)
+    reader = LiveRing(writer.path)
+    calls = []
+
+    def read(tail, count):
+        # Beim ersten Versuch schreibt der Grabber dazwischen (Puffer voll -> ältester Satz weg)
+        if not calls: writer.append(5000.0, {'pv': 99})
+        calls.append((tail, count))
+        return [reader._ts(tail, i) for i in range(count)]
+
+    result = reader._read(read)
+    assert len(calls) == 2
+    assert result[-1] == 5000.0 and result[0] == 1060.0
+    reader.close()
+    writer.close()
+
+
+def test_recover_interrupted_append(tmp_path):
+    ring = _ring(tmp_path)
+    _fill(ring, 7)
+    head, tail, count, seq = live_ring._STATE.unpack_from(ring.mm, live_ring._STATE_OFFSET)
+    live_ring._STATE.pack_into(ring.mm, live_ring._STATE_OFFSET, head, tail, count, seq + 1)
+    ring.close()
+    # Beim nächsten Öffnen: ältester (evtl. halb überschriebener) Satz wird verworfen
+    ring = _ring(tmp_path)
+    assert len(ring) == 4
+    assert [r[1] for r in ring.rows()] == [3.0, 4.0, 5.0, 6.0]
+    assert ring.append(9999.0, {'pv': 1})
+    ring.close()
+
+
+def test_layout_change_starts_new_ring(tmp_path):
+    ring = _ring(tmp_path)
+    _fill(ring, 3)
+    ring.close()
+    ring = _ring(tmp_path, capacity=10)
+    assert ring.capacity == 10 and len(ring) == 0
+    ring.close()
+    with open(tmp_path / "other.ring", 'wb') as f: f.write(b'x' * 64)
+    with pytest.raises(ValueError):
+        LiveRing(str(tmp_path / "other.ring"))
+
+
+def test_export_import_roundtrip(tmp_path):
+    ring = _ring(tmp_path)
+    _fill(ring, 3)
+    ring.append(2000.0, {'pv': 12.34, 'grid': 5})
+    buf = io.StringIO()
+    assert ring.export_jsonl(buf) == 4
+    lines = buf.getvalue().splitlines()
+    first, last = json.loads(lines[0]), json.loads(lines[-1])
+    assert first['pv'] == 0.0 and first['price_ct'] == 20.0 and first['wb_locked'] is False
+    # fehlender Preis steht wie bei PHP als null in der Zeile, andere Kanäle entfallen
+    assert last['pv'] == 12.34 and last['price_ct'] is None and 'wb_locked' not in last
+    assert '": ' not in lines[0]
+
+    path = tmp_path / "live_history.txt"
+    path.write_text(buf.getvalue() + "kein json\n")
+    copy = LiveRing(str(tmp_path / "copy.ring"), writable=True, capacity=5, channels=CHANNELS)
+    assert copy.import_jsonl(str(path)) == 4
+    # ISO-Zeitstempel haben Sekundenauflösung
+    assert [r[0] for r in copy.rows()] == [r[0] for r in ring.rows()]
+    assert copy.entries() == ring.entries()
+    assert copy.import_jsonl(str(path)) == 0
+    copy.close()
+    ring.close()
+
+
+def test_as_array_wraparound(tmp_path):
+    np = pytest.importorskip("numpy")
+    ring = _ring(tmp_path)
+    _fill(ring, 8)
+    a = ring.as_array()
+    assert list(a['ts']) == [r[0] for r in ring.rows()]
+    assert list(a['pv']) == [3.0, 4.0, 5.0, 6.0, 7.0]
+    assert len(ring.as_array(1240.0, 1420.0)) == 3
+    del a
+    ring.close()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Tests für die Prüfung der Modbus-TCP-Rahmen (mbap.py)
+
+Prüft decode_header()/decode_pdu() mit fehlerhaften Antworten, die
+Behandlung fremder Unit- und Transaktions-IDs in ModbusSession und beide
+Clients (blockierend und asyncio) gegen den lokalen Simulator.
+"""
+
+import os
+import sys
+import time
+import socket
+import struct
+import asyncio
+
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LUXTRONIK_DIR = os.path.join(SCRIPT_DIR, "Installer", "luxtronik")
+if LUXTRONIK_DIR not in sys.path:
+    sys.path.insert(0, LUXTRONIK_DIR)
+
+from mbap import (MBAP, build_request, decode_header, decode_pdu, ModbusFrameError,
+                  ModbusExceptionResponse, ModbusConnectionError)
+from modbus_session import ModbusSession
+
+
+def _frame(tid, pdu, unit=1, protocol=0):
+    return MBAP.pack(tid, protocol, len(pdu) + 1, unit) + pdu
+
+
+def _session_with_peer():
+    """ModbusSession auf einem Socket-Paar; die Gegenseite spielt die WP."""
+    session = ModbusSession('127.0.0.1', min_gap=0)
+    ours, peer = socket.socketpair()
+    ours.settimeout(1.0)
+    session.sock = ours
+    session.last_used = time.monotonic()
+    return session, peer
+
+
+def test_build_request():
+    assert build_request(7, 1, 4, 10100, 22) == bytes.fromhex("0007 0000 0006 01 04 2774 0016")
+
+
+def test_decode_header():
+    assert decode_header(MBAP.pack(5, 0, 7, 1)) == (5, 6, 1)
+    with pytest.raises(ModbusFrameError):
+        decode_header(MBAP.pack(5, 1, 7, 1))
+    with pytest.raises(ModbusFrameError):
+        decode_header(MBAP.pack(5, 0, 1, 1))
+    with pytest.raises(ModbusFrameError):
+        decode_header(MBAP.pack(5, 0, 300, 1))
+
+
+def test_decode_pdu_registers():
+    assert decode_pdu(4, 10000, 2, bytes([4, 4, 0, 1, 0x12, 0x34])) == (1, 0x1234)
+    # Byte-Anzahl passt nicht zur angefragten Registerzahl
+    with pytest.raises(ModbusFrameError):
+        decode_pdu(4, 10000, 3, bytes([4, 4, 0, 1, 0, 2]))
+    # Byte-Anzahl stimmt, Rahmen ist aber abgeschnitten
+    with pytest.raises(ModbusFrameError):
+        decode_pdu(4, 10000, 2, bytes([4, 4, 0, 1, 0]))
+    with pytest.raises(ModbusFrameError):
+        decode_pdu(4, 10000, 2, bytes([4]))
+    # Antwort mit anderem Funktionscode
+    with pytest.raises(ModbusFrameError):
+        decode_pdu(4, 10000, 2, bytes([3, 4, 0, 1, 0, 2]))
+
+
+def test_decode_pdu_exception():
+    with pytest.raises(ModbusExceptionResponse) as err:
+        decode_pdu(4, 10000, 2, bytes([0x84, 2]))
+    assert err.value.code == 2 and err.value.function == 4
+    with pytest.raises(ModbusFrameError):
+        decode_pdu(4, 10000, 2, bytes([0x84, 2, 0]))
+
+
+def test_decode_pdu_write_echo():
+    assert decode_pdu(6, 10005, 1, struct.pack('>BHH', 6, 10005, 1)) is True
+    with pytest.raises(ModbusFrameError):
+        decode_pdu(6, 10005, 1, struct.pack('>BHH', 6, 10005, 0))
+    with pytest.raises(ModbusFrameError):
+        decode_pdu(6, 10005, 1, struct.pack('>BHH', 6, 10006, 1))
+    with pytest.raises(ModbusFrameError):
+        decode_pdu(6, 10005, 1, struct.pack('>BH', 6, 10005))
+
+
+def test_session_wrong_unit():
+    session, peer = _session_with_peer()
+    peer.sendall(_frame(1, bytes([4, 2, 0, 7]), unit=2))
+    with pytest.raises(ModbusFrameError):
+        session.request(4, 10000, 1)
+    assert session.sock is None
+    assert session.stats["frame_errors"] == 1
+    peer.close()
+
+
+def test_session_skips_stale_frame():
+    session, peer = _session_with_peer()
+    # Verspätete Antwort einer früheren Anfrage (fremde Transaktions-ID), dann die richtige
+    peer.sendall(_frame(99, bytes([4, 2, 0, 1])) + _frame(1, bytes([4, 2, 0, 7])))
+    assert session.request(4, 10000, 1) == (7,)
+    assert session.stats["stale_frames"] == 1
+    session.close()
+    peer.close()
+
+
+def test_session_exception_keeps_connection():
+    session, peer = _session_with_peer()
+    peer.sendall(_frame(1, bytes([0x84, 2])))
+    with pytest.raises(ModbusExceptionResponse):
+        session.request(4, 10000, 1)
+    assert session.sock is not None
+    session.close()
+    peer.close()
+
+
+def test_session_closed_by_peer():
+    session, peer = _session_with_peer()
+    peer.close()
+    with pytest.raises(ModbusConnectionError):
+        session.request(4, 10000, 1)
+    assert session.sock is None
+
+
+def test_clients_simulator():
+    """Blockierender und asyncio-Client lesen dasselbe, Schreiben wird zurückgelesen."""
+    from luxtronik import LuxtronikModbus
+    from luxtronik_async import AsyncLuxtronikModbus
+    from luxtronik_sim import start_background
+
+    sim, port = start_background(speed=0.0, min_gap=0.0, seed=1)
+    client = LuxtronikModbus('127.0.0.1', port, min_gap=0.0)
+    results, readback = client.write_shi([(10006, 550), (10005, 1)])
+    assert results == [True, True]
+    assert readback[10005] == 1 and readback[10006] == 550
+    sensors = client.read_all_sensors()
+    assert sensors['Warmwasser_Soll'] == 55.0
+    # Modus > 2 lehnt die WP mit Exception 3 ab
+    assert client.write_register(10005, 7) is False
+    assert client.last_exception == 3
+    client.close()
+
+    async def run():
+        aclient = AsyncLuxtronikModbus('127.0.0.1', port, min_gap=0.0)
+        data = await aclient.read_all_sensors()
+        status = await aclient.read_shi_status()
+        ok = await aclient.write_register(10000, 9)
+        aclient.close()
+        return data, status, ok, aclient.last_exception
+
+    data, status, ok, exc = asyncio.run(run())
+    assert data == sensors
+    assert status['WW_Mode'] == 1 and status['WW_Setpoint'] == 55.0
+    assert ok is False and exc == 3
+
+
+def test_async_scan_ignores_concurrent_write_exception():
+    """Eine abgelehnte Schreibanfrage darf einen Block mit Zeitüberschreitung nicht als abgelehnt markieren."""
+    from luxtronik_async import AsyncLuxtronikModbus
+
+    client = AsyncLuxtronikModbus('127.0.0.1', min_gap=0.0)
+
+    async def request(func_code, addr, val_or_count):
+        # Schreiben ist fertig, während der Lesezugriff noch auf die WP wartet
+        await asyncio.sleep(0.02 if func_code == 4 else 0.01)
+        if func_code == 6: raise ModbusExceptionResponse(6, 3)
+        if (addr, val_or_count) == (10100, 22): raise ModbusConnectionError("Timeout")
+        return (0,) * val_or_count
+
+    async def run():
+        client.request = request
+        scan = asyncio.ensure_future(client._scan([(10000, 2), (10100, 22)]))
+        assert await client.write_register(10005, 7) is False
+        return await scan
+
+    values = asyncio.run(run())
+    assert client.rejected_blocks == set()
+    assert client.last_exception == 3
+    assert 10100 in values and 10000 in values
+
+
+def test_async_concurrent_connect():
+    """Gleichzeitige Abfrage und Schreiben bauen nur eine Verbindung auf."""
+    from luxtronik_async import AsyncLuxtronikModbus
+    from luxtronik_sim import start_background
+
+    sim, port = start_background(speed=0.0, min_gap=0.0, seed=1)
+
+    async def run():
+        aclient = AsyncLuxtronikModbus('127.0.0.1', port, min_gap=0.0)
+        connected = await asyncio.gather(aclient.connect(), aclient.write_register(10006, 500), aclient.connect())
+        aclient.close()
+        return connected, aclient.stats["connects"]
+
+    connected, connects = asyncio.run(run())
+    assert connected == [True, True, True]
+    assert connects == 1
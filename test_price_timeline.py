@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Tests für die Preis-Zeitleiste (price_timeline.py)
+
+Vergleicht anchor_start_ts(), blocks() und action_at() mit der bisherigen
+Preis-Logik des Energy Managers (get_price_action() und die Stundendifferenz
+aus decide(), unten unverändert übernommen).
+"""
+
+import os
+import sys
+import time
+import math
+import random
+import calendar
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LUXTRONIK_DIR = os.path.join(SCRIPT_DIR, "Installer", "luxtronik")
+if LUXTRONIK_DIR not in sys.path:
+    sys.path.insert(0, LUXTRONIK_DIR)
+
+from price_timeline import PriceTimeline, anchor_start_ts
+
+
+def legacy_price_action(prices, start_hour, interval, limit, min_duration_min, current_idx_float):
+    """get_price_action() aus dem Energy Manager vor der Zeitleiste."""
+    if not prices:
+        return "NONE"
+    min_slots = int(math.ceil(min_duration_min / 60.0 / interval))
+    cheap_blocks = []
+    current_block = []
+    for i, p in enumerate(prices):
+        if p <= limit:
+            current_block.append(i)
+        else:
+            if len(current_block) >= min_slots:
+                cheap_blocks.append((current_block[0], current_block[-1]))
+            current_block = []
+    if len(current_block) >= min_slots:
+        cheap_blocks.append((current_block[0], current_block[-1]))
+    for start_idx, end_idx in cheap_blocks:
+        if start_idx <= current_idx_float < (end_idx + 1):
+            return "BOOST"
+        slots_1h = 1.0 / interval
+        if (start_idx - slots_1h) <= current_idx_float < start_idx:
+            return "PAUSE"
+    return "NONE"
+
+
+def legacy_h_diff(now, start_hour):
+    """Stunden seit Beginn der Preisliste wie bisher in decide() (GMT, minutengenau)."""
+    gmt = time.gmtime(now)
+    now_gmt = gmt.tm_hour + gmt.tm_min / 60.0
+    h_diff = now_gmt - start_hour
+    if h_diff < -12: h_diff += 24
+    if h_diff > 36: h_diff -= 24
+    return h_diff
+
+
+def test_anchor_start_ts():
+    now = calendar.timegm((2026, 3, 10, 14, 30, 0))
+    assert anchor_start_ts(13, now) == calendar.timegm((2026, 3, 10, 13, 0, 0))
+    # Liste beginnt gleich nach Mitternacht GMT (höchstens 12h in der Zukunft)
+    assert anchor_start_ts(23, calendar.timegm((2026, 3, 10, 1, 0, 0))) == calendar.timegm((2026, 3, 9, 23, 0, 0))
+    assert anchor_start_ts(2, calendar.timegm((2026, 3, 10, 23, 0, 0))) == calendar.timegm((2026, 3, 10, 2, 0, 0))
+    assert anchor_start_ts(0, now) == calendar.timegm((2026, 3, 10, 0, 0, 0))
+
+
+def test_anchor_matches_legacy_h_diff():
+    rng = random.Random(5)
+    base = calendar.timegm((2026, 1, 1, 0, 0, 0))
+    for _ in range(2000):
+        now = base + rng.randrange(0, 400 * 86400, 60)
+        start_hour = rng.randrange(0, 24)
+        assert abs((now - anchor_start_ts(start_hour, now)) / 3600.0 - legacy_h_diff(now, start_hour)) < 1e-9
+
+
+def test_blocks():
+    tl = PriceTimeline([30, 10, 10, 30, 10, 30, 10, 10, 10], 0, 1.0, now=0)
+    assert tl.blocks(20, 60) == [(1, 2), (4, 4), (6, 8)]
+    assert tl.blocks(20, 120) == [(1, 2), (6, 8)]
+    assert tl.blocks(20, 60, cheap=False) == [(0, 0), (3, 3), (5, 5)]
+    assert tl.blocks(5, 60) == []
+
+
+def test_next_block():
+    tl = PriceTimeline([30, 10, 10, 30], 0, 1.0, now=0)
+    assert tl.next_block(20, 60, t=0) == (3600, 3 * 3600)
+    assert tl.next_block(20, 60, t=5400) == (3600, 3 * 3600)
+    assert tl.next_block(20, 60, t=3 * 3600) is None
+
+
+def test_build_reuses_previous():
+    tl = PriceTimeline.build([1, 2, 3], 5, 1.0, now=0)
+    assert PriceTimeline.build([1, 2, 3], 5, 1.0, tl) is tl
+    assert PriceTimeline.build([1, 2, 4], 5, 1.0, tl) is not tl
+    assert PriceTimeline.build([1, 2, 3], 5, 0.25, tl) is not tl
+    assert PriceTimeline.build([], 5, 1.0, tl) is None
+
+
+def test_action_matches_legacy():
+    rng = random.Random(7)
+    base = calendar.timegm((2026, 1, 1, 0, 0, 0))
+    for _ in range(300):
+        interval = rng.choice((1.0, 0.25))
+        prices = [round(rng.uniform(-2, 40), 2) for _ in range(rng.randrange(1, int(36 / interval)))]
+        start_hour = rng.randrange(0, 24)
+        day = base + rng.randrange(0, 300) * 86400
+        tl = PriceTimeline(prices, start_hour, interval, now=day + start_hour * 3600)
+        for _ in range(20):
+            now = day + rng.randrange(-6 * 3600, 36 * 3600, 60)
+            limit = rng.uniform(0, 40)
+            min_duration = rng.choice((15, 30, 60, 90, 120))
+            idx = legacy_h_diff(now, start_hour) / interval
+            # Die Zeitleiste ist beim Aufbau verankert; verglichen wird nur, solange der Anker gleich bleibt
+            if anchor_start_ts(start_hour, now) != tl.start_ts: continue
+            assert tl.action_at(limit, min_duration, t=now) == \
+                legacy_price_action(prices, start_hour, interval, limit, min_duration, idx)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Tests für den Leseplaner der Luxtronik-Sensoren (register_map.py)
+
+Prüft plan_reads(), den Rückfall von sensor_scan() auf die bisherigen
+Einzelzugriffe und read_all_sensors() gegen den lokalen Simulator.
+"""
+
+import os
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LUXTRONIK_DIR = os.path.join(SCRIPT_DIR, "Installer", "luxtronik")
+if LUXTRONIK_DIR not in sys.path:
+    sys.path.insert(0, LUXTRONIK_DIR)
+
+from register_map import (REGISTER_MAP, LEGACY_LAYOUT, register_addresses, plan_reads,
+                          legacy_blocks_overlapping, sensor_scan, decode_registers)
+
+
+def _run_scan(plan, rejected, registers, reject=()):
+    """Treibt sensor_scan() mit einem Register-Dictionary; Blöcke aus reject werden mit Exception 2 abgelehnt."""
+    requests = []
+    scan = sensor_scan(plan, rejected)
+    try:
+        start, count = next(scan)
+        while True:
+            requests.append((start, count))
+            if (start, count) in reject:
+                reply = (None, 2)
+            else:
+                reply = ([registers.get(a, 0) for a in range(start, start + count)], None)
+            start, count = scan.send(reply)
+    except StopIteration as done:
+        return done.value, requests
+
+
+def test_plan_reads_merges_gaps():
+    assert plan_reads([1, 2, 3]) == [(1, 3)]
+    assert plan_reads([1, 10], max_gap=8) == [(1, 10)]
+    assert plan_reads([1, 11], max_gap=8) == [(1, 1), (11, 1)]
+    assert plan_reads([3, 1, 2, 2]) == [(1, 3)]
+    assert plan_reads([]) == []
+
+
+def test_plan_reads_max_len():
+    assert plan_reads(range(10), max_gap=0, max_len=4) == [(0, 4), (4, 4), (8, 2)]
+
+
+def test_plan_covers_register_map():
+    addrs = register_addresses()
+    plan = plan_reads(addrs)
+    covered = {a for start, count in plan for a in range(start, start + count)}
+    assert set(addrs) <= covered
+    # u32-Zähler belegen zwei Register
+    assert {10310, 10311, 10320, 10321} <= set(addrs)
+    assert len(plan) < len(LEGACY_LAYOUT)
+
+
+def test_legacy_blocks_overlapping():
+    assert legacy_blocks_overlapping(10100, 22) == [(10100, 7), (10108, 4), (10120, 2)]
+    assert legacy_blocks_overlapping(10400, 5) == []
+
+
+def test_sensor_scan_fallback():
+    registers = {a: a - 10000 for a in register_addresses()}
+    plan = plan_reads(register_addresses())
+    expected, _ = _run_scan(plan, set(), registers)
+
+    rejected = set()
+    values, requests = _run_scan(plan, rejected, registers, reject={(10100, 22)})
+    assert rejected == {(10100, 22)}
+    assert (10100, 7) in requests and (10108, 4) in requests and (10120, 2) in requests
+    assert decode_registers(values) == decode_registers(expected)
+
+    # Abgelehnte Blöcke werden beim nächsten Scan gar nicht mehr angefragt
+    values, requests = _run_scan(plan, rejected, registers)
+    assert (10100, 22) not in requests
+    assert decode_registers(values) == decode_registers(expected)
+
+
+def test_sensor_scan_timeout_is_not_rejected():
+    registers = {a: 1 for a in register_addresses()}
+    plan = [(10100, 22)]
+    rejected = set()
+    scan = sensor_scan(plan, rejected)
+    assert next(scan) == (10100, 22)
+    # Keine Antwort (None, None): Einzelzugriffe, aber Block bleibt im Plan
+    assert scan.send((None, None)) == (10100, 7)
+    assert rejected == set()
+
+
+def test_decode_registers():
+    values = {10000: 3, 10100: 0xFFF6, 10310: 1, 10311: 2, 10301: 15}
+    data = decode_registers(values)
+    assert data['Verdichter_Ein'] is True
+    assert data['Ruecklauf_Ist'] == -1.0
+    assert data['Energie_Elek_kWh'] == 65538
+    assert data['Leistung_Verdichter_W'] == 1500.0
+    assert 'Energie_Waerme_kWh' not in data
+    assert len(REGISTER_MAP) == len({name for name, _, _, _ in REGISTER_MAP})
+
+
+def test_read_all_sensors_simulator():
+    """Blockzugriffe liefern dasselbe wie die bisherigen Einzelzugriffe, auch wenn die WP Blöcke ablehnt."""
+    from luxtronik import LuxtronikModbus
+    from luxtronik_sim import start_background
+
+    results = []
+    for strict in (False, True):
+        # Modellzeit steht (speed=0), damit beide Lesarten dieselben Werte sehen
+        sim, port = start_background(speed=0.0, min_gap=0.0, strict=strict, seed=1)
+        client = LuxtronikModbus('127.0.0.1', port, min_gap=0.0)
+        planned = client.read_all_sensors()
+        legacy = {}
+        for start, count in LEGACY_LAYOUT:
+            regs = client._read_block(start, count)
+            assert regs is not None
+            legacy.update(zip(range(start, start + count), regs))
+        client.close()
+        assert planned == decode_registers(legacy)
+        assert bool(client.rejected_blocks) == strict
+        results.append(planned)
+    assert set(results[0]) == set(results[1]) == {name for name, _, _, _ in REGISTER_MAP}
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests für die Verdichtungen der Live-Werte (rollups.py)
+
+Prüft Mittelwert, Minimum, Maximum und Energie abgeschlossener Intervalle
+und das Fortsetzen der offenen Intervalle nach einem Neustart über die
+Sicherung in rollup_state.json.
+"""
+
+import os
+import sys
+from datetime import date
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LUXTRONIK_DIR = os.path.join(SCRIPT_DIR, "Installer", "luxtronik")
+if LUXTRONIK_DIR not in sys.path:
+    sys.path.insert(0, LUXTRONIK_DIR)
+
+from rollups import RollupEngine, RESOLUTIONS, read_series
+from history_archive import day_bounds
+
+DAY = date(2026, 10, 16)
+
+
+def _engine(tmp_path, state=True):
+    files = {res: str(tmp_path / f"rollup_{res}.ring") for res in RESOLUTIONS}
+    return RollupEngine(files, state_file=str(tmp_path / "rollup_state.json") if state else None), files
+
+
+def _samples(n=3000, step=2):
+    t0 = day_bounds(DAY)[0]
+    return [(t0 + step * i, {'pv': float(i % 500), 'grid': float(250 - i % 500), 'soc': 50.0}) for i in range(n)]
+
+
+def test_closed_intervals(tmp_path):
+    engine, files = _engine(tmp_path)
+    t0 = day_bounds(DAY)[0]
+    for i in range(61):
+        engine.add(t0 + 2 * i, {'pv': 1000.0 if i < 30 else 3000.0, 'grid': -360.0, 'price_ct': None})
+    first = read_series('1m', path=files['1m'])[0]
+    assert first['ts'] == t0 and first['n'] == 30
+    assert first['pv_mean'] == 1000.0 and first['pv_min'] == 1000.0 and first['pv_max'] == 1000.0
+    # Werte im Ringpuffer sind gerundet
+    assert abs(first['pv_wh'] - 1000.0 * 58 / 3600) < 1e-3
+    assert first['grid_wh'] == 0.0 and abs(first['grid_wh_neg'] - 360.0 * 58 / 3600) < 1e-3
+    assert 'price_ct_mean' not in first
+    assert engine.current('1d')['n'] == 61
+    engine.close()
+
+
+def test_resume_from_checkpoint(tmp_path):
+    samples = _samples()
+    (tmp_path / "ref").mkdir()
+    ref, _ = _engine(tmp_path / "ref", state=False)
+    for ts, s in samples: ref.add(ts, s)
+
+    engine, files = _engine(tmp_path)
+    for ts, s in samples[:1234]: engine.add(ts, s)
+    engine.close()
+
+    # Neustart: ab der letzten Sicherung (Beginn der aktuellen Minute) weiter
+    resumed, _ = _engine(tmp_path)
+    assert resumed.load()
+    since = resumed.resume_from()
+    assert samples[1200][0] <= since < samples[1234][0]
+    for ts, s in samples:
+        if ts > since: resumed.add(ts, s)
+    for res in RESOLUTIONS:
+        assert resumed.current(res) == ref.current(res), res
+    assert read_series('15m', path=files['15m']) == read_series('15m', path=ref.files['15m'])
+    assert resumed.stats["duplicates"] == 0
+    resumed.close()
+    ref.close()
+
+
+def test_load_without_checkpoint(tmp_path):
+    engine, _ = _engine(tmp_path)
+    assert not engine.load()
+    (tmp_path / "rollup_state.json").write_text('{"channels": ["pv"], "open": {}}')
+    assert not engine.load()
+    assert engine.resume_from() is None
+    engine.close()